@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Assemble a complete printer in one operation.
+#
+# A printer spec describes the frame and the parts from the component
+# library in Resources/cad:
+#
+# {
+#   "version": 1,
+#   "frame": {"LX": "16 in", "LY": "16 in", "LZ": "16 in", "pipe": "...", "corner": "..."},
+#   "parts": [
+#     {"name": "x-axis", "file": "D3D_X_Axis_Simple.fcstd",
+#      "anchor": [0.5, 0.5, 1], "align": [0.5, 0.5, 0.5]},
+#     ...
+#   ]
+# }
+#
+# "frame" is a PvcFrameSpec spec. If it has no "corner", the first corner
+# of the corner table, which fits the pipe, is used; see
+# PartTable.compatibility(). The printer group stores the resolved spec in
+# its PrinterSpec property. Every part is placed relative to the
+# frame: its anchor point is anchor*(LX, LY, LZ) + anchorG*G + offset in
+# frame coordinates, and the point align of the bounding box of the
+# (rotated) part, in fractions of its size, is moved onto it. Optional
+# keys are "object" (object name, default all visible objects of the
+# file, see D3D_ImportPart.ALL_VISIBLE), "anchorG", "offset" in mm and
+# "rotation" as [axis x, y, z, angle in degrees]. Relative file names are
+# taken from D3DBase.CAD_PATH. Resources/printers has example specs.
+#
+# All parts are extracted in a single pass: every library file is opened
+# at most once, and not at all, when the import cache has all its shapes.
+
+import json
+import os
+
+import FreeCAD
+import Part
+
+import D3DBase
+import D3DTrace
+import D3D_ImportPart
+import PartTable
+import PvcFrame
+import PvcFrameSpec
+
+PRINTER_SPEC_VERSION = 1
+
+# Printer spec of the D3D printer. Its frame has no corner.
+DEFAULT_PRINTER = os.path.join(D3DBase.PRINTER_PATH, "D3D_16in.json")
+PART_FIELDS = ("name", "file", "object", "anchor", "anchorG", "align", "offset", "rotation")
+
+
+def printerSpec(frame, parts=None, pipe_table=None, corner_table=None):
+	"""Return printer spec with the frame spec and parts, default the parts of DEFAULT_PRINTER."""
+	if parts is None:
+		with open(DEFAULT_PRINTER, "r") as f:
+			parts = json.load(f)["parts"]
+	return normalizePrinterSpec({"frame": frame, "parts": parts}, pipe_table, corner_table)
+
+
+def resolveFrame(frame, pipe_table, corner_table):
+	"""Return copy of the frame spec with the first corner, which fits its pipe, if it has no corner."""
+	frame = dict(frame)
+	if "corner" not in frame and "pipe" in frame:
+		corners = PartTable.compatibility(PartTable.indexed(pipe_table, PartTable.PIPE_DIMENSIONS),
+			PartTable.indexed(corner_table, PartTable.CORNER_DIMENSIONS)).corners(frame["pipe"])
+		if not corners:
+			raise PvcFrameSpec.SpecError('No corner fits pipe "%s"' % frame["pipe"])
+		frame["corner"] = corners[0]
+	return frame
+
+
+def normalizePrinterSpec(spec, pipe_table=None, corner_table=None):
+	"""Return printer spec with defaults filled in. Raise PvcFrameSpec.SpecError for invalid specs.
+
+	With the tables, a missing corner of the frame is resolved, see
+	resolveFrame(). Without them, the frame is normalized only if it
+	has a corner.
+	"""
+	if spec.get("version", PRINTER_SPEC_VERSION) != PRINTER_SPEC_VERSION:
+		raise PvcFrameSpec.SpecError("Unsupported printer spec version %s" % spec.get("version"))
+	parts = []
+	for part in spec.get("parts", []):
+		unknown = set(part) - set(PART_FIELDS)
+		if unknown:
+			raise PvcFrameSpec.SpecError("Unknown fields of part %s: %s" % (part.get("name"), ", ".join(sorted(unknown))))
+		if "file" not in part:
+			raise PvcFrameSpec.SpecError("Part %s has no file" % part.get("name"))
+		result = {"name": os.path.splitext(os.path.basename(part["file"]))[0], "object": D3D_ImportPart.ALL_VISIBLE,
+			"anchor": [0, 0, 0], "anchorG": [0, 0, 0], "align": [0, 0, 0], "offset": [0, 0, 0],
+			"rotation": [0, 0, 1, 0]}
+		result.update(part)
+		result["path"] = partPath(result["file"])
+		parts.append(result)
+	frame = spec.get("frame", {})
+	if pipe_table is not None and corner_table is not None:
+		frame = resolveFrame(frame, pipe_table, corner_table)
+	if "corner" in frame:
+		frame = PvcFrameSpec.normalize(frame)
+	return {"version": PRINTER_SPEC_VERSION, "frame": frame, "parts": parts}
+
+
+def loadPrinterSpec(path, pipe_table=None, corner_table=None):
+	with open(path, "r") as f:
+		return normalizePrinterSpec(json.load(f), pipe_table, corner_table)
+
+
+def dumpPrinterSpec(spec):
+	"""Return canonical JSON of a normalized printer spec without the resolved part paths."""
+	parts = [dict([(k, v) for k, v in part.items() if k != "path"]) for part in spec["parts"]]
+	return json.dumps({"version": spec["version"], "frame": spec["frame"], "parts": parts},
+		sort_keys=True, separators=(",", ":"))
+
+
+def partPath(filename):
+	if os.path.isabs(filename):
+		return filename
+	return os.path.join(D3DBase.CAD_PATH, filename)
+
+
+def _normalizedPath(path):
+	return os.path.normcase(os.path.abspath(path))
+
+
+def extractShapes(parts, useCache=True):
+	"""Return dictionary of (shape, object name) by (path, object) of all parts.
+
+	Every file is opened at most once. Shapes in the import cache are not
+	extracted again.
+	"""
+	result = {}
+	byFile = {}
+	for part in parts:
+		byFile.setdefault(part["path"], set()).add(part["object"])
+	cache = D3D_ImportPart.importCache()
+	openDocuments = set([_normalizedPath(d.FileName) for d in FreeCAD.listDocuments().values() if d.FileName])
+	for path, objectNames in sorted(byFile.items()):
+		missing = []
+		for objectName in sorted(objectNames):
+			key = D3D_ImportPart.importCacheKey(path, objectName)
+			cached = cache.get(key) if useCache and _normalizedPath(path) not in openDocuments else None
+			if cached is None:
+				missing.append(objectName)
+				continue
+			with D3DTrace.span("read cached shape", file=path):
+				shape = Part.Shape()
+				shape.read(cached)
+			result[(path, objectName)] = (shape, cache.info(key)["object"])
+		if not missing:
+			continue
+		doc_assembly = FreeCAD.ActiveDocument
+		with D3DTrace.span("open", file=path):
+			doc, doc_already_open = D3D_ImportPart.openSource(path)
+		try:
+			for objectName in missing:
+				shape, sourceName = D3D_ImportPart.sourceObjectShape(doc, path, objectName)
+				result[(path, objectName)] = (shape, sourceName)
+				if not doc_already_open:
+					cache.put(D3D_ImportPart.importCacheKey(path, objectName), shape.exportBrep,
+						{"file": os.path.abspath(path), "object": sourceName})
+		finally:
+			with D3DTrace.span("close"):
+				D3D_ImportPart.closeSource(doc, doc_already_open, doc_assembly)
+	return result
+
+
+def partPlacement(part, shape, LX, LY, LZ, G):
+	"""Return FreeCAD.Placement, which moves the shape to its place in the frame. Lengths in mm."""
+	axis = part["rotation"][:3]
+	rotation = FreeCAD.Placement(FreeCAD.Vector(), FreeCAD.Rotation(FreeCAD.Vector(*axis), part["rotation"][3]))
+	placement = rotation.multiply(shape.Placement)
+	rotated = shape.copy()
+	rotated.Placement = placement
+	b = rotated.BoundBox
+	anchor = [part["anchor"][i]*L + part["anchorG"][i]*G + part["offset"][i] for i, L in enumerate((LX, LY, LZ))]
+	align = [low + part["align"][i]*(high - low)
+		for i, (low, high) in enumerate([(b.XMin, b.XMax), (b.YMin, b.YMax), (b.ZMin, b.ZMax)])]
+	move = FreeCAD.Vector(*[anchor[i] - align[i] for i in range(3)])
+	return FreeCAD.Placement(move, FreeCAD.Rotation()).multiply(placement)
+
+
+def assemble(document, spec, pipe_table, corner_table, useCache=True):
+	"""Build the printer of the spec in the document and return its group.
+
+	The group stores the resolved spec as JSON in its PrinterSpec property.
+	"""
+	spec = normalizePrinterSpec(spec, pipe_table, corner_table)
+	frame = PvcFrameSpec.normalize(spec["frame"])
+	spec["frame"] = frame
+	with D3DTrace.span("assemble printer", parts=len(spec["parts"])):
+		group = document.addObject("App::DocumentObjectGroup", "printer")
+		group.addProperty("App::PropertyString", "PrinterSpec", "Printer", "Resolved printer spec as JSON")
+		group.PrinterSpec = dumpPrinterSpec(spec)
+		with D3DTrace.span("frame"):
+			table = PvcFrame.BoxFromTable(document, pipe_table, corner_table)
+			frameGroup = table.createFromSpec(frame, useCache)
+			if frameGroup is None:
+				raise ValueError('Pipe "%s" or corner "%s" not found' % (frame["pipe"], frame["corner"]))
+			group.addObject(frameGroup)
+			G = table.corner_table.dims(frame["corner"])["G"]
+		with D3DTrace.span("extract parts"):
+			shapes = extractShapes(spec["parts"], useCache)
+		with D3DTrace.span("place parts"):
+			for part in spec["parts"]:
+				shape, sourceName = shapes[(part["path"], part["object"])]
+				obj = D3D_ImportPart.addImportedPart(document, part["path"], shape, sourceName, False)
+				obj.Label = part["name"]
+				obj.Placement = partPlacement(part, shape, frame["LX"], frame["LY"], frame["LZ"], G)
+				group.addObject(obj)
+		with D3DTrace.span("document.recompute"):
+			document.recompute()
+	return group
@@ -4,3 +4,10 @@ __dir__ = os.path.dirname(__file__)
 ICON_PATH = os.path.join( __dir__, 'Resources/icons' )
 IMAGE_PATH = os.path.join( __dir__, 'Resources/images' )
 TABLE_PATH = os.path.join( __dir__, 'tables' )
+CAD_PATH = os.path.join( __dir__, 'Resources/cad' )
+PRINTER_PATH = os.path.join( __dir__, 'Resources/printers' )
+# Version of the workbench. Change it when generated geometry changes, so
+# that cached builds of older versions are not used.
+VERSION = "0.3"
+# Workbench preferences.
+PARAMETER_PATH = "User parameter:BaseApp/Preferences/Mod/D3D"
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Benchmarks for frame generation and part import.
+#
+# Run them with FreeCADCmd and store the results in a JSON file:
+#   FreeCADCmd -c "import D3DBenchmark; D3DBenchmark.run('results.json')"
+# Compare two result files:
+#   FreeCADCmd -c "import D3DBenchmark; D3DBenchmark.compare('old.json', 'new.json')"
+#
+# Every benchmark records wall time, the current and peak resident set size
+# of the process, the change of the resident set size during the benchmark
+# and the number of objects in its document. Benchmarks, which save a
+# document, also record the file size. The peak is a high-water mark of the
+# whole run; compare the memory of benchmarks in one run by the change.
+
+from __future__ import print_function
+
+import gc
+import glob
+import json
+import os
+import platform
+import sys
+import time
+
+import FreeCAD
+
+import D3DBase
+import PartTable
+import PvcFrame
+import ShapeCache
+
+IMPORT_PATTERNS = ("*.fcstd", "*.FCStd", "*.step", "*.stp", "*.iges", "*.igs")
+
+
+def peakRss():
+	"""Return peak resident set size of this process in bytes or None."""
+	try:
+		import resource
+	except ImportError:
+		return None
+	rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# Linux reports kB, macOS bytes.
+	return rss if sys.platform == "darwin" else rss*1024
+
+
+def currentRss():
+	"""Return resident set size of this process in bytes or None."""
+	try:
+		with open("/proc/self/statm", "r") as f:
+			return int(f.read().split()[1])*os.sysconf("SC_PAGE_SIZE")
+	except (IOError, OSError, ValueError, AttributeError):
+		return None
+
+
+def measure(results, name, function, document=None):
+	"""Run function() and append its measurement to results. Return the result of function()."""
+	record = {"name": name}
+	gc.collect()
+	rssBefore = currentRss()
+	start = time.time()
+	try:
+		value = function()
+		record["status"] = "ok"
+	except Exception as e:
+		value = None
+		record["status"] = "error"
+		record["error"] = str(e)
+	record["seconds"] = time.time() - start
+	record["peakRss"] = peakRss()
+	record["rss"] = currentRss()
+	if record["rss"] is not None and rssBefore is not None:
+		record["rssDelta"] = record["rss"] - rssBefore
+	if document is not None:
+		record["objects"] = len(document.Objects)
+	results.append(record)
+	FreeCAD.Console.PrintMessage("%-50s %8.3f s %s\n" % (name, record["seconds"], record["status"]))
+	return value
+
+
+def benchmarkBox(results):
+	for solid in (True, False):
+		for instancing in PvcFrame.INSTANCING_MODES:
+			name = "Box.create solid=%s instancing=%s" % (solid, instancing)
+			# Measure the cold case, which builds all shapes.
+			ShapeCache.shapeCache.clear()
+			document = FreeCAD.newDocument("BenchmarkBox")
+			box = PvcFrame.Box(document)
+			measure(results, name, lambda: box.create(solid, instancing), document)
+			measure(results, name + " recompute", document.recompute, document)
+			FreeCAD.closeDocument(document.Name)
+
+
+def benchmarkInstancing(results, solid=True):
+	"""Compare time, memory, object count and file size of the instancing modes.
+
+	All shapes are built before, so only the cost of the instancing is measured.
+	"""
+	import tempfile
+	document = FreeCAD.newDocument("BenchmarkInstancing")
+	PvcFrame.Box(document).create(solid)
+	FreeCAD.closeDocument(document.Name)
+	for instancing in PvcFrame.INSTANCING_MODES:
+		name = "instancing=%s solid=%s" % (instancing, solid)
+		document = FreeCAD.newDocument("BenchmarkInstancing")
+		box = PvcFrame.Box(document)
+		measure(results, name + " create", lambda: box.create(solid, instancing), document)
+		measure(results, name + " recompute", document.recompute, document)
+		filename = os.path.join(tempfile.gettempdir(), "BenchmarkInstancing.FCStd")
+		measure(results, name + " save", lambda: document.saveAs(filename), document)
+		results[-1]["fileSize"] = os.path.getsize(filename) if os.path.exists(filename) else None
+		FreeCAD.closeDocument(document.Name)
+		if os.path.exists(filename):
+			os.remove(filename)
+
+
+def benchmarkTable(results):
+	import OsePiping.Corner as CornerMod
+	import OsePiping.Pipe as PipeMod
+	pipe_table = measure(results, "load pipe table",
+		lambda: PartTable.loadTable(PipeMod.CSV_TABLE_PATH, PartTable.PIPE_DIMENSIONS))
+	corner_table = measure(results, "load corner table",
+		lambda: PartTable.loadTable(CornerMod.CSV_TABLE_PATH, PartTable.CORNER_DIMENSIONS))
+	if pipe_table is None or corner_table is None:
+		return
+	document = FreeCAD.newDocument("BenchmarkTable")
+	box = PvcFrame.BoxFromTable(document, pipe_table, corner_table)
+	box.LX = FreeCAD.Units.parseQuantity("40 cm")
+	box.LY = FreeCAD.Units.parseQuantity("40 cm")
+	box.LZ = FreeCAD.Units.parseQuantity("40 cm")
+	# Every pipe with its first fitting corner and every corner with its
+	# first fitting pipe. Parts without a fitting partner are skipped.
+	compatibility = box.compatibility()
+	pipePairs = [(pipe, compatibility.corners(pipe)[0])
+		for pipe in box.pipe_table.names if compatibility.corners(pipe)]
+	cornerPairs = [(compatibility.pipes(corner)[0], corner)
+		for corner in box.corner_table.names if compatibility.pipes(corner)]
+
+	def createAll(pairs):
+		for pipe, corner in pairs:
+			try:
+				box.create(pipe, corner, True)
+			except Exception as e:
+				FreeCAD.Console.PrintWarning("%s, %s: %s\n" % (pipe, corner, e))
+
+	measure(results, "BoxFromTable.create all pipes",
+		lambda: createAll(pipePairs), document)
+	measure(results, "BoxFromTable.create all corners",
+		lambda: createAll(cornerPairs), document)
+	measure(results, "BoxFromTable recompute", document.recompute, document)
+	FreeCAD.closeDocument(document.Name)
+
+
+def importFiles():
+	files = []
+	for pattern in IMPORT_PATTERNS:
+		files.extend(glob.glob(os.path.join(D3DBase.CAD_PATH, pattern)))
+	return sorted(set(files))
+
+
+def benchmarkImport(results, files=None, copies=4):
+	import tempfile
+	import D3D_ImportPart
+	if files is None:
+		files = importFiles()
+	for filename in files:
+		name = os.path.basename(filename)
+		key = D3D_ImportPart.importCacheKey(filename)
+		D3D_ImportPart.importCache().remove(key)
+		document = FreeCAD.newDocument("BenchmarkImport")
+		measure(results, "importPart %s" % name, lambda: D3D_ImportPart.importPart(filename), document)
+		measure(results, "importPart %s cached" % name, lambda: D3D_ImportPart.importPart(filename), document)
+		measure(results, "importPart %s recompute" % name, document.recompute, document)
+		# All bodies as compound and fused with one general fuse.
+		for objectName in (D3D_ImportPart.ALL_VISIBLE, D3D_ImportPart.ALL_VISIBLE_FUSED):
+			measure(results, "extractShape %s object=%s" % (name, objectName),
+				lambda: D3D_ImportPart.extractShape(filename, objectName))
+		FreeCAD.closeDocument(document.Name)
+		# Import the part several times and compare the RSS change and the
+		# file size of the modes.
+		for mode in D3D_ImportPart.IMPORT_MODES:
+			label = "importPart %s x%d mode=%s" % (name, copies, mode)
+			document = FreeCAD.newDocument("BenchmarkImport")
+			def importCopies():
+				for i in range(copies):
+					D3D_ImportPart.importPart(filename, mode=mode)
+				document.recompute()
+			measure(results, label, importCopies, document)
+			saved = os.path.join(tempfile.gettempdir(), "BenchmarkImport.FCStd")
+			measure(results, label + " save", lambda: document.saveAs(saved), document)
+			results[-1]["fileSize"] = os.path.getsize(saved) if os.path.exists(saved) else None
+			FreeCAD.closeDocument(document.Name)
+			if os.path.exists(saved):
+				os.remove(saved)
+
+
+def benchmarkFarm(results, count=100):
+	import tempfile
+	import PvcFrameFarm
+	for instancing in (PvcFrame.INSTANCING_LINK, PvcFrame.INSTANCING_COMPOUND):
+		name = "farm of %d instancing=%s" % (count, instancing)
+		document = FreeCAD.newDocument("BenchmarkFarm")
+		box = PvcFrame.Box(document)
+		measure(results, name, lambda: PvcFrameFarm.createFarm(document, [box]*count,
+			PvcFrameFarm.squareColumns(count), instancing=instancing), document)
+		measure(results, name + " recompute", document.recompute, document)
+		filename = os.path.join(tempfile.gettempdir(), "BenchmarkFarm.FCStd")
+		measure(results, name + " save", lambda: document.saveAs(filename), document)
+		FreeCAD.closeDocument(document.Name)
+		measure(results, name + " open", lambda: FreeCAD.openDocument(filename))
+		FreeCAD.closeDocument(FreeCAD.ActiveDocument.Name)
+		os.remove(filename)
+
+
+BENCHMARKS = [("box", benchmarkBox), ("instancing", benchmarkInstancing), ("table", benchmarkTable),
+	("import", benchmarkImport),
+	("farm", benchmarkFarm)]
+
+
+def run(output, benchmarks=None):
+	"""Run benchmarks, by default all, and write the results to the JSON file output."""
+	results = []
+	for name, function in BENCHMARKS:
+		if benchmarks is None or name in benchmarks:
+			function(results)
+	data = {"time": time.strftime("%Y-%m-%d %H:%M:%S"),
+		"freecad": ".".join(FreeCAD.Version()[:3]),
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"results": results}
+	with open(output, "w") as f:
+		json.dump(data, f, indent=2)
+	return data
+
+
+def compare(old, new):
+	"""Print wall time, peak RSS, RSS change and file size of two result files side by side."""
+	with open(old, "r") as f:
+		oldResults = dict([(r["name"], r) for r in json.load(f)["results"]])
+	with open(new, "r") as f:
+		newResults = json.load(f)["results"]
+	print("%-50s %10s %10s %8s %10s %10s %10s %10s %10s %10s" % ("benchmark", "old [s]", "new [s]", "ratio",
+		"old [MB]", "new [MB]", "old +MB", "new +MB", "old file", "new file"))
+	for record in newResults:
+		before = oldResults.get(record["name"])
+		if before is None:
+			print("%-50s %10s %10.3f %8s %10s %10s %10s %10s %10s %10s" % (record["name"], "-", record["seconds"], "-",
+				"-", _mb(record), "-", _mb(record, "rssDelta"), "-", _mb(record, "fileSize")))
+			continue
+		ratio = record["seconds"]/before["seconds"] if before["seconds"] > 0 else float("inf")
+		print("%-50s %10.3f %10.3f %8.2f %10s %10s %10s %10s %10s %10s" % (record["name"], before["seconds"], record["seconds"],
+			ratio, _mb(before), _mb(record), _mb(before, "rssDelta"), _mb(record, "rssDelta"),
+			_mb(before, "fileSize"), _mb(record, "fileSize")))
+
+
+def _mb(record, key="peakRss"):
+	if record.get(key) is None:
+		return "-"
+	return "%.1f" % (record[key]/1048576.0)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Lightweight registration of the workbench commands.
+#
+# Every command is registered as a LazyCommand stub. The stub knows only the
+# resources of the command (icon, menu text, tool tip). The module with the
+# real command, and everything it imports, is loaded on the first
+# activation. Keep this module free of heavy imports: it is loaded when the
+# workbench is initialized.
+
+import sys
+
+import FreeCAD as App
+import FreeCADGui as Gui
+import D3DInit
+
+# Time in seconds the workbench initialization may take.
+STARTUP_BUDGET = 0.05
+# Modules which must not be loaded by the workbench initialization.
+HEAVY_MODULES = ["ImportGui", "Draft", "PvcFrame", "PvcFrameGui", "D3D_AddPvcFrame",
+                 "D3D_ImportPart", "D3D_CheckInterference",
+                 "D3D_AddPrinterFarm", "D3D_ClearBuildCache",
+                 "D3D_AssemblePrinter", "OsePiping.PipeGui", "OsePiping.CornerGui", "numpy"]
+
+# (command name, module name, class name, needs an active document, resources)
+COMMANDS = [
+    ("D3D_AddPvcFrame", "D3D_AddPvcFrame", "D3D_AddPvcFrameClass", False,
+     {'Pixmap'  : D3DInit.ICON_PATH + '/AddFrame.svg', # the name of a svg file available in the resources
+      'Accel' : "Shift+S", # a default shortcut (optional)
+      'MenuText': "Add a PVC frame",
+      'ToolTip' : "Adds a D3D printer frame built from PVC pipes and fittings"}),
+    ("D3D_ImportPart", "D3D_ImportPart", "D3D_ImportPartCommand", False,
+     {'Pixmap' : D3DInit.ICON_PATH + '/DrawStyleWireFrame.svg',
+      'MenuText': 'Import a part from another FreeCAD document',
+      'ToolTip': 'Import a part from another FreeCAD document'}),
+    ("D3D_RefreshImports", "D3D_ImportPart", "D3D_RefreshImportsCommand", True,
+     {'Pixmap' : D3DInit.ICON_PATH + '/View-axometric.svg',
+      'MenuText': 'Refresh imported parts',
+      'ToolTip': 'Import all parts again whose source files changed since the last import'}),
+    ("D3D_WatchImports", "D3D_ImportPart", "D3D_WatchImportsCommand", True,
+     {'Pixmap' : D3DInit.ICON_PATH + '/View-front.svg',
+      'MenuText': 'Watch imported parts',
+      'ToolTip': 'Start or stop refreshing imported parts automatically when their source files change'}),
+    ("D3D_CheckInterference", "D3D_CheckInterference", "D3D_CheckInterferenceCommand", True,
+     {'Pixmap' : D3DInit.ICON_PATH + '/ProjFrontBottomLeft.svg',
+      'MenuText': 'Check interference',
+      'ToolTip': 'Report the visible solids which overlap each other'}),
+    ("D3D_AddPrinterFarm", "D3D_AddPrinterFarm", "D3D_AddPrinterFarmCommand", True,
+     {'Pixmap' : D3DInit.ICON_PATH + '/Arch_Space_Tree.svg',
+      'MenuText': 'Add a printer farm',
+      'ToolTip': 'Place copies of the selected parametric frames in a grid, sharing their geometry'}),
+    ("D3D_ClearBuildCache", "D3D_ClearBuildCache", "D3D_ClearBuildCacheCommand", False,
+     {'Pixmap' : D3DInit.ICON_PATH + '/View-left.svg',
+      'MenuText': 'Clear frame build cache',
+      'ToolTip': 'Remove all frames stored by the build cache, so that they are built again'}),
+    ("D3D_AssemblePrinter", "D3D_AssemblePrinter", "D3D_AssemblePrinterCommand", False,
+     {'Pixmap' : D3DInit.ICON_PATH + '/WorkbenchIcon.svg',
+      'MenuText': 'Assemble a printer',
+      'ToolTip': 'Build the frame and place all parts of a printer spec file'}),
+]
+
+class LazyCommand:
+    """Command stub, which loads the real command on first activation."""
+    def __init__(self, moduleName, className, needsDocument, resources):
+        self.moduleName = moduleName
+        self.className = className
+        self.needsDocument = needsDocument
+        self.resources = resources
+        self.command = None
+
+    def load(self):
+        if self.command is None:
+            __import__(self.moduleName)
+            self.command = getattr(sys.modules[self.moduleName], self.className)()
+        return self.command
+
+    def GetResources(self):
+        return self.resources
+
+    def Activated(self):
+        self.load().Activated()
+
+    def IsActive(self):
+        if self.command is not None and hasattr(self.command, "IsActive"):
+            return self.command.IsActive()
+        return not self.needsDocument or App.ActiveDocument is not None
+
+def register():
+    """Register all commands and return their names."""
+    names = []
+    for name, moduleName, className, needsDocument, resources in COMMANDS:
+        Gui.addCommand(name, LazyCommand(moduleName, className, needsDocument, resources))
+        names.append(name)
+    return names
+
+def checkStartup(seconds):
+    """Warn if the initialization took longer than STARTUP_BUDGET or loaded heavy modules."""
+    if seconds > STARTUP_BUDGET:
+        App.Console.PrintWarning("D3D workbench initialization took %.0f ms, the budget is %.0f ms\n"
+                                 % (seconds*1e3, STARTUP_BUDGET*1e3))
+    loaded = [ m for m in HEAVY_MODULES if m in sys.modules ]
+    if loaded:
+        App.Console.PrintLog("D3D workbench initialization found already loaded modules: %s\n" % ", ".join(loaded))
+    return seconds
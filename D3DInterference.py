@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Interference check of the parts of an assembly.
+#
+# Checking every pair of shapes with Shape.common() is quadratic and slow.
+# The check runs in three phases:
+#   1. a bounding volume hierarchy over the axis aligned bounding boxes of
+#      all shapes finds the pairs with overlapping boxes,
+#   2. oriented bounding boxes of the tessellated shapes drop most of the
+#      remaining pairs,
+#   3. Shape.common() computes the overlap volume of the surviving pairs,
+#      in parallel FreeCADCmd workers when there are many of them.
+# The first two phases use only NumPy.
+
+import collections
+import os
+import shutil
+import tempfile
+
+import numpy
+
+import FreeCAD
+
+import D3DTrace
+import D3DWorker
+
+# Tessellation tolerance for the oriented bounding boxes in mm. The boxes
+# are enlarged by it, because the tessellation may lie inside the surface.
+OBB_TOLERANCE = 1.0
+# Overlaps with a smaller volume in mm^3 are touching faces, not interference.
+MIN_VOLUME = 1e-3
+# Run the exact check in workers only for at least this number of pairs.
+PARALLEL_PAIRS = 8
+# Number of leaf boxes at which the hierarchy stops splitting.
+LEAF_SIZE = 4
+
+Interference = collections.namedtuple("Interference", ["first", "second", "volume"])
+
+
+# Broad phase
+
+class BoundingVolumeHierarchy:
+	"""Binary tree of axis aligned boxes.
+
+	boxes is an array (n, 6) with rows (xmin, ymin, zmin, xmax, ymax, zmax).
+	Nodes are split at the median of the box centers along the longest axis.
+	"""
+	def __init__(self, boxes):
+		self.boxes = numpy.asarray(boxes, dtype=float).reshape(-1, 6)
+		self.bounds = []
+		self.children = []
+		self.items = []
+		if len(self.boxes):
+			self._build(numpy.arange(len(self.boxes)))
+
+	def _build(self, items):
+		node = len(self.bounds)
+		boxes = self.boxes[items]
+		self.bounds.append(numpy.concatenate([boxes[:, :3].min(axis=0), boxes[:, 3:].max(axis=0)]))
+		self.children.append(None)
+		self.items.append(items)
+		if len(items) > LEAF_SIZE:
+			centers = boxes[:, :3] + boxes[:, 3:]
+			axis = numpy.argmax(centers.max(axis=0) - centers.min(axis=0))
+			order = items[numpy.argsort(centers[:, axis], kind="mergesort")]
+			half = len(order)//2
+			self.children[node] = (self._build(order[:half]), self._build(order[half:]))
+		return node
+
+	def overlaps(self, a, b):
+		return numpy.all(a[:3] <= b[3:]) and numpy.all(b[:3] <= a[3:])
+
+	def overlappingPairs(self):
+		"""Return sorted list of pairs (i, j), i < j, of boxes which overlap."""
+		if not self.bounds:
+			return []
+		pairs = set()
+		stack = [(0, 0)]
+		while stack:
+			a, b = stack.pop()
+			if a != b and not self.overlaps(self.bounds[a], self.bounds[b]):
+				continue
+			childrenA, childrenB = self.children[a], self.children[b]
+			if childrenA is None and childrenB is None:
+				self._leafPairs(self.items[a], self.items[b], pairs)
+			elif a == b:
+				left, right = childrenA
+				stack.extend([(left, left), (right, right), (left, right)])
+			elif childrenA is not None and (childrenB is None or len(self.items[a]) >= len(self.items[b])):
+				stack.extend([(child, b) for child in childrenA])
+			else:
+				stack.extend([(a, child) for child in childrenB])
+		return sorted(pairs)
+
+	def _leafPairs(self, itemsA, itemsB, pairs):
+		a = self.boxes[itemsA]
+		b = self.boxes[itemsB]
+		overlap = numpy.all((a[:, None, :3] <= b[None, :, 3:]) & (b[None, :, :3] <= a[:, None, 3:]), axis=-1)
+		for i, j in zip(*numpy.nonzero(overlap)):
+			i, j = itemsA[i], itemsB[j]
+			if i != j:
+				pairs.add((min(i, j), max(i, j)))
+
+
+OrientedBox = collections.namedtuple("OrientedBox", ["center", "axes", "halfSizes"])
+
+
+def orientedBox(points, margin=0.0):
+	"""Return OrientedBox of the points along their principal axes."""
+	points = numpy.asarray(points, dtype=float)
+	mean = points.mean(axis=0)
+	axes = numpy.linalg.svd(points - mean, full_matrices=False)[2] if len(points) > 1 else numpy.identity(3)
+	if len(axes) < 3:
+		axes = numpy.identity(3)
+	local = numpy.dot(points - mean, axes.T)
+	low, high = local.min(axis=0), local.max(axis=0)
+	center = mean + numpy.dot((low + high)/2, axes)
+	return OrientedBox(center, axes, (high - low)/2 + margin)
+
+
+def orientedBoxesOverlap(a, b):
+	"""Return True if the oriented boxes overlap, by the separating axis test."""
+	axes = [a.axes, b.axes, numpy.cross(a.axes[:, None, :], b.axes[None, :, :]).reshape(9, 3)]
+	axes = numpy.concatenate(axes)
+	lengths = numpy.linalg.norm(axes, axis=1)
+	# Cross products of parallel axes vanish and separate nothing.
+	axes = axes[lengths > 1e-9]/lengths[lengths > 1e-9, None]
+	distance = numpy.abs(numpy.dot(axes, b.center - a.center))
+	radiusA = numpy.dot(numpy.abs(numpy.dot(axes, a.axes.T)), a.halfSizes)
+	radiusB = numpy.dot(numpy.abs(numpy.dot(axes, b.axes.T)), b.halfSizes)
+	return bool(numpy.all(distance <= radiusA + radiusB))
+
+
+# FreeCAD shapes
+
+def _isVisible(obj):
+	if getattr(obj, "ViewObject", None) is not None:
+		return obj.ViewObject.isVisible()
+	return getattr(obj, "Visibility", True)
+
+
+def objectShape(obj):
+	"""Return the shape of obj in the coordinates of its parent.
+
+	Part.getShape() also returns the shapes of App::Link objects and link
+	arrays, which have no Shape property. FreeCAD before 0.19 lacks it.
+	"""
+	import Part
+	if hasattr(Part, "getShape"):
+		return Part.getShape(obj)
+	if hasattr(obj, "Shape"):
+		return obj.Shape
+	return None
+
+
+def assemblyShapes(doc):
+	"""Return list of (object, shape in global coordinates) of the visible solids of the document.
+
+	App::Link objects are included; the elements of a link array are
+	separate entries of the array object.
+	"""
+	result = []
+	for obj in doc.Objects:
+		if not _isVisible(obj) or obj.isDerivedFrom("App::Part") or obj.isDerivedFrom("App::DocumentObjectGroup"):
+			continue
+		# Elements of link arrays are taken from the array.
+		if obj.isDerivedFrom("App::LinkElement"):
+			continue
+		shape = objectShape(obj)
+		if shape is None or shape.isNull() or len(shape.Solids) == 0:
+			continue
+		if hasattr(obj, "getParentGeoFeatureGroup") and obj.getParentGeoFeatureGroup() is not None:
+			shape = shape.copy()
+			shape.Placement = obj.getGlobalPlacement()
+		if getattr(obj, "ElementCount", 0) > 0:
+			result.extend([(obj, element) for element in shape.childShapes()])
+		else:
+			result.append((obj, shape))
+	return result
+
+
+def boundingBoxes(shapes):
+	boxes = numpy.zeros((len(shapes), 6))
+	for i, shape in enumerate(shapes):
+		b = shape.BoundBox
+		boxes[i] = (b.XMin, b.YMin, b.ZMin, b.XMax, b.YMax, b.ZMax)
+	return boxes
+
+
+def shapeOrientedBox(shape, tolerance=OBB_TOLERANCE):
+	points = shape.tessellate(tolerance)[0]
+	if not points:
+		points = [v.Point for v in shape.Vertexes]
+	return orientedBox([(p.x, p.y, p.z) for p in points], tolerance)
+
+
+def candidatePairs(shapes, tolerance=OBB_TOLERANCE):
+	"""Return pairs of shape indices, which may interfere."""
+	with D3DTrace.span("bounding volume hierarchy", shapes=len(shapes)):
+		pairs = BoundingVolumeHierarchy(boundingBoxes(shapes)).overlappingPairs()
+	with D3DTrace.span("oriented boxes", pairs=len(pairs)):
+		boxes = {}
+		def box(i):
+			if i not in boxes:
+				boxes[i] = shapeOrientedBox(shapes[i], tolerance)
+			return boxes[i]
+		return [(i, j) for i, j in pairs if orientedBoxesOverlap(box(i), box(j))]
+
+
+def commonVolume(a, b):
+	return a.common(b).Volume
+
+
+def _exactSerial(shapes, pairs):
+	return [(i, j, commonVolume(shapes[i], shapes[j])) for i, j in pairs]
+
+
+def _exactParallel(shapes, pairs, processes, idle):
+	directory = tempfile.mkdtemp(prefix="d3dinterference")
+	try:
+		files = {}
+		for i in sorted(set([k for pair in pairs for k in pair])):
+			files[i] = os.path.join(directory, "%d.brep" % i)
+			shapes[i].exportBrep(files[i])
+		pool = D3DWorker.WorkerPool(processes)
+		results = []
+		errors = []
+		def callback(chunkPairs):
+			def done(result):
+				if not result.get("started", True):
+					# No worker could be started, check the pairs in this process.
+					results.extend(_exactSerial(shapes, chunkPairs))
+				elif "error" in result:
+					errors.append(result["error"])
+				else:
+					results.extend([tuple(r) for r in result["pairs"]])
+			return done
+		for chunk in range(pool.processes):
+			chunkPairs = pairs[chunk::pool.processes]
+			if chunkPairs:
+				pool.submit("interference", [dict([(str(k), files[k]) for pair in chunkPairs for k in pair]),
+					[list(pair) for pair in chunkPairs]], callback(chunkPairs))
+		pool.wait(idle)
+		if errors:
+			raise RuntimeError("Interference check failed: %s" % errors[0])
+		return sorted(results)
+	finally:
+		shutil.rmtree(directory, ignore_errors=True)
+
+
+def checkInterference(doc, processes=None, minVolume=MIN_VOLUME, idle=None):
+	"""Return list of Interference of the visible solids of the document, largest volume first.
+
+	With processes=1 or few candidate pairs the exact check runs in this
+	process, otherwise in parallel workers. idle() is called while waiting
+	for the workers.
+	"""
+	with D3DTrace.span("check interference", document=doc.Name):
+		objects = assemblyShapes(doc)
+		shapes = [shape for obj, shape in objects]
+		pairs = candidatePairs(shapes)
+		with D3DTrace.span("exact check", pairs=len(pairs)):
+			if processes == 1 or len(pairs) < PARALLEL_PAIRS:
+				volumes = _exactSerial(shapes, pairs)
+			else:
+				volumes = _exactParallel(shapes, pairs, processes, idle)
+	result = [Interference(objects[i][0], objects[j][0], volume)
+		for i, j, volume in volumes if volume >= minVolume]
+	result.sort(key=lambda r: -r.volume)
+	return result
+
+
+def formatReport(interferences):
+	if not interferences:
+		return "No interference found"
+	lines = ["%d interfering pairs" % len(interferences)]
+	for r in interferences:
+		lines.append("%-30s %-30s %12.3f mm^3" % (r.first.Label, r.second.Label, r.volume))
+	return "\n".join(lines)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Timing spans for the workbench.
+#
+# Wrap stages of the workbench commands into spans:
+#
+#   with D3DTrace.span("createPipes"):
+#       ...
+#
+# Spans are always recorded; they cost two clock reads. The workbench
+# preferences (see D3DBase.PARAMETER_PATH) control the output. They are read
+# once at every top-level span and apply to all spans nested in it:
+#   TraceConsole -- print every span to the FreeCAD console,
+#   TraceFile    -- write all recorded spans as Chrome trace JSON to this
+#                   file after every top-level span. Open it in
+#                   chrome://tracing or https://ui.perfetto.dev,
+#   Profile      -- run cProfile during every top-level span and write
+#                   the statistics to the D3D directory of the user data.
+
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+import FreeCAD
+
+import D3DBase
+
+# Keep only the most recent events.
+MAX_EVENTS = 100000
+
+_events = collections.deque(maxlen=MAX_EVENTS)
+_local = threading.local()
+_start = time.time()
+
+
+def _depth():
+	return getattr(_local, "depth", 0)
+
+
+def _params():
+	return FreeCAD.ParamGet(D3DBase.PARAMETER_PATH)
+
+
+@contextlib.contextmanager
+def span(name, **args):
+	"""Record the time spent in the with block as a span called name.
+
+	args are stored with the span and shown in the trace viewer.
+	"""
+	depth = _depth()
+	profiler = None
+	if depth == 0:
+		params = _params()
+		_local.console = params.GetBool("TraceConsole", False)
+		if params.GetBool("Profile", False):
+			import cProfile
+			profiler = cProfile.Profile()
+			profiler.enable()
+	_local.depth = depth + 1
+	begin = time.time()
+	try:
+		yield
+	finally:
+		end = time.time()
+		_local.depth = depth
+		_events.append({"name": name, "ph": "X", "pid": os.getpid(), "tid": threading.current_thread().ident,
+			"ts": (begin - _start)*1e6, "dur": (end - begin)*1e6, "args": args})
+		if _local.console:
+			FreeCAD.Console.PrintMessage("%s%s: %.1f ms\n" % ("  "*depth, name, (end - begin)*1e3))
+		if depth == 0:
+			_finish(name, profiler)
+
+
+def _finish(name, profiler):
+	if profiler is not None:
+		profiler.disable()
+		writeProfile(name, profiler)
+	filename = _params().GetString("TraceFile", "")
+	if filename:
+		writeChromeTrace(filename)
+
+
+def traced(name=None):
+	"""Decorator, which records every call of the function as a span."""
+	def decorator(function):
+		spanName = name or function.__name__
+		def wrapper(*args, **kwargs):
+			with span(spanName):
+				return function(*args, **kwargs)
+		wrapper.__name__ = function.__name__
+		wrapper.__doc__ = function.__doc__
+		return wrapper
+	return decorator
+
+
+def events():
+	"""Return list of recorded spans in the Chrome trace event format."""
+	return list(_events)
+
+
+def clear():
+	_events.clear()
+
+
+def writeChromeTrace(filename):
+	"""Write all recorded spans to filename in the Chrome trace format."""
+	with open(filename, "w") as f:
+		json.dump({"traceEvents": events(), "displayTimeUnit": "ms"}, f)
+
+
+def writeProfile(name, profiler):
+	"""Write cProfile statistics of a top-level span and print the most expensive calls."""
+	import pstats
+	import ShapeCache
+	safeName = "".join([c if c.isalnum() else "_" for c in name])
+	filename = os.path.join(ShapeCache.cacheDirectory("profiles"),
+		"%s-%s.prof" % (safeName, time.strftime("%Y%m%d-%H%M%S")))
+	profiler.dump_stats(filename)
+	stream = _ConsoleStream()
+	pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(20)
+	FreeCAD.Console.PrintMessage("profile of %s written to %s\n" % (name, filename))
+
+
+class _ConsoleStream:
+	def write(self, text):
+		FreeCAD.Console.PrintMessage(text)
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Run workbench tasks in headless FreeCADCmd processes.
+#
+# The GUI starts a worker with
+#   FreeCADCmd -c "import D3DWorker; D3DWorker.main(task, args, resultFile)"
+# The worker runs the task and writes its result as JSON to resultFile.
+# WorkerPool runs many workers in parallel and reports results as they
+# complete, so the GUI stays responsive.
+#
+# Do not import FreeCAD modules at the top level. This module is also
+# imported by the GUI only to start workers.
+
+import collections
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+__dir__ = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_EXTENSIONS = (".step", ".stp", ".iges", ".igs")
+# Object names, which stand for all visible objects of a source file,
+# combined to a compound or fused to a single shape.
+ALL_VISIBLE = "*"
+ALL_VISIBLE_FUSED = "*fused"
+
+
+def freecadCmd():
+	"""Return path of the FreeCADCmd executable."""
+	import FreeCAD
+	names = ["FreeCADCmd", "freecadcmd"]
+	if sys.platform.startswith("win"):
+		names = ["FreeCADCmd.exe"]
+	for name in names:
+		path = os.path.join(FreeCAD.getHomePath(), "bin", name)
+		if os.path.isfile(path):
+			return path
+	# Hope, it is on the PATH.
+	return names[0]
+
+
+# Tasks
+
+def _visibleShapeObjects(doc):
+	# Headless documents have no view objects. Use the Visibility property instead.
+	return [obj for obj in doc.Objects
+		if getattr(obj, "Visibility", True) and hasattr(obj, "Shape")
+		and len(obj.Shape.Faces) > 0 and "Body" not in obj.Name]
+
+
+def combineShapes(shapes, fuse=False):
+	"""Return a compound of the shapes or, with fuse, the shapes fused to one shape.
+
+	All shapes are fused in one general fuse operation. Chained pairwise
+	fuses get slower with every body, because every fuse intersects the
+	growing result with the next body again.
+	"""
+	import Part
+	shapes = [shape.copy() for shape in shapes]
+	if not fuse:
+		return Part.makeCompound(shapes)
+	if len(shapes) == 1:
+		return shapes[0]
+	return shapes[0].multiFuse(shapes[1:]).removeSplitter()
+
+
+def convert(source, target, objectName=None):
+	"""Import a STEP or IGES file and write the shape of one object as BREP to target.
+
+	Without objectName use the first visible object with faces. With
+	ALL_VISIBLE or ALL_VISIBLE_FUSED combine all visible objects.
+	"""
+	import FreeCAD
+	import Import
+	doc = FreeCAD.newDocument("D3DWorkerConvert")
+	try:
+		Import.insert(source, doc.Name)
+		if objectName in (ALL_VISIBLE, ALL_VISIBLE_FUSED):
+			objects = _visibleShapeObjects(doc)
+			if not objects:
+				raise ValueError("%s has no visible objects" % source)
+			shape = combineShapes([obj.Shape for obj in objects], objectName == ALL_VISIBLE_FUSED)
+			shape.exportBrep(target)
+			return {"object": objectName}
+		if objectName:
+			obj = doc.getObject(objectName)
+			if obj is None:
+				raise ValueError("%s has no object %s" % (source, objectName))
+		else:
+			obj = _visibleShapeObjects(doc)[0]
+		obj.Shape.exportBrep(target)
+		return {"object": obj.Name}
+	finally:
+		FreeCAD.closeDocument(doc.Name)
+
+
+def interference(files, pairs):
+	"""Return overlap volumes of pairs of shapes.
+
+	files maps shape indices, as strings, to BREP files; pairs is a list of
+	index pairs. Return {"pairs": [[i, j, volume], ...]}.
+	"""
+	import Part
+	shapes = {}
+	for key, path in files.items():
+		shape = Part.Shape()
+		shape.importBrep(path)
+		shapes[int(key)] = shape
+	return {"pairs": [[i, j, shapes[i].common(shapes[j]).Volume] for i, j in pairs]}
+
+
+def buildSource(key, target):
+	"""Build the pipe or corner shape with the shape cache key and write it as BREP to target."""
+	import PvcFrame
+	shape = PvcFrame.buildShape(PvcFrame.builderFromKey(key), key[-1])
+	shape.exportBrep(target)
+	return {"file": target}
+
+
+TASKS = {"convert": convert, "interference": interference, "buildSource": buildSource}
+
+
+def main(task, args, resultFile):
+	"""Entry point of a worker process."""
+	try:
+		result = TASKS[task](*args)
+	except Exception as e:
+		result = {"error": str(e), "traceback": traceback.format_exc()}
+	with open(resultFile, "w") as f:
+		json.dump(result, f)
+
+
+# Process pool
+
+class WorkerPool:
+	"""Run tasks in at most processes parallel FreeCADCmd processes.
+
+	callback(result) is called in the calling thread for every finished
+	task. A result with the key "error" describes a failure. If the worker
+	process could not be started, the result also has "started": False
+	and the caller can run the task in process instead.
+	"""
+	POLL_INTERVAL = 0.05 # s
+
+	def __init__(self, processes=None):
+		if processes is None:
+			processes = multiprocessing.cpu_count()
+		self.processes = max(1, processes)
+		self.queue = collections.deque()
+		self.running = []
+
+	def submit(self, task, args, callback):
+		self.queue.append((task, list(args), callback))
+
+	def pending(self):
+		return len(self.queue) + len(self.running)
+
+	def _start(self):
+		while self.queue and len(self.running) < self.processes:
+			task, args, callback = self.queue.popleft()
+			fd, resultFile = tempfile.mkstemp(".json", "d3dworker")
+			os.close(fd)
+			command = "import sys; sys.path.insert(0, %r); import D3DWorker; D3DWorker.main(%r, %r, %r)" \
+				% (__dir__, task, args, resultFile)
+			try:
+				with open(os.devnull, "w") as devnull:
+					process = subprocess.Popen([freecadCmd(), "-c", command], stdout=devnull, stderr=devnull)
+			except OSError as e:
+				# FreeCADCmd is missing or cannot be run.
+				os.remove(resultFile)
+				callback({"error": "could not start worker: %s" % e, "started": False})
+				continue
+			self.running.append((process, resultFile, callback))
+
+	def poll(self):
+		"""Start queued tasks and report finished ones. Return True while tasks are pending."""
+		self._start()
+		still_running = []
+		for process, resultFile, callback in self.running:
+			code = process.poll()
+			if code is None:
+				still_running.append((process, resultFile, callback))
+				continue
+			try:
+				with open(resultFile, "r") as f:
+					result = json.load(f)
+			except (IOError, OSError, ValueError):
+				result = {"error": "worker exited with code %s" % code}
+			os.remove(resultFile)
+			callback(result)
+		self.running = still_running
+		self._start()
+		return self.pending() > 0
+
+	def wait(self, idle=None):
+		"""Run until all tasks are finished. Call idle() while waiting, for example to update the GUI."""
+		while self.poll():
+			if idle is not None:
+				idle()
+			time.sleep(WorkerPool.POLL_INTERVAL)
+
+	def cancel(self):
+		"""Drop queued tasks and kill running workers."""
+		self.queue.clear()
+		for process, resultFile, callback in self.running:
+			process.kill()
+			process.wait()
+			if os.path.exists(resultFile):
+				os.remove(resultFile)
+		self.running = []
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+
+import FreeCAD as App
+import FreeCADGui as Gui
+import D3DTrace
+import PvcFrame
+import PvcFrameFarm
+from PySide import QtGui
+
+def selectedFrames():
+    """Return the selected parametric frames."""
+    return [ obj for obj in Gui.Selection.getSelection()
+             if isinstance(getattr(obj, 'Proxy', None), PvcFrame.Frame) ]
+
+class D3D_AddPrinterFarmCommand:
+    """Command to place copies of the selected parametric frames in a grid"""
+
+    def Activated(self):
+        doc = App.ActiveDocument
+        frames = selectedFrames()
+        window = QtGui.QApplication.activeWindow()
+        if not frames:
+            QtGui.QMessageBox.information(window, "Printer farm",
+                "Select one or more parametric frames. They are repeated until the farm is full.")
+            return
+        count, ok = QtGui.QInputDialog.getInt(window, "Printer farm", "Number of printers:", 10, 1, 10000)
+        if not ok:
+            return
+        columns, ok = QtGui.QInputDialog.getInt(window, "Printer farm", "Printers per row:",
+                                                PvcFrameFarm.squareColumns(count), 1, count)
+        if not ok:
+            return
+        spacing, ok = QtGui.QInputDialog.getDouble(window, "Printer farm", "Gap between printers (mm):",
+                                                   PvcFrameFarm.DEFAULT_SPACING, 0, 1e6, 0)
+        if not ok:
+            return
+        with D3DTrace.span("D3D_AddPrinterFarm", printers=count):
+            templates = [ (frame.Proxy.box(frame), frame.Solid) for frame in frames ]
+            boxes = [ templates[i % len(templates)][0] for i in range(count) ]
+            PvcFrameFarm.createFarm(doc, boxes, columns, spacing, templates[0][1])
+            for frame in frames:
+                frame.Visibility = False
+            doc.recompute()
+        Gui.SendMsgToActiveView("ViewFit")
+
+    def IsActive(self):
+        return App.ActiveDocument is not None
@@ -26,31 +26,32 @@
 import ImportGui
 import FreeCAD as App
 import FreeCADGui as Gui
-import D3DInit
+import D3DTrace
 from PySide import QtGui#, QtCore # https://www.freecadweb.org/wiki/PySide
+import OsePiping.Pipe as PipeMod
+import OsePiping.Corner as CornerMod
 import OsePiping.PipeGui as PipeGui
 import OsePiping.CornerGui as CornerGui
+import PartTable
 import PvcFrameGui
 
 class D3D_AddPvcFrameClass():
     """Command to add the printer frame"""
 
-    def GetResources(self):
-        #App.ConfigGet('UserAppData') + '/Mod'
-        return {'Pixmap'  : D3DInit.ICON_PATH + '/AddFrame.svg', # the name of a svg file available in the resources
-                'Accel' : "Shift+S", # a default shortcut (optional)
-                'MenuText': "Add a PVC frame",
-                'ToolTip' : "Adds a D3D printer frame built from PVC pipes and fittings"}
-
     def Activated(self):
         if not(App.ActiveDocument):
             App.newDocument()
 
         doc = App.activeDocument()
-	pipeTable = PipeGui.GuiCheckTable() # Open a CSV file, check its content, and return it as a CsvTable object.
-	cornerTable = CornerGui.GuiCheckTable() # Open a CSV file, check its content, and return it as a CsvTable object.
-	form = PvcFrameGui.MainDialog(doc, pipeTable, cornerTable)
-	form.exec_()
+        # Open the CSV files and check their content only once per session,
+        # or when they changed since the last command activation.
+        with D3DTrace.span("load tables"):
+            pipeTable = PartTable.loadTable(PipeMod.CSV_TABLE_PATH, PartTable.PIPE_DIMENSIONS,
+                                            lambda path: PipeGui.GuiCheckTable())
+            cornerTable = PartTable.loadTable(CornerMod.CSV_TABLE_PATH, PartTable.CORNER_DIMENSIONS,
+                                              lambda path: CornerGui.GuiCheckTable())
+        form = PvcFrameGui.MainDialog(doc, pipeTable, cornerTable)
+        form.exec_()
         Gui.ActiveDocument.ActiveView.fitAll()
         doc.recompute()
         return
@@ -59,5 +60,3 @@ class D3D_AddPvcFrameClass():
         """Here you can define if the command must be active or not (greyed) if certain conditions
         are met or not. This function is optional."""
         return True
-
-Gui.addCommand('D3D_AddPvcFrame', D3D_AddPvcFrameClass())
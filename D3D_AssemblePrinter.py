@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+
+import json
+import FreeCAD as App
+import FreeCADGui as Gui
+import D3DAssembler
+import D3DBase
+import D3DTrace
+from PySide import QtGui, QtCore
+import OsePiping.Pipe as PipeMod
+import OsePiping.Corner as CornerMod
+import OsePiping.PipeGui as PipeGui
+import OsePiping.CornerGui as CornerGui
+import PartTable
+
+class D3D_AssemblePrinterCommand:
+    """Command to build a complete printer from a printer spec file"""
+
+    def Activated(self):
+        if not(App.ActiveDocument):
+            App.newDocument()
+        doc = App.ActiveDocument
+        window = QtGui.QApplication.activeWindow()
+        filename, _ = QtGui.QFileDialog.getOpenFileName(window, "Select printer spec", D3DBase.PRINTER_PATH,
+                                                     "Printer spec (*.json)")
+        if not filename:
+            return
+        with open(filename, "r") as f:
+            spec = json.load(f)
+        with D3DTrace.span("load tables"):
+            pipeTable = PartTable.loadTable(PipeMod.CSV_TABLE_PATH, PartTable.PIPE_DIMENSIONS,
+                                            lambda path: PipeGui.GuiCheckTable())
+            cornerTable = PartTable.loadTable(CornerMod.CSV_TABLE_PATH, PartTable.CORNER_DIMENSIONS,
+                                              lambda path: CornerGui.GuiCheckTable())
+        QtGui.QApplication.setOverrideCursor(QtGui.QCursor(QtCore.Qt.WaitCursor))
+        try:
+            with D3DTrace.span("D3D_AssemblePrinter"):
+                D3DAssembler.assemble(doc, spec, pipeTable, cornerTable)
+        except Exception as e:
+            QtGui.QApplication.restoreOverrideCursor()
+            QtGui.QMessageBox.warning(window, "Assemble printer", str(e))
+            return
+        QtGui.QApplication.restoreOverrideCursor()
+        Gui.SendMsgToActiveView("ViewFit")
+
+    def IsActive(self):
+        return True
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+
+import FreeCAD as App
+import FreeCADGui as Gui
+import D3DInterference
+import D3DTrace
+from PySide import QtGui, QtCore
+
+class D3D_CheckInterferenceCommand:
+    """Command to report overlapping solids of the active document"""
+
+    def Activated(self):
+        doc = App.ActiveDocument
+        QtGui.QApplication.setOverrideCursor(QtGui.QCursor(QtCore.Qt.WaitCursor))
+        try:
+            with D3DTrace.span("D3D_CheckInterference"):
+                interferences = D3DInterference.checkInterference(doc, idle=QtGui.QApplication.processEvents)
+        finally:
+            QtGui.QApplication.restoreOverrideCursor()
+        report = D3DInterference.formatReport(interferences)
+        App.Console.PrintMessage(report + "\n")
+        Gui.Selection.clearSelection()
+        for r in interferences:
+            Gui.Selection.addSelection(r.first)
+            Gui.Selection.addSelection(r.second)
+        QtGui.QMessageBox.information(QtGui.QApplication.activeWindow(), "Interference check", report)
+
+    def IsActive(self):
+        return App.ActiveDocument is not None
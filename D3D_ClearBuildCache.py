@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+
+import FreeCAD as App
+import PvcFrameSpec
+from PySide import QtGui
+
+class D3D_ClearBuildCacheCommand:
+    """Command to remove all cached frame builds"""
+
+    def Activated(self):
+        cache = PvcFrameSpec.buildCache()
+        text = "Remove %d cached frames (%.1f MB)?" % (len(cache.entries), cache.totalSize()/1048576.0)
+        answer = QtGui.QMessageBox.question(QtGui.QApplication.activeWindow(), "Clear frame build cache", text,
+                                            QtGui.QMessageBox.Yes | QtGui.QMessageBox.No)
+        if answer == QtGui.QMessageBox.Yes:
+            PvcFrameSpec.invalidate()
+            App.Console.PrintMessage("frame build cache cleared\n")
+
+    def IsActive(self):
+        return True
@@ -24,16 +24,81 @@
 #***************************************************************************
 
 import os
-import ImportGui
+import shutil
+import tempfile
 import FreeCAD as App
 import FreeCADGui as Gui
-import D3DInit
+import Part
+import D3DBase
+import D3DTrace
+import D3DWorker
+import ShapeCache
 from PySide import QtGui, QtCore # https://www.freecadweb.org/wiki/PySide
 
-def importPart(filename):
-    doc_assembly = App.ActiveDocument
-    App.Console.PrintMessage("importing part from %s\n" % filename)
-    
+# Cached shapes of imported parts. See importCache().
+_importCache = None
+DEFAULT_IMPORT_CACHE_SIZE = 1024 # MB
+# Object names, which stand for all visible objects of a source file,
+# combined to a compound without boolean operations or fused to one shape.
+ALL_VISIBLE = D3DWorker.ALL_VISIBLE
+ALL_VISIBLE_FUSED = D3DWorker.ALL_VISIBLE_FUSED
+# Which objects of a source file the import command takes. The
+# "ImportBodies" workbench preference selects one of these.
+IMPORT_BODIES = {"first": None, "compound": ALL_VISIBLE, "fuse": ALL_VISIBLE_FUSED}
+# How importPart() adds parts. The "ImportMode" workbench preference selects
+# the default.
+# Every import gets its own copy of the shape.
+IMPORT_COPY = "copy"
+# Every (file, object) is stored once in a hidden source part. Every import
+# is an App::Link to it. This needs FreeCAD 0.19 or later; older versions
+# import copies.
+IMPORT_SHARED = "shared"
+IMPORT_MODES = (IMPORT_COPY, IMPORT_SHARED)
+
+def importMode():
+    """Return the import mode of the "ImportMode" workbench preference."""
+    mode = App.ParamGet(D3DBase.PARAMETER_PATH).GetString("ImportMode", IMPORT_COPY)
+    return mode if mode in IMPORT_MODES else IMPORT_COPY
+
+def importBodies():
+    """Return the object name for the "ImportBodies" workbench preference."""
+    bodies = App.ParamGet(D3DBase.PARAMETER_PATH).GetString("ImportBodies", "first")
+    return IMPORT_BODIES.get(bodies)
+
+def resolveMode(doc, mode=None):
+    """Return the import mode for doc. mode None means importMode().
+
+    Without App::Link support, shared imports fall back to copies.
+    """
+    if mode is None:
+        mode = importMode()
+    if mode == IMPORT_SHARED and "App::Link" not in doc.supportedTypes():
+        App.Console.PrintWarning("Shared imports need FreeCAD 0.19 or later, importing copies\n")
+        return IMPORT_COPY
+    return mode
+
+def importCache():
+    """Return the on-disk cache of imported shapes.
+
+    The size limit in MB is the "ImportCacheSize" workbench preference.
+    """
+    global _importCache
+    if _importCache is None:
+        params = App.ParamGet(D3DBase.PARAMETER_PATH)
+        maxBytes = params.GetInt("ImportCacheSize", DEFAULT_IMPORT_CACHE_SIZE)*1024*1024
+        _importCache = ShapeCache.FileCache(ShapeCache.cacheDirectory("imports"), maxBytes, ".brep")
+    return _importCache
+
+def importCacheKey(filename, objectName=None):
+    """Return cache key of the shape imported from filename.
+
+    objectName is the name of the imported object, None for the first visible object.
+    """
+    st = os.stat(filename)
+    return "%s|%d|%r|%s" % (os.path.abspath(filename), st.st_size, st.st_mtime, objectName or "")
+
+def openSource(filename):
+    """Return (document, already open) for the source file."""
     doc_already_open = filename in [ d.FileName for d in App.listDocuments().values() ]
     App.Console.PrintMessage("%s open already %s" % (filename, doc_already_open))
     
@@ -45,36 +110,388 @@ def importPart(filename):
             doc = App.openDocument(filename)
             App.Console.PrintMessage('succesfully opened %s' % filename)
         else: #trying shaping import http://forum.freecadweb.org/viewtopic.php?f=22&t=12434&p=99772#p99772x
-            import ImportGui
             doc = App.newDocument( os.path.basename(filename) )
-            shapeobj=ImportGui.insert(filename,doc.Name)
-    
-    visibleObjects = [ obj for obj in doc.Objects
-                       if hasattr(obj,'ViewObject') and obj.ViewObject.isVisible()
-                       and hasattr(obj,'Shape') and len(obj.Shape.Faces) > 0 and 'Body' not in obj.Name] # len(obj.Shape.Faces) > 0 to avoid sketches, skip Body
-    App.Console.PrintMessage('Visible objects %s' % visibleObjects)
-    
+            if App.GuiUp:
+                import ImportGui
+                shapeobj=ImportGui.insert(filename,doc.Name)
+            else:
+                import Import
+                shapeobj=Import.insert(filename,doc.Name)
+    return doc, doc_already_open
+
+def closeSource(doc, doc_already_open, doc_assembly):
+    if not doc_already_open: #then close again
+        App.closeDocument(doc.Name)
+        App.setActiveDocument(doc_assembly.Name)
+        App.ActiveDocument = doc_assembly
+
+def isVisible(obj):
+    if getattr(obj, 'ViewObject', None) is not None:
+        return obj.ViewObject.isVisible()
+    # Without GUI there are no view objects.
+    return not App.GuiUp and getattr(obj, 'Visibility', True)
+
+def visibleObjects(doc):
+    return [ obj for obj in doc.Objects
+             if isVisible(obj)
+             and hasattr(obj,'Shape') and len(obj.Shape.Faces) > 0 and 'Body' not in obj.Name] # len(obj.Shape.Faces) > 0 to avoid sketches, skip Body
+
+def sourceObjectShape(doc, filename, objectName=None):
+    """Return (shape, object name) of an object of the open source document.
+
+    Without objectName, use the first visible object. With ALL_VISIBLE,
+    return a compound of all visible objects, with ALL_VISIBLE_FUSED fuse
+    them to one shape.
+    """
+    if objectName in (ALL_VISIBLE, ALL_VISIBLE_FUSED):
+        with D3DTrace.span("filter visible objects"):
+            objects = visibleObjects(doc)
+        if not objects:
+            raise ValueError("%s has no visible objects" % filename)
+        fuse = objectName == ALL_VISIBLE_FUSED
+        with D3DTrace.span("fuse" if fuse else "shape copy", count=len(objects)):
+            shape = D3DWorker.combineShapes([ obj.Shape for obj in objects ], fuse)
+        return shape, objectName
+    if objectName:
+        obj_to_copy = doc.getObject(objectName)
+        if obj_to_copy is None:
+            raise ValueError("%s has no object %s" % (filename, objectName))
+    else:
+        with D3DTrace.span("filter visible objects"):
+            objects = visibleObjects(doc)
+        App.Console.PrintMessage('Visible objects %s' % objects)
+        obj_to_copy = objects[0]
+    with D3DTrace.span("shape copy"):
+        shape = obj_to_copy.Shape.copy()
+    return shape, obj_to_copy.Name
+
+def extractShape(filename, objectName=None):
+    """Return (shape, object name) of the part in the source file.
+
+    Without objectName, use the first visible object.
+    """
+    doc_assembly = App.ActiveDocument
+    with D3DTrace.span("open", file=filename):
+        doc, doc_already_open = openSource(filename)
+    try:
+        shape, sourceName = sourceObjectShape(doc, filename, objectName)
+    finally:
+        with D3DTrace.span("close"):
+            closeSource(doc, doc_already_open, doc_assembly)
+    return shape, sourceName
+
+def importedShape(filename, objectName=None, useCache=True):
+    """Return (shape, object name) of the part in the source file.
+
+    The shape is taken from the import cache, if the file did not change
+    since it was imported last time. Documents which are open are never
+    taken from the cache, because they may have unsaved changes.
+    """
+    doc_already_open = filename in [ d.FileName for d in App.listDocuments().values() ]
+    if not useCache or doc_already_open:
+        return extractShape(filename, objectName)
+    cache = importCache()
+    key = importCacheKey(filename, objectName)
+    cached = cache.get(key)
+    if cached is not None:
+        App.Console.PrintMessage("using cached shape for %s\n" % filename)
+        with D3DTrace.span("read cached shape"):
+            shape = Part.Shape()
+            shape.read(cached)
+        return shape, cache.info(key)["object"]
+    shape, sourceName = extractShape(filename, objectName)
+    with D3DTrace.span("write cached shape"):
+        cache.put(key, shape.exportBrep, {"file": os.path.abspath(filename), "object": sourceName})
+    return shape, sourceName
+
+def addImportedPart(doc_assembly, filename, shape, sourceName, fixedPosition):
     obj = doc_assembly.addObject("Part::FeaturePython", 'part123456')
     obj.addProperty("App::PropertyFile", "sourceFile", "D3D_ImportPart").sourceFile = filename
+    obj.addProperty("App::PropertyString", "sourceObject", "D3D_ImportPart").sourceObject = sourceName
     obj.addProperty("App::PropertyFloat", "timeLastImport", "D3D_ImportPart")
     obj.setEditorMode("timeLastImport", 1)
     obj.addProperty("App::PropertyBool", "fixedPosition", "D3D_ImportPart")
-    obj.fixedPosition = not any([i.fixedPosition for i in doc_assembly.Objects if hasattr(i, 'fixedPosition') ])
+    obj.fixedPosition = fixedPosition
     #obj.addProperty("App::PropertyBool", "updateColors", "importPart").updateColors = True
-    obj_to_copy  = visibleObjects[0]
-    obj.Shape = obj_to_copy.Shape.copy()
+    obj.Shape = shape
     
     obj.Proxy = Proxy_importPart()
     obj.timeLastImport = os.path.getmtime( filename )
     #clean up
     #if subAssemblyImport:
     #    doc_assembly.removeObject(tempPartName)
-    if not doc_already_open: #then close again
-        App.closeDocument(doc.Name)
-        App.setActiveDocument(doc_assembly.Name)
-        App.ActiveDocument = doc_assembly
     return obj
-    
+
+def sharedKey(filename, objectName=None):
+    return "%s|%s" % (os.path.abspath(filename), objectName or "")
+
+def sharedSources(doc):
+    """Return dictionary of the hidden source parts in doc by their shared key."""
+    sources = {}
+    for obj in doc.Objects:
+        key = getattr(obj, 'sharedKey', None)
+        if key is not None:
+            sources.setdefault(key, obj)
+    return sources
+
+def sharedSource(doc, filename, objectName=None, sources=None):
+    """Return the hidden source part of (filename, objectName) in doc or None.
+
+    sources is a dictionary from sharedSources(). Pass it to look up many
+    parts without scanning the document every time.
+    """
+    if sources is None:
+        sources = sharedSources(doc)
+    return sources.get(sharedKey(filename, objectName))
+
+def addSharedPart(doc_assembly, filename, shape, sourceName, fixedPosition, objectName=None, sources=None):
+    """Add an App::Link to the shared source part of (filename, objectName), create the source if necessary.
+
+    A new source is also added to the dictionary sources, if given.
+    """
+    if sources is None:
+        sources = sharedSources(doc_assembly)
+    source = sharedSource(doc_assembly, filename, objectName, sources)
+    if source is None:
+        key = sharedKey(filename, objectName)
+        source = addImportedPart(doc_assembly, filename, shape, sourceName, False)
+        source.addProperty("App::PropertyString", "sharedKey", "D3D_ImportPart").sharedKey = key
+        sources[key] = source
+        source.setEditorMode("sharedKey", 1)
+        source.Label = os.path.basename(filename) + " source"
+        source.Visibility = False
+    obj = doc_assembly.addObject("App::Link", 'part123456')
+    obj.setLink(source)
+    obj.Label = os.path.basename(filename)
+    obj.addProperty("App::PropertyBool", "fixedPosition", "D3D_ImportPart")
+    obj.fixedPosition = fixedPosition
+    return obj
+
+def addPart(doc_assembly, filename, shape, sourceName, fixedPosition, mode=IMPORT_COPY, objectName=None, sources=None):
+    if mode == IMPORT_SHARED:
+        return addSharedPart(doc_assembly, filename, shape, sourceName, fixedPosition, objectName, sources)
+    return addImportedPart(doc_assembly, filename, shape, sourceName, fixedPosition)
+
+def hasFixedPart(doc):
+    return any([i.fixedPosition for i in doc.Objects if hasattr(i, 'fixedPosition') ])
+
+def importPart(filename, objectName=None, useCache=True, mode=None):
+    """Import a part into the active document. mode is one of IMPORT_MODES, default importMode()."""
+    doc_assembly = App.ActiveDocument
+    mode = resolveMode(doc_assembly, mode)
+    App.Console.PrintMessage("importing part from %s\n" % filename)
+    with D3DTrace.span("importPart", file=filename, mode=mode):
+        sources = sharedSources(doc_assembly) if mode == IMPORT_SHARED else None
+        if mode == IMPORT_SHARED and sharedSource(doc_assembly, filename, objectName, sources) is not None:
+            # The shape is in the document already.
+            shape, sourceName = None, None
+        else:
+            shape, sourceName = importedShape(filename, objectName, useCache)
+        with D3DTrace.span("add part"):
+            return addPart(doc_assembly, filename, shape, sourceName, not hasFixedPart(doc_assembly), mode, objectName,
+                           sources)
+
+def importParts(filenames, processes=None, mode=None, objectName=None):
+    """Import the first visible object of every file into the active document.
+
+    With ALL_VISIBLE or ALL_VISIBLE_FUSED as objectName, import all visible
+    objects of every file instead.
+
+    Shapes from STEP and IGES files, which are not in the import cache yet,
+    are converted to BREP in parallel FreeCADCmd processes. Parts are added
+    to the document as soon as their conversion completes. Return list of
+    the imported parts in the order of filenames; failed imports are None.
+    """
+    doc_assembly = App.ActiveDocument
+    mode = resolveMode(doc_assembly, mode)
+    cache = importCache()
+    open_files = set([ d.FileName for d in App.listDocuments().values() ])
+    # Only the first part of the whole batch is fixed, if none is yet.
+    state = {"fixed": hasFixedPart(doc_assembly)}
+    parts = [None]*len(filenames)
+    # Shared source parts by key, kept up to date for the whole batch.
+    sources = sharedSources(doc_assembly) if mode == IMPORT_SHARED else None
+
+    def add(i, shape, sourceName):
+        parts[i] = addPart(doc_assembly, filenames[i], shape, sourceName, not state["fixed"], mode, objectName,
+                           sources)
+        state["fixed"] = True
+
+    def importHere(i):
+        try:
+            shape, sourceName = importedShape(filenames[i], objectName)
+            add(i, shape, sourceName)
+        except Exception as e:
+            App.Console.PrintError("could not import %s: %s\n" % (filenames[i], e))
+
+    def converted(i, key, tmp):
+        def callback(result):
+            if not result.get("started", True):
+                # No worker could be started, import in this process.
+                App.Console.PrintWarning("%s, importing %s in process\n" % (result["error"], filenames[i]))
+                importHere(i)
+                return
+            if "error" in result:
+                App.Console.PrintError("could not import %s: %s\n" % (filenames[i], result["error"]))
+                return
+            try:
+                brep = cache.put(key, lambda fn: shutil.move(tmp, fn),
+                                 {"file": os.path.abspath(filenames[i]), "object": result["object"]})
+                shape = Part.Shape()
+                shape.read(brep)
+                add(i, shape, result["object"])
+            except Exception as e:
+                App.Console.PrintError("could not import %s: %s\n" % (filenames[i], e))
+        return callback
+
+    pool = D3DWorker.WorkerPool(processes)
+    tmpdir = tempfile.mkdtemp("d3dimport")
+    try:
+        for i, filename in enumerate(filenames):
+            App.Console.PrintMessage("importing part from %s\n" % filename)
+            if mode == IMPORT_SHARED and sharedSource(doc_assembly, filename, objectName, sources) is not None:
+                add(i, None, None)
+                continue
+            if filename.lower().endswith(D3DWorker.IMPORT_EXTENSIONS) and filename not in open_files:
+                key = importCacheKey(filename, objectName)
+                if cache.get(key) is None:
+                    tmp = os.path.join(tmpdir, "%d.brep" % i)
+                    pool.submit("convert", [filename, tmp, objectName], converted(i, key, tmp))
+                    continue
+            importHere(i)
+        pool.wait(Gui.updateGui if App.GuiUp else None)
+    finally:
+        pool.cancel()
+        shutil.rmtree(tmpdir, True)
+    return parts
+
+def isImportedPart(obj):
+    return hasattr(obj, 'sourceFile') and hasattr(obj, 'timeLastImport')
+
+def isStale(obj):
+    """Return True, if the source file of the imported part changed since the last import."""
+    return os.path.isfile(obj.sourceFile) and os.path.getmtime(obj.sourceFile) != obj.timeLastImport
+
+def staleImports(doc=None):
+    """Return all imported parts in the document whose source file changed."""
+    if doc is None:
+        doc = App.ActiveDocument
+    return [ obj for obj in doc.Objects if isImportedPart(obj) and isStale(obj) ]
+
+def reimportPart(obj, useCache=True):
+    """Import the shape of an imported part again. Keep its placement and fixedPosition."""
+    objectName = getattr(obj, 'sourceObject', '')
+    shape, sourceName = importedShape(obj.sourceFile, objectName or None, useCache)
+    placement = obj.Placement
+    obj.Shape = shape
+    obj.Placement = placement
+    if not hasattr(obj, 'sourceObject'): # imported by an older version
+        obj.addProperty("App::PropertyString", "sourceObject", "D3D_ImportPart")
+    obj.sourceObject = sourceName
+    obj.timeLastImport = os.path.getmtime(obj.sourceFile)
+    return obj
+
+def refreshStaleImports(doc=None):
+    """Import all stale parts of the document again. Return list of the refreshed parts.
+
+    A part which cannot be imported is reported and skipped.
+    """
+    if doc is None:
+        doc = App.ActiveDocument
+    refreshed = []
+    for obj in staleImports(doc):
+        App.Console.PrintMessage("refreshing %s from %s\n" % (obj.Label, obj.sourceFile))
+        try:
+            refreshed.append(reimportPart(obj))
+        except Exception as e:
+            App.Console.PrintError("could not refresh %s: %s\n" % (obj.Label, e))
+    if refreshed:
+        doc.recompute()
+    return refreshed
+
+class ImportWatcher(QtCore.QObject):
+    """Refresh the imported parts of a document when their source files change.
+
+    By default the source files are watched with QFileSystemWatcher, which
+    uses inotify and similar services of the operating system. With a
+    positive pollInterval in ms, the files are polled instead, for example
+    for network file systems.
+    """
+    DELAY = 500 # ms to wait for the writer to finish the file.
+
+    def __init__(self, doc, pollInterval=0):
+        super(ImportWatcher, self).__init__()
+        self.doc = doc
+        self.refreshTimer = QtCore.QTimer()
+        self.refreshTimer.setSingleShot(True)
+        self.refreshTimer.setInterval(ImportWatcher.DELAY)
+        self.refreshTimer.timeout.connect(self.refresh)
+        self.pollTimer = None
+        self.watcher = None
+        if pollInterval > 0:
+            self.pollTimer = QtCore.QTimer()
+            self.pollTimer.setInterval(pollInterval)
+            self.pollTimer.timeout.connect(self.refresh)
+            self.pollTimer.start()
+        else:
+            self.watcher = QtCore.QFileSystemWatcher()
+            self.watcher.fileChanged.connect(self.fileChanged)
+            self.updateWatchedFiles()
+
+    def sourceFiles(self):
+        return sorted(set([ obj.sourceFile for obj in self.doc.Objects
+                            if isImportedPart(obj) and os.path.isfile(obj.sourceFile) ]))
+
+    def updateWatchedFiles(self):
+        # Files replaced by a rename are no longer watched. Add them again.
+        if self.watcher is None:
+            return
+        watched = set(self.watcher.files())
+        missing = [ f for f in self.sourceFiles() if f not in watched ]
+        if missing:
+            self.watcher.addPaths(missing)
+
+    def fileChanged(self, path):
+        self.refreshTimer.start()
+
+    def refresh(self):
+        if self.doc.Name not in App.listDocuments():
+            self.stop()
+            return
+        if refreshStaleImports(self.doc):
+            Gui.updateGui()
+        self.updateWatchedFiles()
+
+    def stop(self):
+        self.refreshTimer.stop()
+        if self.pollTimer is not None:
+            self.pollTimer.stop()
+        if self.watcher is not None:
+            files = self.watcher.files()
+            if files:
+                self.watcher.removePaths(files)
+
+# Active watchers by document name.
+_watchers = {}
+
+def watchImports(doc=None, pollInterval=0):
+    """Start refreshing imported parts of the document in the background."""
+    if doc is None:
+        doc = App.ActiveDocument
+    unwatchImports(doc)
+    _watchers[doc.Name] = ImportWatcher(doc, pollInterval)
+    return _watchers[doc.Name]
+
+def unwatchImports(doc=None):
+    if doc is None:
+        doc = App.ActiveDocument
+    watcher = _watchers.pop(doc.Name, None)
+    if watcher is not None:
+        watcher.stop()
+
+def isWatched(doc):
+    return doc is not None and doc.Name in _watchers
+
 class Proxy_importPart:
     def execute(self, shape):
         pass
@@ -95,22 +512,46 @@ class D3D_ImportPartCommand:
             "Select FreeCAD document to import part from"
             )
         dialog.setNameFilter("Supported Formats (*.FCStd *.brep *.brp *.imp *.iges *.igs *.obj *.step *.stp);;All files (*.*)")
+        dialog.setFileMode(QtGui.QFileDialog.ExistingFiles)
         if dialog.exec_():
-            filename = dialog.selectedFiles()[0]
+            filenames = dialog.selectedFiles()
         else:
             return
-        App.Console.PrintMessage(filename)
-        importedObject = importPart(filename)
-        App.ActiveDocument.recompute()
+        App.Console.PrintMessage("%s\n" % filenames)
+        objectName = importBodies()
+        with D3DTrace.span("D3D_ImportPart"):
+            if len(filenames) == 1:
+                importPart(filenames[0], objectName)
+            else:
+                with D3DTrace.span("importParts", count=len(filenames)):
+                    importParts(filenames, objectName=objectName)
+            with D3DTrace.span("document.recompute"):
+                App.ActiveDocument.recompute()
 
     def GuiViewFit(self):
         Gui.SendMsgToActiveView("ViewFit")
         self.timer.stop()
 
-    def GetResources(self):
-        return {
-            'Pixmap' : D3DInit.ICON_PATH + '/DrawStyleWireFrame.svg',
-            'MenuText': 'Import a part from another FreeCAD document',
-            'ToolTip': 'Import a part from another FreeCAD document'
-            }
-Gui.addCommand('D3D_ImportPart', D3D_ImportPartCommand())
\ No newline at end of file
+
+class D3D_RefreshImportsCommand:
+    def Activated(self):
+        refreshed = refreshStaleImports(App.ActiveDocument)
+        App.Console.PrintMessage("%d imported parts refreshed\n" % len(refreshed))
+
+    def IsActive(self):
+        return App.ActiveDocument is not None
+
+
+class D3D_WatchImportsCommand:
+    def Activated(self):
+        doc = App.ActiveDocument
+        if isWatched(doc):
+            unwatchImports(doc)
+            App.Console.PrintMessage("stopped watching imported parts of %s\n" % doc.Label)
+        else:
+            pollInterval = App.ParamGet(D3DBase.PARAMETER_PATH).GetInt("ImportPollInterval", 0)
+            watchImports(doc, pollInterval)
+            App.Console.PrintMessage("watching imported parts of %s\n" % doc.Label)
+
+    def IsActive(self):
+        return App.ActiveDocument is not None
@@ -33,8 +33,13 @@ class D3D_Workbench (Workbench):
 
     def Initialize(self):
         "This function is executed when FreeCAD starts"
-        import D3D_AddPvcFrame, D3D_ImportPart # import here all the needed files that create your FreeCAD commands
-        self.list = ["D3D_AddPvcFrame", "D3D_ImportPart"] # A list of command names created in the line above
+        import time
+        start = time.time()
+        # Commands are registered as stubs; the modules implementing them,
+        # and the libraries they need, are imported when a command is first used.
+        import D3DCommands
+        self.list = D3DCommands.register() # A list of command names created in the line above
+        D3DCommands.checkStartup(time.time() - start)
         self.appendToolbar("D3D", self.list) # creates a new toolbar with your commands
         #FreeCADGui.addIconPath( ':/d3d/icons' )
         #FreeCADGui.addPreferencePage( ':/d3d/ui/assembly2_prefs.ui','Assembly2' )
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Indexed part tables.
+#
+# A PartTable wraps a Piping.CsvTable. It builds a hash index on the part
+# name once and converts all dimension columns to numeric arrays in mm, so
+# lookups by name are O(1) and do not parse unit strings again.
+#
+# loadTable() keeps the loaded tables for the whole session and loads a
+# table again only when its CSV file changes. It can also store the indexed
+# tables as JSON files in the cache directory of the workbench.
+# compatibility() compares every pipe with every corner of two tables once
+# and tells which corners fit a pipe.
+
+import bisect
+import collections
+import copy
+import hashlib
+import json
+import os
+
+import numpy
+
+import FreeCAD
+
+import D3DBase
+import D3DTrace
+
+parseQuantity = FreeCAD.Units.parseQuantity
+
+KEY_COLUMN = "PartNumber"
+PIPE_DIMENSIONS = ["OD", "Thk"]
+CORNER_DIMENSIONS = ["G", "H", "M", "POD", "PThk"]
+# Substrings shorter than this are searched by a linear scan.
+NGRAM = 3
+# Compiled tables are JSON files in this folder of the workbench cache.
+COMPILED_FOLDER = "tables"
+COMPILED_VERSION = 2
+# A corner fits a pipe, if its POD and PThk differ from the pipe OD and Thk
+# by at most these tolerances in mm.
+OD_TOLERANCE = 0.5
+THK_TOLERANCE = 1.0
+# Number of table pairs, whose compatibility is kept.
+COMPATIBILITY_CACHE_SIZE = 4
+
+# Loaded tables by CSV file path. Values are (file signature, PartTable).
+_registry = {}
+# Compatibility by (id of pipe table, id of corner table, tolerances).
+_compatibility = collections.OrderedDict()
+
+
+def rowAsDict(headers, row):
+	if isinstance(row, dict):
+		return row
+	return dict(zip(headers, row))
+
+
+def parseLength(text):
+	"""Return length in mm or NaN, if text is not a valid quantity."""
+	try:
+		return parseQuantity(text).Value
+	except Exception:
+		return float("nan")
+
+
+def ngrams(text):
+	return set([text[i:i+NGRAM] for i in range(len(text) - NGRAM + 1)])
+
+
+class PartTable:
+	"""Part table with an index on the part name and dimensions in mm.
+
+	PartTable provides findPart() and getPartKey() like CsvTable and can be
+	used in its place.
+	"""
+	def __init__(self, csvTable, dimensions, columns=None):
+		self.csvTable = csvTable
+		self.headers = list(csvTable.headers)
+		self.dimensions = list(dimensions)
+		self.rows = [rowAsDict(self.headers, row) for row in csvTable.data]
+		self.names = [row[KEY_COLUMN] for row in self.rows]
+		self.index = {}
+		for i, name in enumerate(self.names):
+			# Like CsvTable.findPart(), use the first row with the name.
+			self.index.setdefault(name, i)
+		# columns are the parsed dimensions of a compiled table.
+		if columns is None:
+			columns = dict([(dim, [parseLength(row[dim]) for row in self.rows]) for dim in self.dimensions])
+		self.columns = {}
+		for dim in self.dimensions:
+			self.columns[dim] = numpy.array(columns[dim], dtype=float)
+		self.lowerNames = [name.lower() for name in self.names]
+		self.sortedNames = sorted(zip(self.lowerNames, range(len(self.names))))
+		self.ngramIndex = {}
+		for i, name in enumerate(self.lowerNames):
+			for gram in ngrams(name):
+				self.ngramIndex.setdefault(gram, set()).add(i)
+
+	def __len__(self):
+		return len(self.rows)
+
+	def __contains__(self, name):
+		return name in self.index
+
+	def rowIndex(self, name):
+		"""Return index of the row with the part name or None."""
+		return self.index.get(name)
+
+	def findPart(self, name):
+		"""Return row with the part name as a dictionary or None."""
+		i = self.index.get(name)
+		if i is None:
+			return None
+		return self.rows[i]
+
+	def getPartKey(self, index):
+		return self.names[index]
+
+	def column(self, dim):
+		"""Return array with the values of dimension dim in mm."""
+		return self.columns[dim]
+
+	def dims(self, name):
+		"""Return dictionary with dimensions of the part in mm or None."""
+		i = self.index.get(name)
+		if i is None:
+			return None
+		return dict([(dim, float(self.columns[dim][i])) for dim in self.dimensions])
+
+	def startingWith(self, prefix):
+		"""Return names of parts starting with prefix, ignoring case, in table order."""
+		prefix = prefix.lower()
+		start = bisect.bisect_left(self.sortedNames, (prefix, -1))
+		result = []
+		for name, i in self.sortedNames[start:]:
+			if not name.startswith(prefix):
+				break
+			result.append(i)
+		return [self.names[i] for i in sorted(result)]
+
+	def containing(self, text):
+		"""Return names of parts containing text, ignoring case, in table order."""
+		text = text.lower()
+		if len(text) < NGRAM:
+			candidates = range(len(self.names))
+		else:
+			sets = [self.ngramIndex.get(gram, set()) for gram in ngrams(text)]
+			candidates = sorted(set.intersection(*sets))
+		return [self.names[i] for i in candidates if text in self.lowerNames[i]]
+
+	def csvSubset(self, names):
+		"""Return a copy of the CsvTable with only the rows of the part names, in table order."""
+		rows = set([self.index[name] for name in names if name in self.index])
+		table = copy.copy(self.csvTable)
+		table.data = [row for i, row in enumerate(self.csvTable.data) if i in rows]
+		return table
+
+
+class Compatibility:
+	"""Which corners of a corner table fit which pipes of a pipe table.
+
+	The comparison of all pipes with all corners is done once with numpy.
+	matrix is a boolean array (pipe rows, corner rows). Queries by part
+	name are O(1) lookups in the name indices of the tables. Parts with
+	missing dimensions fit nothing.
+	"""
+	def __init__(self, pipeTable, cornerTable, odTolerance=OD_TOLERANCE, thkTolerance=THK_TOLERANCE):
+		self.pipeTable = pipeTable
+		self.cornerTable = cornerTable
+		OD = pipeTable.column("OD")[:, None]
+		Thk = pipeTable.column("Thk")[:, None]
+		POD = cornerTable.column("POD")[None, :]
+		PThk = cornerTable.column("PThk")[None, :]
+		with numpy.errstate(invalid="ignore"):
+			self.matrix = (numpy.abs(OD - POD) <= odTolerance) & (numpy.abs(Thk - PThk) <= thkTolerance)
+		self.cornerRows = [numpy.flatnonzero(row) for row in self.matrix]
+		self.pipeRows = [numpy.flatnonzero(column) for column in self.matrix.T]
+
+	def fits(self, pipeName, cornerName):
+		"""Return True, if the corner fits the pipe. Unknown parts fit nothing."""
+		i = self.pipeTable.rowIndex(pipeName)
+		j = self.cornerTable.rowIndex(cornerName)
+		if i is None or j is None:
+			return False
+		return bool(self.matrix[i, j])
+
+	def corners(self, pipeName):
+		"""Return names of the corners, which fit the pipe, in table order."""
+		i = self.pipeTable.rowIndex(pipeName)
+		if i is None:
+			return []
+		return [self.cornerTable.names[j] for j in self.cornerRows[i]]
+
+	def pipes(self, cornerName):
+		"""Return names of the pipes, which fit the corner, in table order."""
+		j = self.cornerTable.rowIndex(cornerName)
+		if j is None:
+			return []
+		return [self.pipeTable.names[i] for i in self.pipeRows[j]]
+
+
+def compatibility(pipeTable, cornerTable, odTolerance=OD_TOLERANCE, thkTolerance=THK_TOLERANCE):
+	"""Return Compatibility of the PartTable objects.
+
+	The result is kept for the last COMPATIBILITY_CACHE_SIZE table pairs.
+	Tables loaded again by loadTable() are new objects and get a new
+	Compatibility.
+	"""
+	key = (id(pipeTable), id(cornerTable), odTolerance, thkTolerance)
+	result = _compatibility.get(key)
+	if result is None or result.pipeTable is not pipeTable or result.cornerTable is not cornerTable:
+		with D3DTrace.span("compatibility", pipes=len(pipeTable), corners=len(cornerTable)):
+			result = Compatibility(pipeTable, cornerTable, odTolerance, thkTolerance)
+		_compatibility[key] = result
+		while len(_compatibility) > COMPATIBILITY_CACHE_SIZE:
+			_compatibility.popitem(last=False)
+	return result
+
+
+def indexed(table, dimensions):
+	"""Return table as PartTable. Wrap it, if it is a CsvTable."""
+	if isinstance(table, PartTable):
+		return table
+	return PartTable(table, dimensions)
+
+
+def fileSignature(path):
+	"""Return (modification time, size) of the file or None, if it does not exist."""
+	try:
+		st = os.stat(path)
+	except OSError:
+		return None
+	return (st.st_mtime, st.st_size)
+
+
+def persistTables():
+	"""Return the "PersistTables" workbench preference, default True."""
+	return FreeCAD.ParamGet(D3DBase.PARAMETER_PATH).GetBool("PersistTables", True)
+
+
+def compiledPath(path, directory=None):
+	"""Return path of the compiled table of the CSV file at path.
+
+	The file is in directory, by default in the "tables" cache directory
+	of the workbench. Its name is derived from the absolute CSV path.
+	"""
+	if directory is None:
+		import ShapeCache
+		directory = ShapeCache.cacheDirectory(COMPILED_FOLDER)
+	name = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+	return os.path.join(directory, name + ".json")
+
+
+def _loadCompiled(path, signature, dimensions):
+	# Compiled tables are plain JSON data, a planted file cannot run code.
+	try:
+		with open(compiledPath(path)) as f:
+			data = json.load(f)
+		if (data.get("version") != COMPILED_VERSION or data.get("path") != os.path.abspath(path)
+				or data.get("signature") != list(signature) or data.get("dimensions") != list(dimensions)):
+			return None
+		csvTable = _newCsv(dimensions)
+		csvTable.headers = data["headers"]
+		csvTable.data = data["data"]
+		csvTable.hasValidData = True
+		return PartTable(csvTable, dimensions, data["columns"])
+	except Exception:
+		return None
+
+
+def _saveCompiled(path, signature, table):
+	# Write a temporary file first. Batch workers load the same table at
+	# the same time and must not read a partial file.
+	tmp = None
+	try:
+		target = compiledPath(path)
+		tmp = "%s.%d.tmp" % (target, os.getpid())
+		data = {"version": COMPILED_VERSION, "path": os.path.abspath(path), "signature": list(signature),
+			"dimensions": table.dimensions, "headers": table.headers, "data": table.csvTable.data,
+			"columns": dict([(dim, table.columns[dim].tolist()) for dim in table.dimensions])}
+		with open(tmp, "w") as f:
+			json.dump(data, f)
+		if os.path.exists(target):
+			os.remove(target)
+		os.rename(tmp, target)
+	except Exception:
+		# The cache directory may not be writable, or the rows are not
+		# plain data. Then the table is just not persisted.
+		if tmp is not None and os.path.exists(tmp):
+			os.remove(tmp)
+
+
+def _newCsv(dimensions):
+	import OsePiping.Piping as Piping
+	return Piping.CsvTable(dimensions)
+
+
+def _loadCsv(path, dimensions):
+	table = _newCsv(dimensions)
+	table.load(path)
+	return table
+
+
+def loadTable(path, dimensions, load=None, persist=None):
+	"""Return PartTable for the CSV file at path.
+
+	The table is loaded once per session and again only when modification
+	time or size of the file change. load(path) must return a CsvTable,
+	by default it is loaded with Piping.CsvTable. Tables without valid data
+	are returned but not kept. If persist is True and the default loader
+	is used, the indexed table is also stored as a JSON file in the cache
+	directory of the workbench and reused by later sessions. By default
+	persist is the "PersistTables" workbench preference.
+
+	If the file does not exist, load(path) is called anyway, so it can
+	report the missing table, and its result is not kept.
+	"""
+	if persist is None:
+		persist = persistTables()
+	signature = fileSignature(path)
+	if signature is None or load is not None:
+		persist = False
+	entry = _registry.get(path)
+	if entry is not None and entry[0] == signature:
+		return entry[1]
+	with D3DTrace.span("loadTable", file=path):
+		return _loadTable(path, dimensions, signature, load, persist)
+
+
+def _loadTable(path, dimensions, signature, load, persist):
+	table = None
+	if persist:
+		table = _loadCompiled(path, signature, dimensions)
+	if table is None:
+		if load is None:
+			csvTable = _loadCsv(path, dimensions)
+		else:
+			csvTable = load(path)
+		table = PartTable(csvTable, dimensions)
+		if signature is None or not getattr(csvTable, "hasValidData", True):
+			return table
+		if persist:
+			_saveCompiled(path, signature, table)
+	_registry[path] = (signature, table)
+	return table
+
+
+def clearRegistry():
+	"""Forget all loaded tables."""
+	_registry.clear()
+	_compatibility.clear()
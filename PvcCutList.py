@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Cut lists for the pipes of frame boxes.
+#
+# Collect the pipe lengths of many frames, group them by pipe part and
+# find how to cut them from stock pipes of a standard length with little
+# waste. All lengths are in mm. The module does not depend on FreeCAD.
+
+import bisect
+import collections
+import math
+
+import PvcFrameLayout
+
+# Lengths closer than this are treated as equal.
+TOLERANCE = 1e-6
+
+# Default work budget of the exact search, see solveLengths().
+MAX_STEPS = 200000
+
+Plan = collections.namedtuple("Plan", ["stockLength", "kerf", "bars", "optimal"])
+Plan.__doc__ = """Cutting plan for one pipe part.
+
+bars is a list of stock bars, every bar is a list of cut lengths.
+optimal is True, if the number of bars is known to be minimal.
+"""
+
+
+def barWaste(plan, bar):
+	"""Return unused length of a bar of the plan."""
+	return plan.stockLength - sum(bar) - plan.kerf*len(bar)
+
+
+def planWaste(plan):
+	return sum([barWaste(plan, bar) for bar in plan.bars])
+
+
+def frameLengths(LX, LY, LZ, G):
+	"""Return the lengths of all 12 pipes of a frame box."""
+	layout = PvcFrameLayout.layout(LX, LY, LZ, G)
+	return [float(l) for l in layout.lengths[PvcFrameLayout.PIPES]]
+
+
+class CutList:
+	"""Pipe lengths grouped by pipe part name."""
+	def __init__(self):
+		self.lengths = collections.OrderedDict()
+
+	def addLengths(self, pipeName, lengths, count=1):
+		self.lengths.setdefault(pipeName, []).extend(list(lengths)*count)
+
+	def addFrame(self, pipeName, LX, LY, LZ, G, count=1):
+		"""Add the pipes of count frame boxes."""
+		self.addLengths(pipeName, frameLengths(LX, LY, LZ, G), count)
+
+	def addFrameObject(self, obj, count=1):
+		"""Add the pipes of a parametric PvcFrame.Frame object."""
+		self.addFrame(obj.PipeName, obj.LX.Value, obj.LY.Value, obj.LZ.Value, obj.G.Value, count)
+
+	def addSpec(self, pipeName, cornerName, LX, LY, LZ, cornerTable, count=1):
+		"""Add the pipes of count frames, which BoxFromTable would create.
+
+		cornerTable is a PartTable.PartTable. LX, LY and LZ are in mm.
+		"""
+		dims = cornerTable.dims(cornerName)
+		if dims is None:
+			raise KeyError('Corner part "%s" not found' % cornerName)
+		self.addFrame(pipeName, LX, LY, LZ, dims["G"], count)
+
+	def solve(self, stockLength, kerf=0.0, exact=False, maxSteps=MAX_STEPS):
+		"""Return dictionary of Plans by pipe name. See solveLengths()."""
+		return collections.OrderedDict([(name, solveLengths(lengths, stockLength, kerf, exact, maxSteps))
+			for name, lengths in self.lengths.items()])
+
+
+def bestFitDecreasing(lengths, stockLength, kerf=0.0):
+	"""Return list of bars. Every cut goes into the fullest bar where it still fits."""
+	# Remaining lengths of the bars sorted, together with the bar index.
+	remaining = []
+	bars = []
+	for length in sorted(lengths, reverse=True):
+		need = length + kerf
+		i = bisect.bisect_left(remaining, (need - TOLERANCE, -1))
+		if i == len(remaining):
+			bars.append([])
+			rest, bar = stockLength, len(bars) - 1
+		else:
+			rest, bar = remaining.pop(i)
+		bars[bar].append(length)
+		bisect.insort(remaining, (rest - need, bar))
+	return bars
+
+
+class _BudgetExceeded(Exception):
+	pass
+
+
+def _exact(lengths, stockLength, kerf, maxSteps):
+	"""Return minimal list of bars or raise _BudgetExceeded.
+
+	Equal lengths are grouped, so frames with only a few different pipe
+	lengths are solved fast. The search tries maximal cutting patterns
+	for the longest remaining length and memorizes solved states. Every
+	node of the pattern enumeration and of the recursion is one step;
+	the search gives up after maxSteps steps.
+	"""
+	counts = collections.Counter(lengths)
+	sizes = sorted(counts, reverse=True)
+	needs = [size + kerf for size in sizes]
+	memo = {}
+	steps = [0]
+
+	def step():
+		steps[0] += 1
+		if steps[0] > maxSteps:
+			raise _BudgetExceeded()
+
+	def lowerBound(state):
+		return int(math.ceil(sum([n*need for n, need in zip(state, needs)])/stockLength - TOLERANCE))
+
+	def patterns(state, first):
+		# Maximal patterns containing at least one piece of type first.
+		result = []
+		def extend(i, rest, pattern):
+			step()
+			if i == len(sizes):
+				# Keep only patterns where no further piece fits.
+				for j in range(len(sizes)):
+					if state[j] > pattern[j] and needs[j] <= rest + TOLERANCE:
+						return
+				result.append(tuple(pattern))
+				return
+			maximum = min(state[i], int((rest + TOLERANCE)//needs[i]))
+			minimum = 1 if i == first else 0
+			for n in range(maximum, minimum - 1, -1):
+				pattern.append(n)
+				extend(i + 1, rest - n*needs[i], pattern)
+				pattern.pop()
+		extend(0, stockLength, [])
+		return result
+
+	def solve(state):
+		if not any(state):
+			return []
+		if state in memo:
+			return memo[state]
+		step()
+		first = next(i for i, n in enumerate(state) if n > 0)
+		bound = lowerBound(state)
+		best = None
+		for pattern in patterns(state, first):
+			rest = solve(tuple([n - p for n, p in zip(state, pattern)]))
+			if best is None or len(rest) + 1 < len(best):
+				best = [pattern] + rest
+				if len(best) <= bound:
+					break
+		memo[state] = best
+		return best
+
+	solution = solve(tuple([counts[size] for size in sizes]))
+	return [[size for size, n in zip(sizes, pattern) for k in range(n)] for pattern in solution]
+
+
+def solveLengths(lengths, stockLength, kerf=0.0, exact=False, maxSteps=MAX_STEPS):
+	"""Return Plan for cutting lengths from stock bars of stockLength.
+
+	Every cut consumes kerf. The heuristic best-fit decreasing is used by
+	default. With exact=True the number of bars is minimized, unless the
+	search needs more than maxSteps steps; then the heuristic plan is
+	returned with optimal=False.
+	"""
+	for length in lengths:
+		if length + kerf > stockLength + TOLERANCE:
+			raise ValueError("Pipe of length %s mm does not fit into stock length %s mm" % (length, stockLength))
+	bars = bestFitDecreasing(lengths, stockLength, kerf)
+	lowerBound = int(math.ceil((sum(lengths) + kerf*len(lengths))/stockLength - TOLERANCE))
+	optimal = len(bars) <= lowerBound
+	if exact and not optimal:
+		try:
+			exactBars = _exact(lengths, stockLength, kerf, maxSteps)
+			if len(exactBars) <= len(bars):
+				bars = exactBars
+			optimal = True
+		except _BudgetExceeded:
+			pass
+	return Plan(stockLength, kerf, bars, optimal)
+
+
+def formatPlans(plans):
+	"""Return a printable cut list."""
+	lines = []
+	for name, plan in plans.items():
+		lines.append("%s: %d bars of %g mm, waste %g mm%s" % (name, len(plan.bars), plan.stockLength,
+			planWaste(plan), "" if plan.optimal else " (may not be optimal)"))
+		for bar in plan.bars:
+			lines.append("  %s | waste %g" % (", ".join(["%g" % l for l in bar]), barWaste(plan, bar)))
+	return "\n".join(lines)
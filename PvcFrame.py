@@ -29,13 +29,38 @@
 
 import FreeCAD
 import Draft
+import Part
 
 import OsePiping.Piping as Piping
 import OsePiping.Corner as CornerMod
 import OsePiping.Pipe as PipeMod
+import D3DTrace
+import PartTable
+import PvcFrameLayout
+import PvcFrameSpec
+import ShapeCache
 
 parseQuantity = FreeCAD.Units.parseQuantity
 
+# How Box.create() represents equal pipes and corners.
+# Draft clones of one source object.
+INSTANCING_CLONE = "clone"
+# One App::Link array for every source object (FreeCAD 0.19 or newer).
+INSTANCING_LINK = "link"
+# A single Part::Feature with a compound of all pipes and corners.
+INSTANCING_COMPOUND = "compound"
+INSTANCING_MODES = (INSTANCING_CLONE, INSTANCING_LINK, INSTANCING_COMPOUND)
+
+
+def mm(value):
+	"""Return a length quantity of value millimeters."""
+	return FreeCAD.Units.Quantity(float(value), FreeCAD.Units.Unit(1))
+
+
+def placementFromMatrix(matrix):
+	"""Convert a 4x4 array to FreeCAD.Placement."""
+	return FreeCAD.Placement(FreeCAD.Matrix(*[float(v) for v in matrix.flatten()]))
+
 
 class Box:
 	def __init__(self, document):
@@ -47,6 +72,8 @@ class Box:
 		self.POD = parseQuantity("3 cm")
 		self.Thk = parseQuantity("0.5 cm")
 		self.corner = CornerMod.Corner(document)
+		self.pipeName = ""
+		self.cornerName = ""
 
 	def checkDimensions(self):
 		if not ( self.POD > parseQuantity("0 mm") and self.Thk > parseQuantity("0 mm") ):
@@ -58,105 +85,316 @@ class Box:
 		if not (self.LZ > 2*self.G):
 			raise Piping.UnplausibleDimensions("The length LZ %smust be larger than 2*G %s"%(self.LZ, 2*self.G))
 
-	def createPipes(self, group, convertToSolid):
-		# Calculate pipe lengths.
-		x_pipe_l = self.LX - 2*self.G
-		y_pipe_l = self.LY - 2*self.G
-		z_pipe_l = self.LZ - 2*self.G
-		# First 3 pipes around the (0,0,0) origin in X,Y,Z direction
-		pipe = PipeMod.Pipe(self.document)
-		pipe.OD = self.POD
-		pipe.Thk = self.Thk
-		pipe.H = z_pipe_l
-		zpipe = pipe.create(convertToSolid)
-		group.addObject(zpipe)
-		zpipe.Placement.Base = FreeCAD.Vector(0,0,self.G)
-		zpipe.Label = "z-"+zpipe.Label
-		pipe.H = x_pipe_l
-		xpipe = pipe.create(convertToSolid)
-		group.addObject(xpipe)
-		xpipe.Placement = FreeCAD.Placement(FreeCAD.Vector(self.G, 0,0), FreeCAD.Rotation(FreeCAD.Vector(0,1,0),90), FreeCAD.Vector(0,0,0))
-		xpipe.Label = "x-"+xpipe.Label
-		pipe.H = y_pipe_l
-		ypipe = pipe.create(convertToSolid)
-		group.addObject(ypipe)
-		ypipe.Placement = FreeCAD.Placement(FreeCAD.Vector(0, self.G,0), FreeCAD.Rotation(FreeCAD.Vector(1,0,0),-90), FreeCAD.Vector(0,0,0))
-		ypipe.Label = "y-"+ypipe.Label
-
-		# Add 3 clones for each x,y,z-type of axis. Place them on the edges of the cube.
-		# First add z-pipes (because it simple, and does not require rotation).
-		tmp = Draft.clone(zpipe, FreeCAD.Vector(self.LX,0,self.G))
-		group.addObject(tmp)
-		tmp = Draft.clone(zpipe, FreeCAD.Vector(0, self.LY,self.G))
-		group.addObject(tmp)
-		tmp = Draft.clone(zpipe, FreeCAD.Vector(self.LX, self.LY,self.G))
-		group.addObject(tmp)
-		# Then add x pipes.
-		tmp = Draft.clone(xpipe)
-		group.addObject(tmp)
-		tmp.Placement = FreeCAD.Placement(FreeCAD.Vector(self.G, self.LY, 0), FreeCAD.Rotation(FreeCAD.Vector(0,1,0),90), FreeCAD.Vector(0,0,0))
-		tmp = Draft.clone(xpipe)
-		group.addObject(tmp)
-		tmp.Placement = FreeCAD.Placement(FreeCAD.Vector(self.G, 0, self.LZ), FreeCAD.Rotation(FreeCAD.Vector(0,1,0),90), FreeCAD.Vector(0,0,0))
-		tmp = Draft.clone(xpipe)
-		group.addObject(tmp)
-		tmp.Placement = FreeCAD.Placement(FreeCAD.Vector(self.G, self.LY, self.LZ), FreeCAD.Rotation(FreeCAD.Vector(0,1,0),90), FreeCAD.Vector(0,0,0))
-		# Finally add y pipes.
-		tmp = Draft.clone(ypipe)
-		group.addObject(tmp)
-		tmp.Placement = FreeCAD.Placement(FreeCAD.Vector(self.LX, self.G, 0), FreeCAD.Rotation(FreeCAD.Vector(1,0,0),-90), FreeCAD.Vector(0,0,0))
-		tmp = Draft.clone(ypipe)
-		group.addObject(tmp)
-		tmp.Placement = FreeCAD.Placement(FreeCAD.Vector(0, self.G, self.LZ), FreeCAD.Rotation(FreeCAD.Vector(1,0,0),-90), FreeCAD.Vector(0,0,0))
-		tmp = Draft.clone(ypipe)
-		group.addObject(tmp)
-		tmp.Placement = FreeCAD.Placement(FreeCAD.Vector(self.LX, self.G, self.LZ), FreeCAD.Rotation(FreeCAD.Vector(1,0,0),-90), FreeCAD.Vector(0,0,0))
-
-	def addCorners(self, group, convertToSolid):
-		corner = self.corner.create(convertToSolid)
-		group.addObject(corner)
-		# clone the corners and put them on right positions.
-		tmp = Draft.clone(corner)
-		group.addObject(tmp)
-		tmp.Placement = FreeCAD.Placement(FreeCAD.Vector(0, 0, self.LZ), FreeCAD.Rotation(FreeCAD.Vector(0,1,0),90), FreeCAD.Vector(0,0,0))
-		tmp = Draft.clone(corner)
-		group.addObject(tmp)
-		tmp.Placement = FreeCAD.Placement(FreeCAD.Vector(self.LX,0, self.LZ), FreeCAD.Rotation(FreeCAD.Vector(0,1,0),180), FreeCAD.Vector(0,0,0))
-		tmp = Draft.clone(corner)
-		group.addObject(tmp)
-		tmp.Placement = FreeCAD.Placement(FreeCAD.Vector(self.LX,0,0), FreeCAD.Rotation(FreeCAD.Vector(0,1,0),270), FreeCAD.Vector(0,0,0))
-
-		tmp = Draft.clone(corner)
-		group.addObject(tmp)
-		tmp.Placement = FreeCAD.Placement(FreeCAD.Vector(self.LX,self.LY,0), FreeCAD.Rotation(FreeCAD.Vector(0,0,1),180), FreeCAD.Vector(0,0,0))
-		tmp = Draft.clone(corner)
-		group.addObject(tmp)
-		tmp.Placement = FreeCAD.Placement(FreeCAD.Vector(0,self.LY,0), FreeCAD.Rotation(FreeCAD.Vector(0,0,1),270), FreeCAD.Vector(0,0,0))
-
-		tmp = Draft.clone(corner)
-		group.addObject(tmp)
-		tmp.Placement = FreeCAD.Placement(FreeCAD.Vector(0,self.LY, self.LZ), FreeCAD.Rotation(FreeCAD.Vector(1,0,0),180), FreeCAD.Vector(0,0,0))
-		tmp = Draft.clone(corner)
-		group.addObject(tmp)
-		# First rotation.
-		tmp.Placement = FreeCAD.Placement(FreeCAD.Vector(0,0,0), FreeCAD.Rotation(FreeCAD.Vector(0,0,1),180), FreeCAD.Vector(0,0,0))
-		# Second rotation + shift.
-		tmp.Placement = FreeCAD.Placement(FreeCAD.Vector(self.LX,self.LY, self.LZ), FreeCAD.Rotation(FreeCAD.Vector(1,0,0),90), FreeCAD.Vector(0,0,0)).multiply(tmp.Placement)
-
-	def create(self, convertToSolid):
-		self.checkDimensions()
-		group = self.document.addObject("App::DocumentObjectGroup", "frame box group")
-		self.createPipes(group, convertToSolid)
-		self.addCorners(group, convertToSolid)
+	def layout(self):
+		"""Return PvcFrameLayout.Layout of the pipes and corners of this box."""
+		return PvcFrameLayout.layout(self.LX.Value, self.LY.Value, self.LZ.Value, self.G.Value)
+
+	def sources(self, layout, convertToSolid):
+		"""Return dictionary of (shape cache key, builder factory) for every member with own geometry."""
+		dims = self.corner.dims
+		result = {}
+		for i in set(layout.sources):
+			if layout.roles[i] == PvcFrameLayout.ROLE_CORNER:
+				result[i] = (ShapeCache.cornerKey(dims.G, dims.H, dims.M, dims.POD, dims.PThk, convertToSolid),
+					cornerBuilder(dims.G, dims.H, dims.M, dims.POD, dims.PThk))
+			else:
+				H = mm(layout.lengths[i])
+				result[i] = (ShapeCache.pipeKey(self.POD, self.Thk, H, convertToSolid),
+					pipeBuilder(self.POD, self.Thk, H))
+		return result
+
+	def addMembers(self, group, members, layout, createSource, instancing=INSTANCING_CLONE):
+		"""Add frame members with indices members to the group.
+
+		Members with own geometry are created by createSource(i). With
+		INSTANCING_CLONE all other members are Draft clones of them. With
+		INSTANCING_LINK every source object is hidden and shown at all its
+		positions by a single App::Link array. Return list of the created
+		objects.
+		"""
+		objects = {}
+		for i in members:
+			source = layout.sources[i]
+			if source == i:
+				obj = createSource(i)
+			elif instancing == INSTANCING_LINK:
+				continue
+			else:
+				with D3DTrace.span("clone"):
+					obj = Draft.clone(objects[source])
+			group.addObject(obj)
+			obj.Placement = placementFromMatrix(layout.transforms[i])
+			objects[i] = obj
+		if instancing == INSTANCING_LINK:
+			with D3DTrace.span("links"):
+				self.addLinks(group, members, layout, objects)
+		return list(objects.values())
+
+	def addLinks(self, group, members, layout, objects):
+		"""Add an App::Link array for every source object in objects and hide the source."""
+		for source in [i for i in members if layout.sources[i] == i]:
+			link = self.document.addObject("App::Link", objects[source].Name + "Array")
+			link.setLink(objects[source])
+			# Do not create an object for every element.
+			link.ShowElement = False
+			placements = [placementFromMatrix(layout.transforms[i]) for i in members if layout.sources[i] == source]
+			link.ElementCount = len(placements)
+			link.PlacementList = placements
+			group.addObject(link)
+			objects[source].Visibility = False
+			objects[link.Name] = link
+
+	def createPart(self, name, key, makeBuilder, convertToSolid):
+		"""Return a new Part::Feature with the shape of a pipe or corner.
+
+		The shape comes from the shape cache. On a miss it is built with
+		makeBuilder in a scratch document, see sourceShape(). The members
+		are therefore plain shapes and not parametric OsePiping objects,
+		whether the shape was cached or not. Use createParametric() for a
+		frame, whose dimensions can be edited.
+		"""
+		shape = sourceShape(key, makeBuilder, convertToSolid)
+		with D3DTrace.span("part " + name):
+			obj = self.document.addObject("Part::Feature", name)
+			obj.Shape = shape
+		return obj
+
+	def createPipes(self, group, convertToSolid, instancing=INSTANCING_CLONE):
+		layout = self.layout()
+		sources = self.sources(layout, convertToSolid)
+
+		def createPipe(i):
+			key, makeBuilder = sources[i]
+			obj = self.createPart("Pipe", key, makeBuilder, convertToSolid)
+			obj.Label = PvcFrameLayout.AXES[layout.roles[i]]+"-"+obj.Label
+			return obj
+
+		# 3 pipes around the (0,0,0) origin in X,Y,Z direction and 3 copies
+		# for each x,y,z-type of axis on the edges of the cube.
+		return self.addMembers(group, PvcFrameLayout.PIPES, layout, createPipe, instancing)
+
+	def addCorners(self, group, convertToSolid, instancing=INSTANCING_CLONE):
+		layout = self.layout()
+		sources = self.sources(layout, convertToSolid)
+		# Create one corner and copy it to the other positions.
+		def createCorner(i):
+			key, makeBuilder = sources[i]
+			return self.createPart("Corner", key, makeBuilder, convertToSolid)
+		return self.addMembers(group, PvcFrameLayout.CORNERS, layout, createCorner, instancing)
+
+	def createCompound(self, group, convertToSolid):
+		"""Add a single Part::Feature with all pipes and corners to the group.
+
+		The compound shares the geometry of equal members.
+		"""
+		layout = self.layout()
+		shapes = dict([(i, sourceShape(key, makeBuilder, convertToSolid))
+			for i, (key, makeBuilder) in self.sources(layout, convertToSolid).items()])
+		obj = self.document.addObject("Part::Feature", "Frame")
+		obj.Shape = compoundOfMembers(layout, shapes)
+		group.addObject(obj)
+		return obj
+
+	def create(self, convertToSolid, instancing=INSTANCING_CLONE):
+		"""Create the frame in a new group and return the group.
+
+		instancing selects how equal pipes and corners are represented,
+		see INSTANCING_CLONE, INSTANCING_LINK and INSTANCING_COMPOUND.
+		"""
+		if instancing not in INSTANCING_MODES:
+			raise ValueError("Unknown instancing mode %s" % instancing)
+		with D3DTrace.span("Box.create", solid=convertToSolid, instancing=instancing):
+			with D3DTrace.span("checkDimensions"):
+				self.checkDimensions()
+			group = self.document.addObject("App::DocumentObjectGroup", "frame box group")
+			if instancing == INSTANCING_COMPOUND:
+				with D3DTrace.span("createCompound"):
+					self.createCompound(group, convertToSolid)
+			else:
+				with D3DTrace.span("createPipes"):
+					self.createPipes(group, convertToSolid, instancing)
+				with D3DTrace.span("addCorners"):
+					self.addCorners(group, convertToSolid, instancing)
 		return group
 
+	def createParametric(self, convertToSolid):
+		"""Create a single parametric Frame object with the dimensions of this box."""
+		self.checkDimensions()
+		obj = self.document.addObject("Part::FeaturePython", "Frame")
+		Frame(obj)
+		obj.LX = self.LX
+		obj.LY = self.LY
+		obj.LZ = self.LZ
+		obj.PipeName = self.pipeName
+		obj.PipeOD = self.POD
+		obj.PipeThk = self.Thk
+		obj.CornerName = self.cornerName
+		dims = self.corner.dims
+		obj.G = dims.G
+		obj.H = dims.H
+		obj.M = dims.M
+		obj.CornerPOD = dims.POD
+		obj.CornerPThk = dims.PThk
+		obj.Solid = convertToSolid
+		if FreeCAD.GuiUp:
+			obj.ViewObject.Proxy = 0
+		return obj
+
+
+class Frame:
+	"""Parametric frame box.
+
+	The frame is a single Part::FeaturePython object. Its shape is a compound
+	of all pipes and corners. The proxy keeps the shapes of the source pipes
+	and of the corner together with the dimensions they were built from. On
+	recompute it rebuilds only the shapes whose dimensions changed, for example
+	only the x-pipes when LX changes, and moves all members to their new
+	placements.
+	"""
+	def __init__(self, obj):
+		obj.addProperty("App::PropertyLength", "LX", "Frame", "Outer length in x direction")
+		obj.addProperty("App::PropertyLength", "LY", "Frame", "Outer length in y direction")
+		obj.addProperty("App::PropertyLength", "LZ", "Frame", "Outer length in z direction")
+		obj.addProperty("App::PropertyBool", "Solid", "Frame", "Convert pipes and corners to solids")
+		obj.addProperty("App::PropertyString", "PipeName", "Pipe", "Pipe part name")
+		obj.addProperty("App::PropertyLength", "PipeOD", "Pipe", "Pipe outer diameter")
+		obj.addProperty("App::PropertyLength", "PipeThk", "Pipe", "Pipe wall thickness")
+		obj.addProperty("App::PropertyString", "CornerName", "Corner", "Corner part name")
+		obj.addProperty("App::PropertyLength", "G", "Corner", "Distance from the corner origin to the pipe end")
+		obj.addProperty("App::PropertyLength", "H", "Corner", "Corner dimension H")
+		obj.addProperty("App::PropertyLength", "M", "Corner", "Corner dimension M")
+		obj.addProperty("App::PropertyLength", "CornerPOD", "Corner", "Outer diameter of the pipe fitting into the corner")
+		obj.addProperty("App::PropertyLength", "CornerPThk", "Corner", "Wall thickness of the pipe fitting into the corner")
+		obj.Proxy = self
+		self.shapes = {}
+
+	def __getstate__(self):
+		return None
+
+	def __setstate__(self, state):
+		self.shapes = {}
+		return None
+
+	def box(self, obj):
+		"""Return Box with the dimensions of the frame object."""
+		box = Box(obj.Document)
+		box.LX, box.LY, box.LZ, box.G = obj.LX, obj.LY, obj.LZ, obj.G
+		box.POD, box.Thk = obj.PipeOD, obj.PipeThk
+		dims = box.corner.dims
+		dims.G, dims.H, dims.M, dims.POD, dims.PThk = obj.G, obj.H, obj.M, obj.CornerPOD, obj.CornerPThk
+		return box
+
+	def execute(self, obj):
+		with D3DTrace.span("Frame.execute"):
+			self.update(obj)
+
+	def update(self, obj):
+		box = self.box(obj)
+		box.checkDimensions()
+		layout = box.layout()
+		shapes = {}
+		for i, (key, makeBuilder) in box.sources(layout, obj.Solid).items():
+			cached = self.shapes.get(i)
+			if cached is None or cached[0] != key:
+				cached = (key, sourceShape(key, makeBuilder, obj.Solid))
+			shapes[i] = cached
+		self.shapes = shapes
+		placement = obj.Placement
+		obj.Shape = compoundOfMembers(layout, dict([(i, shape) for i, (key, shape) in shapes.items()]))
+		obj.Placement = placement
+
+
+def pipeBuilder(OD, Thk, H):
+	"""Return function, which returns a pipe builder for a document."""
+	def makeBuilder(document):
+		pipe = PipeMod.Pipe(document)
+		pipe.OD = OD
+		pipe.Thk = Thk
+		pipe.H = H
+		return pipe
+	return makeBuilder
+
+
+def cornerBuilder(G, H, M, POD, PThk):
+	"""Return function, which returns a corner builder for a document."""
+	def makeBuilder(document):
+		corner = CornerMod.Corner(document)
+		corner.dims.G = G
+		corner.dims.H = H
+		corner.dims.M = M
+		corner.dims.POD = POD
+		corner.dims.PThk = PThk
+		return corner
+	return makeBuilder
+
+
+def builderFromKey(key):
+	"""Return builder factory for a shape cache key of ShapeCache.pipeKey() or ShapeCache.cornerKey()."""
+	key = tuple(key)
+	if key[0] == "pipe":
+		return pipeBuilder(*[mm(v) for v in key[1:4]])
+	if key[0] == "corner":
+		return cornerBuilder(*[mm(v) for v in key[1:6]])
+	raise ValueError("Unknown shape key %r" % (key,))
+
+
+def sourceShape(key, makeBuilder, convertToSolid):
+	"""Return shape of a pipe or corner from the shape cache, build it if necessary."""
+	return ShapeCache.shapeCache.getOrBuild(key, lambda: buildShape(makeBuilder, convertToSolid))
+
+
+def compoundOfMembers(layout, shapes):
+	"""Return compound of all members of the layout.
+
+	shapes is a dictionary of shapes by the index of the source member.
+	"""
+	return Part.makeCompound([placedShape(shapes[layout.sources[i]], placementFromMatrix(layout.transforms[i]))
+		for i in range(PvcFrameLayout.MEMBER_COUNT)])
+
+
+def _newScratchDocument():
+	try:
+		return FreeCAD.newDocument("PvcFrameScratch", "PvcFrameScratch", True)
+	except TypeError:
+		# FreeCAD before 0.19 cannot create hidden documents.
+		return FreeCAD.newDocument("PvcFrameScratch")
+
+
+def buildShape(makeBuilder, convertToSolid):
+	"""Return shape of the part created by makeBuilder(document).create(convertToSolid).
+
+	The part is created in a temporary document, which is closed afterwards.
+	The returned shape has no placement.
+	"""
+	active = FreeCAD.ActiveDocument
+	document = _newScratchDocument()
+	try:
+		obj = makeBuilder(document).create(convertToSolid)
+		document.recompute()
+		shape = obj.Shape.copy()
+	finally:
+		FreeCAD.closeDocument(document.Name)
+		if active is not None:
+			FreeCAD.setActiveDocument(active.Name)
+	shape.Placement = FreeCAD.Placement()
+	return shape
+
+
+def placedShape(shape, placement):
+	"""Return shape moved to placement. Share the geometry, if FreeCAD supports it."""
+	if hasattr(shape, "moved"):
+		return shape.moved(placement)
+	result = shape.copy()
+	result.Placement = placement
+	return result
+
 
 class BoxFromTable:
 	"""Create a part with dimensions from a CSV table."""
 	def __init__ (self, document, pipe_table, corner_table):
 		self.document = document
-		self.pipe_table = pipe_table
-		self.corner_table = corner_table
+		self.pipe_table = PartTable.indexed(pipe_table, PartTable.PIPE_DIMENSIONS)
+		self.corner_table = PartTable.indexed(corner_table, PartTable.CORNER_DIMENSIONS)
 		# Set some test values. Replace them by custom values
 		# before to call BoxFromTable.create().
 		self.LX = parseQuantity("12 in")
@@ -165,35 +403,123 @@ class BoxFromTable:
 
 	def getCorner(self, partName):
 		corner = CornerMod.Corner(self.document)
-		row = self.corner_table.findPart(partName)
-		if row is None:
+		dims = self.corner_table.dims(partName)
+		if dims is None:
 			print('Corner part "%s" not found'%partName)
 			return
-		corner.dims.G = parseQuantity(row["G"])
-		corner.dims.H = parseQuantity(row["H"])
-		corner.dims.M = parseQuantity(row["M"])
-		corner.dims.POD = parseQuantity(row["POD"])
-		corner.dims.PThk = parseQuantity(row["PThk"])
+		corner.dims.G = mm(dims["G"])
+		corner.dims.H = mm(dims["H"])
+		corner.dims.M = mm(dims["M"])
+		corner.dims.POD = mm(dims["POD"])
+		corner.dims.PThk = mm(dims["PThk"])
 		return corner
 
-	def create(self, pipeName, cornerName, convertToSolid = True):
+	def compatibility(self):
+		"""Return PartTable.Compatibility of the tables."""
+		return PartTable.compatibility(self.pipe_table, self.corner_table)
+
+	def checkCompatibility(self, pipeName, cornerName):
+		"""Raise UnplausibleDimensions, if the corner does not fit the pipe."""
+		if not self.compatibility().fits(pipeName, cornerName):
+			pipe = self.pipe_table.dims(pipeName)
+			corner = self.corner_table.dims(cornerName)
+			raise Piping.UnplausibleDimensions("Corner %s for POD=%s mm and PThk=%s mm does not fit pipe %s with OD=%s mm and Thk=%s mm"
+				% (cornerName, corner["POD"], corner["PThk"], pipeName, pipe["OD"], pipe["Thk"]))
+
+	def getBox(self, pipeName, cornerName):
+		"""Return Box with the dimensions of the pipe and the corner from the tables.
+
+		Return None, if a part is not in the tables. Raise
+		UnplausibleDimensions, if the corner does not fit the pipe.
+		"""
 		frame_box = Box(self.document)
 		frame_box.LX = self.LX
 		frame_box.LY = self.LY
 		frame_box.LZ = self.LZ
 		# Init corner datata
 		frame_box.corner = self.getCorner(cornerName)
+		if frame_box.corner is None:
+			return
 		frame_box.G = frame_box.corner.dims.G
+		frame_box.cornerName = cornerName
 
 		"setup pipe dimensions"
-		row = self.pipe_table.findPart(pipeName)
-		if row is None:
+		dims = self.pipe_table.dims(pipeName)
+		if dims is None:
 			print('Pipe part "%s" not found'%pipeName)
 			return
+		self.checkCompatibility(pipeName, cornerName)
+
+		frame_box.POD = mm(dims["OD"])
+		frame_box.Thk = mm(dims["Thk"])
+		frame_box.pipeName = pipeName
+		return frame_box
 
-		frame_box.POD = parseQuantity(row["OD"])
-		frame_box.PThk = parseQuantity(row["Thk"])
-		return frame_box.create(convertToSolid)
+	def create(self, pipeName, cornerName, convertToSolid = True, instancing = INSTANCING_CLONE):
+		frame_box = self.getBox(pipeName, cornerName)
+		if frame_box is None:
+			return
+		return frame_box.create(convertToSolid, instancing)
+
+	def createParametric(self, pipeName, cornerName, convertToSolid = True):
+		"""Create a single parametric frame object. See Frame."""
+		frame_box = self.getBox(pipeName, cornerName)
+		if frame_box is None:
+			return
+		return frame_box.createParametric(convertToSolid)
+
+	def createFromSpec(self, spec, useCache = True):
+		"""Create the frame of a PvcFrameSpec spec and return its group.
+
+		If useCache is True and the build cache has a frame with the same
+		spec, table rows and workbench version, merge it into the document
+		instead of building it. Otherwise build the frame in a temporary
+		document, store it in the cache and merge it.
+		"""
+		spec = PvcFrameSpec.normalize(spec)
+		pipeRow = self.pipe_table.findPart(spec["pipe"])
+		cornerRow = self.corner_table.findPart(spec["corner"])
+		if pipeRow is None or cornerRow is None:
+			print('Pipe "%s" or corner "%s" not found'%(spec["pipe"], spec["corner"]))
+			return
+		self.checkCompatibility(spec["pipe"], spec["corner"])
+		if not useCache:
+			return self.createSpec(self.document, spec)
+		cache = PvcFrameSpec.buildCache()
+		key = PvcFrameSpec.specHash(spec, pipeRow, cornerRow)
+		path = cache.get(key)
+		if path is None:
+			with D3DTrace.span("build frame spec"):
+				active = FreeCAD.ActiveDocument
+				document = _newScratchDocument()
+				try:
+					if self.createSpec(document, spec) is None:
+						return
+					document.recompute()
+					path = cache.put(key, document.saveCopy, spec)
+				finally:
+					FreeCAD.closeDocument(document.Name)
+					if active is not None:
+						FreeCAD.setActiveDocument(active.Name)
+		with D3DTrace.span("merge cached frame"):
+			names = set([o.Name for o in self.document.Objects])
+			self.document.mergeProject(path)
+			groups = [o for o in self.document.Objects if o.Name not in names
+				and o.isDerivedFrom("App::DocumentObjectGroup")]
+		return groups[0] if groups else None
+
+	def createSpec(self, document, spec):
+		"""Build the frame of a normalized spec in document. Return its group."""
+		table = BoxFromTable(document, self.pipe_table, self.corner_table)
+		table.LX, table.LY, table.LZ = mm(spec["LX"]), mm(spec["LY"]), mm(spec["LZ"])
+		return table.create(spec["pipe"], spec["corner"], spec["solid"], spec["instancing"])
+
+	def createCandidate(self, candidate, convertToSolid = True, instancing = INSTANCING_CLONE):
+		"""Create the frame of a PvcFrameOptimizer.Candidate."""
+		self.LX = mm(candidate.LX)
+		self.LY = mm(candidate.LY)
+		self.LZ = mm(candidate.LZ)
+		return self.create(candidate.pipeName, candidate.cornerName, convertToSolid, instancing)
 
 # Test macros.
 def TestBox():
@@ -209,9 +535,12 @@ def TestTable():
 	pipe_table.load(PipeMod.CSV_TABLE_PATH)
 	corner_table.load(CornerMod.CSV_TABLE_PATH)
 	box = BoxFromTable(document, pipe_table, corner_table)
-	#pipeName = pipe_table.getPartKey(0)
 	pipeName = "NPS 2\" PVC SCH 40"
-	cornerName = corner_table.getPartKey(0)
+	corners = box.compatibility().corners(pipeName)
+	if not corners:
+		print("No corner fits pipe %s"%pipeName)
+		return
+	cornerName = corners[0]
 
 	print("Using pipe %s"%pipeName)
 	print("Using corner %s"%cornerName)
@@ -219,5 +548,15 @@ def TestTable():
 	box.create(pipeName, cornerName, False)
 	document.recompute()
 
+def TestInstancing():
+	"""Compare time, memory, object count and file size of the instancing modes."""
+	import D3DBenchmark
+	results = []
+	D3DBenchmark.benchmarkInstancing(results)
+	for r in results:
+		print("%-40s %8.3f s %8s MB %4s objects %8s MB file" % (r["name"], r["seconds"],
+			D3DBenchmark._mb(r, "rssDelta"), r.get("objects", "-"), D3DBenchmark._mb(r, "fileSize")))
+
 #TestBox()
 #TestTable()
+#TestInstancing()
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Generate many PVC frame boxes in one headless run.
+#
+# The sweep specification is a JSON file. Every dimension is either a list
+# of lengths or a range with start, stop and step. The batch builds all
+# combinations of LX x LY x LZ x pipes x corners:
+#
+# {
+#   "LX": ["30 cm", "40 cm"],
+#   "LY": {"start": "20 cm", "stop": "40 cm", "step": "10 cm"},
+#   "LZ": ["40 cm"],
+#   "pipes": ["NPS 1\" PVC SCH 40"],
+#   "corners": ["..."],
+#   "solid": true,
+#   "formats": ["FCStd", "STEP"],
+#   "shapeCache": "shapes",
+#   "instancing": "clone"
+# }
+#
+# The optional "shapeCache" is a directory, relative to the output
+# directory, in which the workers share pipe and corner shapes. The optional
+# "instancing" is one of PvcFrame.INSTANCING_MODES. The formats "STL" and
+# "3MF" write meshes with PvcFrameMesh, which tessellates every distinct
+# pipe and corner shape only once.
+#
+# Run it with FreeCADCmd:
+#   FreeCADCmd -c "import PvcFrameBatch; PvcFrameBatch.run('sweep.json', 'output')"
+
+from __future__ import print_function
+
+import collections
+import itertools
+import json
+import multiprocessing
+import os
+import time
+import traceback
+
+import FreeCAD
+
+import OsePiping.Corner as CornerMod
+import OsePiping.Pipe as PipeMod
+import PartTable
+import PvcFrame
+import PvcFrameMesh
+import ShapeCache
+
+parseQuantity = FreeCAD.Units.parseQuantity
+
+MANIFEST_NAME = "manifest.json"
+DEFAULT_FORMATS = ["FCStd", "STEP"]
+FORMAT_EXTENSIONS = {"fcstd": ".FCStd", "step": ".step", "stp": ".step", "stl": ".stl", "3mf": ".3mf"}
+# Time limit for a single frame in s, if run() gets none.
+DEFAULT_TIMEOUT = 600
+# Interval in s to check the running frames.
+POLL_INTERVAL = 0.05
+
+# State of a pool worker. It is set by _initWorker().
+_worker = {}
+
+
+def expandDimension(value):
+	"""Return list of lengths in mm described by a sweep dimension entry.
+
+	value is a single length string, a list of length strings or a
+	dictionary with "start", "stop" and "step". The range includes "stop".
+	"""
+	if isinstance(value, dict):
+		start = parseQuantity(value["start"]).Value
+		stop = parseQuantity(value["stop"]).Value
+		step = parseQuantity(value["step"]).Value
+		if step <= 0:
+			raise ValueError("Step of the range %s must be positive" % value)
+		count = int((stop - start)/step + 1e-9) + 1
+		return [start + i*step for i in range(count)]
+	if isinstance(value, (list, tuple)):
+		return [parseQuantity(v).Value for v in value]
+	return [parseQuantity(value).Value]
+
+
+def expandSweep(spec):
+	"""Return a list of jobs, one for every combination in the sweep specification."""
+	jobs = []
+	combinations = itertools.product(expandDimension(spec["LX"]),
+		expandDimension(spec["LY"]), expandDimension(spec["LZ"]),
+		spec["pipes"], spec["corners"])
+	for index, (lx, ly, lz, pipe, corner) in enumerate(combinations):
+		jobs.append({"index": index, "name": "frame_%04d" % index,
+			"LX": lx, "LY": ly, "LZ": lz, "pipe": pipe, "corner": corner,
+			"solid": spec.get("solid", True),
+			"instancing": spec.get("instancing", PvcFrame.INSTANCING_CLONE)})
+	return jobs
+
+
+def filterCompatible(jobs, pipe_table, corner_table):
+	"""Return (jobs, rejected records) of the jobs whose corner fits the pipe and all others."""
+	compatibility = PartTable.compatibility(pipe_table, corner_table)
+	pairs = {}
+	accepted = []
+	rejected = []
+	for job in jobs:
+		pair = (job["pipe"], job["corner"])
+		if pair not in pairs:
+			pairs[pair] = compatibility.fits(*pair)
+		if pairs[pair]:
+			accepted.append(job)
+		else:
+			rejected.append(dict(job, status="rejected", seconds=0.0,
+				error='Corner "%s" does not fit pipe "%s" or is not in the tables' % (job["corner"], job["pipe"])))
+	return accepted, rejected
+
+
+def _poolContext():
+	# FreeCADCmd cannot be used as a python interpreter to spawn new
+	# workers. Fork them instead, where possible.
+	if hasattr(multiprocessing, "get_context"):
+		try:
+			return multiprocessing.get_context("fork")
+		except ValueError:
+			pass
+	return multiprocessing
+
+
+def _newPool(processes, initArgs):
+	return _poolContext().Pool(processes, _initWorker, initArgs)
+
+
+def _initWorker(pipeTablePath, cornerTablePath, shapeCachePath):
+	_worker["pipe_table"] = PartTable.loadTable(pipeTablePath, PartTable.PIPE_DIMENSIONS)
+	_worker["corner_table"] = PartTable.loadTable(cornerTablePath, PartTable.CORNER_DIMENSIONS)
+	_worker["document"] = FreeCAD.newDocument("PvcFrameBatch%d" % os.getpid())
+	if shapeCachePath is not None:
+		ShapeCache.enablePersistence(shapeCachePath)
+
+
+def _clearDocument(document):
+	for name in [obj.Name for obj in document.Objects]:
+		if document.getObject(name) is not None:
+			document.removeObject(name)
+
+
+def _export(document, group, basePath, formats):
+	files = []
+	for fmt in formats:
+		ext = FORMAT_EXTENSIONS[fmt.lower()]
+		filename = basePath + ext
+		if ext == ".FCStd":
+			document.saveCopy(filename)
+		elif ext in PvcFrameMesh.WRITERS:
+			PvcFrameMesh.exportObjects(filename, [group])
+		else:
+			import Import
+			Import.export(group.Group, filename)
+		files.append(os.path.basename(filename))
+	return files
+
+
+def _buildJob(job, outputDir, formats):
+	"""Build a single frame in the worker document. Never raise."""
+	record = dict(job)
+	record["status"] = "error"
+	start = time.time()
+	document = _worker["document"]
+	try:
+		box = PvcFrame.BoxFromTable(document, _worker["pipe_table"], _worker["corner_table"])
+		box.LX = parseQuantity("%r mm" % job["LX"])
+		box.LY = parseQuantity("%r mm" % job["LY"])
+		box.LZ = parseQuantity("%r mm" % job["LZ"])
+		group = box.create(job["pipe"], job["corner"], job["solid"], job["instancing"])
+		if group is None:
+			raise ValueError('Pipe "%s" or corner "%s" not found' % (job["pipe"], job["corner"]))
+		document.recompute()
+		record["objects"] = len(document.Objects)
+		record["files"] = _export(document, group, os.path.join(outputDir, job["name"]), formats)
+		record["status"] = "ok"
+	except Exception as e:
+		record["error"] = str(e)
+		record["traceback"] = traceback.format_exc()
+	finally:
+		try:
+			_clearDocument(document)
+		except Exception:
+			pass
+	record["seconds"] = time.time() - start
+	return record
+
+
+def run(specFile, outputDir, processes=None, timeout=None):
+	"""Build all frames of the sweep in specFile and write them to outputDir.
+
+	Frames are built in a pool of processes, by default one per CPU core.
+	A failing combination is recorded in the manifest and does not stop
+	the batch. Pipe and corner pairs, which do not fit, are rejected before
+	any worker starts. timeout limits the time in seconds for a single frame,
+	default DEFAULT_TIMEOUT. It is measured from the start of the frame.
+	A frame whose worker hangs or dies times out; then the pool is started
+	again and the other running frames are built again.
+	Return the manifest as a dictionary.
+	"""
+	with open(specFile, "r") as f:
+		spec = json.load(f)
+	formats = spec.get("formats", DEFAULT_FORMATS)
+	for fmt in formats:
+		if fmt.lower() not in FORMAT_EXTENSIONS:
+			raise ValueError("Unsupported output format %s" % fmt)
+	if not os.path.isdir(outputDir):
+		os.makedirs(outputDir)
+	pipeTablePath = spec.get("pipeTable", PipeMod.CSV_TABLE_PATH)
+	cornerTablePath = spec.get("cornerTable", CornerMod.CSV_TABLE_PATH)
+	jobs, rejected = filterCompatible(expandSweep(spec),
+		PartTable.loadTable(pipeTablePath, PartTable.PIPE_DIMENSIONS),
+		PartTable.loadTable(cornerTablePath, PartTable.CORNER_DIMENSIONS))
+	if rejected:
+		FreeCAD.Console.PrintWarning("%d frames rejected, their corner does not fit the pipe\n" % len(rejected))
+	if timeout is None:
+		timeout = DEFAULT_TIMEOUT
+	if processes is None:
+		processes = multiprocessing.cpu_count()
+	processes = max(1, min(processes, len(jobs)))
+	shapeCachePath = None
+	if spec.get("shapeCache"):
+		shapeCachePath = os.path.join(outputDir, spec["shapeCache"])
+		if not os.path.isdir(shapeCachePath):
+			os.makedirs(shapeCachePath)
+
+	FreeCAD.Console.PrintMessage("Building %d frames in %d processes\n" % (len(jobs), processes))
+	start = time.time()
+	initArgs = (pipeTablePath, cornerTablePath, shapeCachePath)
+	pool = _newPool(processes, initArgs)
+	# Submit no more frames than there are workers, so a frame starts
+	# when it is submitted and its deadline counts from there.
+	queue = collections.deque(jobs)
+	running = {}
+	records = list(rejected)
+	def finish(record):
+		if record["status"] != "ok":
+			FreeCAD.Console.PrintWarning("%s failed: %s\n" % (record["name"], record.get("error")))
+		records.append(record)
+	try:
+		while queue or running:
+			while queue and len(running) < processes:
+				job = queue.popleft()
+				running[job["index"]] = (job, pool.apply_async(_buildJob, (job, outputDir, formats)),
+					time.time() + timeout)
+			now = time.time()
+			expired = False
+			for index, (job, result, deadline) in list(running.items()):
+				if result.ready():
+					del running[index]
+					try:
+						finish(result.get())
+					except Exception as e:
+						finish(dict(job, status="error", error=str(e)))
+				elif now > deadline:
+					del running[index]
+					finish(dict(job, status="timeout", error="No result after %s s" % timeout))
+					expired = True
+			if expired:
+				# A dead worker never returns its result and a hanging one
+				# blocks its slot. Replace all workers.
+				pool.terminate()
+				pool.join()
+				for job, result, deadline in running.values():
+					queue.appendleft(job)
+				running.clear()
+				pool = _newPool(processes, initArgs)
+			elif running:
+				time.sleep(POLL_INTERVAL)
+	finally:
+		pool.terminate()
+		pool.join()
+	records.sort(key=lambda record: record["index"])
+
+	manifest = {"spec": spec, "formats": formats,
+		"total": len(records),
+		"succeeded": len([r for r in records if r["status"] == "ok"]),
+		"failed": len([r for r in records if r["status"] != "ok"]),
+		"processes": processes,
+		"seconds": time.time() - start,
+		"frames": records}
+	with open(os.path.join(outputDir, MANIFEST_NAME), "w") as f:
+		json.dump(manifest, f, indent=2)
+	FreeCAD.Console.PrintMessage("%d of %d frames built in %.1f s\n" % (manifest["succeeded"], manifest["total"], manifest["seconds"]))
+	return manifest
+
+
+def main(argv):
+	import argparse
+	parser = argparse.ArgumentParser(description="Build PVC frames from a sweep specification.")
+	parser.add_argument("spec", help="JSON sweep specification")
+	parser.add_argument("output", help="output directory")
+	parser.add_argument("--processes", type=int, default=None, help="number of worker processes")
+	parser.add_argument("--timeout", type=float, default=None, help="time limit for a single frame in seconds, default %d" % DEFAULT_TIMEOUT)
+	args = parser.parse_args(argv)
+	manifest = run(args.spec, args.output, args.processes, args.timeout)
+	return 0 if manifest["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+	import sys
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Layout of many frames in one document.
+#
+# A printer farm places N frames in rows or a grid. Frames with equal
+# dimensions share their geometry: the compound of every distinct frame is
+# built once from the cached pipe and corner shapes, and all its copies
+# are App::Link array elements or placed copies in a single compound. So
+# the document has a few objects per distinct frame size, not 20+ objects
+# per printer.
+
+import math
+
+import FreeCAD
+import Part
+
+import D3DTrace
+import PvcFrame
+import ShapeCache
+
+# Gap between neighbouring frames in mm.
+DEFAULT_SPACING = 300.0
+
+
+def gridPositions(sizes, columns=None, spacing=DEFAULT_SPACING):
+	"""Return list of (x, y) positions of frames with sizes [(LX, LY), ...] in mm.
+
+	Frames are placed in rows of columns frames, all in one row if columns
+	is None. Every row starts after the deepest frame of the previous row.
+	"""
+	positions = []
+	x = y = depth = 0.0
+	for i, (LX, LY) in enumerate(sizes):
+		if columns and i > 0 and i % columns == 0:
+			x = 0.0
+			y += depth + spacing
+			depth = 0.0
+		positions.append((x, y))
+		x += LX + spacing
+		depth = max(depth, LY)
+	return positions
+
+
+def squareColumns(count):
+	"""Return number of columns of a nearly square grid of count frames."""
+	return max(1, int(math.ceil(math.sqrt(count))))
+
+
+def frameKey(box, convertToSolid):
+	"""Return key, which is equal for boxes with equal geometry."""
+	dims = box.corner.dims
+	return ShapeCache.normalizeKey(("frame", box.LX, box.LY, box.LZ, box.POD, box.Thk,
+		dims.G, dims.H, dims.M, dims.POD, dims.PThk, bool(convertToSolid)))
+
+
+def frameShape(box, convertToSolid):
+	"""Return compound of all members of the box, built from the shape cache."""
+	layout = box.layout()
+	shapes = dict([(i, PvcFrame.sourceShape(key, makeBuilder, convertToSolid))
+		for i, (key, makeBuilder) in box.sources(layout, convertToSolid).items()])
+	return PvcFrame.compoundOfMembers(layout, shapes)
+
+
+def _label(box):
+	name = box.pipeName or "%s x %s" % (box.POD.UserString, box.Thk.UserString)
+	return "Frame %.0fx%.0fx%.0f %s" % (box.LX.Value, box.LY.Value, box.LZ.Value, name)
+
+
+def createFarm(document, boxes, columns=None, spacing=DEFAULT_SPACING, convertToSolid=True,
+		instancing=PvcFrame.INSTANCING_LINK):
+	"""Place the boxes in a grid and return the new group.
+
+	boxes is a list of PvcFrame.Box, equal boxes may be the same object.
+	instancing is PvcFrame.INSTANCING_LINK for an App::Link array of every
+	distinct frame or PvcFrame.INSTANCING_COMPOUND for a single compound of
+	every distinct frame.
+	"""
+	if instancing not in (PvcFrame.INSTANCING_LINK, PvcFrame.INSTANCING_COMPOUND):
+		raise ValueError("Unsupported instancing mode %s for a farm" % instancing)
+	with D3DTrace.span("createFarm", frames=len(boxes), instancing=instancing):
+		for box in boxes:
+			box.checkDimensions()
+		positions = gridPositions([(box.LX.Value, box.LY.Value) for box in boxes], columns, spacing)
+		# Placements of every distinct frame, in the order of first appearance.
+		frames = []
+		placements = {}
+		for box, (x, y) in zip(boxes, positions):
+			key = frameKey(box, convertToSolid)
+			if key not in placements:
+				placements[key] = []
+				frames.append((key, box))
+			placements[key].append(FreeCAD.Placement(FreeCAD.Vector(x, y, 0), FreeCAD.Rotation()))
+		group = document.addObject("App::DocumentObjectGroup", "printer farm")
+		for key, box in frames:
+			with D3DTrace.span("frame", copies=len(placements[key])):
+				shape = frameShape(box, convertToSolid)
+				if instancing == PvcFrame.INSTANCING_LINK:
+					source = document.addObject("Part::Feature", "FarmFrame")
+					source.Shape = shape
+					source.Label = _label(box)
+					source.Visibility = False
+					link = document.addObject("App::Link", "FarmFrameArray")
+					link.setLink(source)
+					link.ShowElement = False
+					link.ElementCount = len(placements[key])
+					link.PlacementList = placements[key]
+					link.Label = "%s (%d)" % (source.Label, len(placements[key]))
+					group.addObject(source)
+					group.addObject(link)
+				else:
+					obj = document.addObject("Part::Feature", "FarmFrames")
+					obj.Shape = Part.makeCompound([PvcFrame.placedShape(shape, p) for p in placements[key]])
+					obj.Label = "%s (%d)" % (_label(box), len(placements[key]))
+					group.addObject(obj)
+	return group
+
+
+def boxesFromTable(document, pipe_table, corner_table, frames):
+	"""Return list of Box for frames [(pipeName, cornerName, LX, LY, LZ), ...] with lengths in mm.
+
+	Equal frames get the same Box object.
+	"""
+	table = PvcFrame.BoxFromTable(document, pipe_table, corner_table)
+	boxes = {}
+	result = []
+	for frame in frames:
+		frame = tuple(frame)
+		if frame not in boxes:
+			pipeName, cornerName, LX, LY, LZ = frame
+			table.LX, table.LY, table.LZ = PvcFrame.mm(LX), PvcFrame.mm(LY), PvcFrame.mm(LZ)
+			boxes[frame] = table.getBox(pipeName, cornerName)
+			if boxes[frame] is None:
+				raise ValueError('Pipe "%s" or corner "%s" not found' % (pipeName, cornerName))
+		result.append(boxes[frame])
+	return result
+
+
+def createFarmFromTable(document, pipe_table, corner_table, frames, columns=None, spacing=DEFAULT_SPACING,
+		convertToSolid=True, instancing=PvcFrame.INSTANCING_LINK):
+	"""Create a farm of frames [(pipeName, cornerName, LX, LY, LZ), ...]. See createFarm()."""
+	boxes = boxesFromTable(document, pipe_table, corner_table, frames)
+	return createFarm(document, boxes, columns, spacing, convertToSolid, instancing)
@@ -28,27 +28,141 @@
 # Create a pipe frame box.
 
 import math
+import os
 import os.path
+import shutil
+import tempfile
 
 from PySide import QtCore, QtGui
 import FreeCAD
+import Part
 
 import D3DBase
+import D3DTrace
+import D3DWorker
+import PartTable
 import PvcFrame
+import ShapeCache
 import OsePiping.PipeGui as PipeGui
 import OsePiping.CornerGui as CornerGui
 
 parseQuantity = FreeCAD.Units.parseQuantity
 
 
+class ShapeBuildJob(QtCore.QObject):
+	"""Build pipe and corner shapes in FreeCADCmd workers and store them in the shape cache.
+
+	The GUI stays responsive: a timer polls the workers and a progress
+	dialog shows how many shapes are done. After the workers, stage()
+	reports the later steps of adding the frame. Cancel kills the workers.
+	Emits finished when all shapes are in the cache and canceled otherwise.
+	Shapes, which a worker fails to build, are left out; the frame builds
+	them in the GUI process as before.
+	"""
+	finished = QtCore.Signal()
+	canceled = QtCore.Signal()
+	# Steps after the workers: add members, recompute.
+	STAGES = 2
+
+	def __init__(self, keys, parent=None):
+		super(ShapeBuildJob, self).__init__(parent)
+		self.keys = list(keys)
+		self.done = 0
+		self.active = False
+		self.directory = None
+		self.pool = None
+		self.timer = QtCore.QTimer(self)
+		self.timer.setInterval(int(D3DWorker.WorkerPool.POLL_INTERVAL*1000))
+		self.timer.timeout.connect(self.poll)
+		self.progress = QtGui.QProgressDialog(self._label(),
+			"Cancel", 0, len(self.keys) + ShapeBuildJob.STAGES, parent)
+		self.progress.setWindowTitle("Add frame")
+		self.progress.setWindowModality(QtCore.Qt.WindowModal)
+		self.progress.setMinimumDuration(0)
+		self.progress.canceled.connect(self.cancel)
+
+	def _label(self):
+		return "Building pipe and corner shapes in workers: %d of %d" % (self.done, len(self.keys))
+
+	def start(self):
+		self.active = True
+		self.progress.setValue(0)
+		self.progress.show()
+		if not self.keys:
+			self._finish()
+			return
+		self.directory = tempfile.mkdtemp(prefix="d3dframe")
+		self.pool = D3DWorker.WorkerPool()
+		for i, key in enumerate(self.keys):
+			target = os.path.join(self.directory, "%d.brep" % i)
+			self.pool.submit("buildSource", [list(key), target], self._callback(key))
+		self.timer.start()
+
+	def _callback(self, key):
+		def done(result):
+			if "error" in result:
+				FreeCAD.Console.PrintWarning("Building %r failed: %s\n" % (key, result["error"]))
+			else:
+				shape = Part.Shape()
+				shape.importBrep(result["file"])
+				ShapeCache.shapeCache.put(key, shape)
+			self.done += 1
+			self.progress.setLabelText(self._label())
+			self.progress.setValue(self.done)
+		return done
+
+	def poll(self):
+		if not self.pool.poll():
+			self.timer.stop()
+			self._cleanup()
+			self._finish()
+
+	def _finish(self):
+		self.active = False
+		self.progress.setValue(len(self.keys))
+		self.finished.emit()
+
+	def stage(self, text):
+		"""Show the next step after the workers. It cannot be canceled."""
+		self.progress.setCancelButton(None)
+		self.progress.setLabelText(text)
+		self.progress.setValue(min(self.progress.value() + 1, self.progress.maximum()))
+		QtGui.QApplication.processEvents()
+
+	def close(self):
+		self.progress.setValue(self.progress.maximum())
+		self.progress.close()
+
+	def cancel(self):
+		if not self.active:
+			return
+		self.active = False
+		self.timer.stop()
+		if self.pool is not None:
+			self.pool.cancel()
+		self._cleanup()
+		self.progress.close()
+		self.canceled.emit()
+
+	def _cleanup(self):
+		if self.directory is not None:
+			shutil.rmtree(self.directory, ignore_errors=True)
+			self.directory = None
+		self.pool = None
+
+
 class MainDialog(QtGui.QDialog):
 	QSETTINGS_APPLICATION = "OSE D3D-Printer-Workbench"
 	QSETTINGS_NAME = "frame user input"
 	def __init__(self, document, pipeTable, cornerTable):
 		super(MainDialog, self).__init__()
 		self.document = document
-		self.pipeTable = pipeTable
-		self.cornerTable = cornerTable
+		# Tables can be CsvTable or PartTable objects. Index them once for
+		# all frames created by this dialog.
+		self.pipeIndex = PartTable.indexed(pipeTable, PartTable.PIPE_DIMENSIONS)
+		self.cornerIndex = PartTable.indexed(cornerTable, PartTable.CORNER_DIMENSIONS)
+		self.pipeTable = self.pipeIndex.csvTable
+		self.cornerTable = self.cornerIndex.csvTable
 		self.initUi()
 
 	def initUi(self):
@@ -82,6 +196,9 @@ class MainDialog(QtGui.QDialog):
 		self.checkBoxCreateSolid.setGeometry(QtCore.QRect(0, 0, 121, 26))
 		self.checkBoxCreateSolid.setChecked(True)
 		self.checkBoxCreateSolid.setObjectName("checkBoxCreateSolid")
+		self.checkBoxParametric = QtGui.QCheckBox(self.horizontalWidget)
+		self.checkBoxParametric.setGeometry(QtCore.QRect(130, 0, 121, 26))
+		self.checkBoxParametric.setObjectName("checkBoxParametric")
 		self.label_3 = QtGui.QLabel(self.horizontalWidget)
 		self.label_3.setGeometry(QtCore.QRect(0, 30, 21, 25))
 		sizePolicy = QtGui.QSizePolicy(QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Minimum)
@@ -159,6 +276,7 @@ class MainDialog(QtGui.QDialog):
 	def retranslateUi(self, Dialog):
 		Dialog.setWindowTitle(QtGui.QApplication.translate("Dialog", "Add frame", None, QtGui.QApplication.UnicodeUTF8))
 		self.checkBoxCreateSolid.setText(QtGui.QApplication.translate("Dialog", "Create Solid", None, QtGui.QApplication.UnicodeUTF8))
+		self.checkBoxParametric.setText(QtGui.QApplication.translate("Dialog", "Parametric", None, QtGui.QApplication.UnicodeUTF8))
 		self.label_3.setText(QtGui.QApplication.translate("Dialog", "LX:", None, QtGui.QApplication.UnicodeUTF8))
 		self.lineEditLX.setText(QtGui.QApplication.translate("Dialog", "30 cm", None, QtGui.QApplication.UnicodeUTF8))
 		self.label_5.setText(QtGui.QApplication.translate("Dialog", "LY:", None, QtGui.QApplication.UnicodeUTF8))
@@ -185,7 +303,7 @@ class MainDialog(QtGui.QDialog):
 
 		# Update active document.  If there is none, show a warning message and do nothing.
 		# Get dimensions from the table
-		box = PvcFrame.BoxFromTable(self.document, self.pipeTable, self.cornerTable)
+		box = PvcFrame.BoxFromTable(self.document, self.pipeIndex, self.cornerIndex)
 		box.LX = parseQuantity(self.lineEditLX.text())
 		if box.LX == "":
 			msgBox = QtGui.QMessageBox()
@@ -219,18 +337,61 @@ class MainDialog(QtGui.QDialog):
 			return
 
 		createSolid = self.checkBoxCreateSolid.isChecked()
-		box.create(pipeName, cornerName, createSolid)
-		self.document.recompute()
+		try:
+			frameBox = box.getBox(pipeName, cornerName)
+			if frameBox is None:
+				msgBox = QtGui.QMessageBox()
+				msgBox.setText('Pipe "%s" or corner "%s" not found.' % (pipeName, cornerName))
+				msgBox.exec_()
+				return
+			frameBox.checkDimensions()
+		except Exception as e:
+			msgBox = QtGui.QMessageBox()
+			msgBox.setText(str(e))
+			msgBox.exec_()
+			return
+		# Build missing pipe and corner shapes in worker processes. The
+		# document is changed only in addFrame(), after all shapes are ready.
+		layout = frameBox.layout()
+		keys = sorted(set([key for key, makeBuilder in frameBox.sources(layout, createSolid).values()
+			if not ShapeCache.shapeCache.isCached(key)]))
+		self.setEnabled(False)
+		self.job = ShapeBuildJob(keys, self)
+		self.job.finished.connect(lambda: self.addFrame(box, pipeName, cornerName, createSolid))
+		self.job.canceled.connect(self.buildCanceled)
+		self.job.start()
+
+	def addFrame(self, box, pipeName, cornerName, createSolid):
+		"""Add the frame to the document. All its shapes are in the shape cache now."""
+		try:
+			with D3DTrace.span("add frame", pipe=pipeName, corner=cornerName):
+				self.job.stage("Adding the frame members")
+				if self.checkBoxParametric.isChecked():
+					box.createParametric(pipeName, cornerName, createSolid)
+				else:
+					box.create(pipeName, cornerName, createSolid)
+				self.job.stage("Recomputing the document")
+				with D3DTrace.span("document.recompute"):
+					self.document.recompute()
+		finally:
+			self.job.close()
+			self.job = None
+			self.setEnabled(True)
 		# Save user input for the next dialog call.
 		self.saveInput()
 		# Call parent class.
 		super(MainDialog, self).accept()
 
+	def buildCanceled(self):
+		self.job = None
+		self.setEnabled(True)
+
 	def saveInput(self):
 		"""Store user input for the next run."""
 		settings = QtCore.QSettings(MainDialog.QSETTINGS_APPLICATION, MainDialog.QSETTINGS_NAME)
 		check = self.checkBoxCreateSolid.checkState()
 		settings.setValue("checkBoxCreateSolid", int(check))
+		settings.setValue("checkBoxParametric", int(self.checkBoxParametric.checkState()))
 		settings.setValue("lineEditLX", self.lineEditLX.text())
 		settings.setValue("lineEditLY", self.lineEditLY.text())
 		settings.setValue("lineEditLZ", self.lineEditLZ.text())
@@ -242,6 +403,9 @@ class MainDialog(QtGui.QDialog):
 		settings = QtCore.QSettings(MainDialog.QSETTINGS_APPLICATION, MainDialog.QSETTINGS_NAME)
 		checkState = QtCore.Qt.CheckState(int(settings.value("checkBoxCreateSolid")))
 		self.checkBoxCreateSolid.setCheckState(checkState)
+		value = settings.value("checkBoxParametric")
+		if value is not None:
+			self.checkBoxParametric.setCheckState(QtCore.Qt.CheckState(int(value)))
 		text = settings.value("lineEditLX")
 		if text is not None:
 			self.lineEditLX.setText(text)
@@ -265,7 +429,16 @@ class MainDialog(QtGui.QDialog):
 			self.lineEditPipeName.setText(partName)
 
 	def selectCornerClicked(self):
-		dlg = CornerGui.MainDialog(self.document, self.cornerTable)
+		table = self.cornerTable
+		pipeName = self.lineEditPipeName.text()
+		if pipeName in self.pipeIndex:
+			# Offer only the corners, which fit the selected pipe.
+			corners = PartTable.compatibility(self.pipeIndex, self.cornerIndex).corners(pipeName)
+			if corners:
+				table = self.cornerIndex.csvSubset(corners)
+			else:
+				FreeCAD.Console.PrintWarning('No corner fits pipe "%s"\n' % pipeName)
+		dlg = CornerGui.MainDialog(self.document, table)
 		partName = dlg.showForSelection(self.lineEditCornerName.text())
 		if partName is not None:
 			self.lineEditCornerName.setText(partName)
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Layout of the members of a pipe frame box.
+#
+# This module does not depend on FreeCAD. It computes lengths and 4x4
+# placement matrices of all 12 pipes and 8 corners of a frame box from
+# the outer dimensions LX, LY, LZ and the corner dimension G. All values
+# are in mm. The dimensions can be scalars or arrays of the same shape,
+# which allows to evaluate many frames at once.
+
+import collections
+
+import numpy
+
+AXES = "xyz"
+# Roles of members. For pipes the role is the index of the pipe axis in AXES.
+ROLE_X_PIPE = 0
+ROLE_Y_PIPE = 1
+ROLE_Z_PIPE = 2
+ROLE_CORNER = 3
+ROLE_NAMES = ("x-pipe", "y-pipe", "z-pipe", "corner")
+
+_Z, _X, _Y, _C = ROLE_Z_PIPE, ROLE_X_PIPE, ROLE_Y_PIPE, ROLE_CORNER
+
+# Member order follows the order in which PvcFrame.Box creates the objects:
+# the three source pipes, 9 pipe clones, the source corner and 7 corner clones.
+ROLES = numpy.array([_Z, _X, _Y, _Z, _Z, _Z, _X, _X, _X, _Y, _Y, _Y,
+	_C, _C, _C, _C, _C, _C, _C, _C])
+# Index of the member whose geometry is reused by the member. Members with
+# SOURCES[i] == i have their own geometry, all others are copies of it.
+SOURCES = numpy.array([0, 1, 2, 0, 0, 0, 1, 1, 1, 2, 2, 2,
+	12, 12, 12, 12, 12, 12, 12, 12])
+MEMBER_COUNT = len(ROLES)
+PIPES = numpy.nonzero(ROLES != ROLE_CORNER)[0]
+CORNERS = numpy.nonzero(ROLES == ROLE_CORNER)[0]
+
+
+def _rotation(axis, angle):
+	"""Return exact 3x3 rotation matrix for a multiple of 90 degrees around a coordinate axis."""
+	quarter = int(round(angle/90.0)) % 4
+	c = (1, 0, -1, 0)[quarter]
+	s = (0, 1, 0, -1)[quarter]
+	i = AXES.index(axis)
+	j, k = (i + 1) % 3, (i + 2) % 3
+	m = numpy.identity(3)
+	m[j, j] = c
+	m[j, k] = -s
+	m[k, j] = s
+	m[k, k] = c
+	return m
+
+_I = numpy.identity(3)
+_RY90 = _rotation("y", 90)
+_RXM90 = _rotation("x", -90)
+
+ROTATIONS = numpy.array([
+	# Pipes
+	_I, _RY90, _RXM90,
+	_I, _I, _I,
+	_RY90, _RY90, _RY90,
+	_RXM90, _RXM90, _RXM90,
+	# Corners
+	_I,
+	_rotation("y", 90),
+	_rotation("y", 180),
+	_rotation("y", 270),
+	_rotation("z", 180),
+	_rotation("z", 270),
+	_rotation("x", 180),
+	_rotation("x", 90).dot(_rotation("z", 180)),
+])
+
+# Translations are linear in (LX, LY, LZ, G). Every row holds the
+# coefficients of (LX, LY, LZ, G) for the x, y and z coordinates.
+def _t(x, y, z):
+	return [x, y, z]
+
+_0 = (0, 0, 0, 0)
+_LX = (1, 0, 0, 0)
+_LY = (0, 1, 0, 0)
+_LZ = (0, 0, 1, 0)
+_G = (0, 0, 0, 1)
+
+TRANSLATIONS = numpy.array([
+	# Pipes
+	_t(_0, _0, _G), _t(_G, _0, _0), _t(_0, _G, _0),
+	_t(_LX, _0, _G), _t(_0, _LY, _G), _t(_LX, _LY, _G),
+	_t(_G, _LY, _0), _t(_G, _0, _LZ), _t(_G, _LY, _LZ),
+	_t(_LX, _G, _0), _t(_0, _G, _LZ), _t(_LX, _G, _LZ),
+	# Corners
+	_t(_0, _0, _0),
+	_t(_0, _0, _LZ),
+	_t(_LX, _0, _LZ),
+	_t(_LX, _0, _0),
+	_t(_LX, _LY, _0),
+	_t(_0, _LY, _0),
+	_t(_0, _LY, _LZ),
+	_t(_LX, _LY, _LZ),
+], dtype=float)
+
+# Pipe lengths are L-2*G along the pipe axis. Corners have length 0.
+_PIPE_LENGTHS = {ROLE_X_PIPE: (1, 0, 0, -2), ROLE_Y_PIPE: (0, 1, 0, -2),
+	ROLE_Z_PIPE: (0, 0, 1, -2), ROLE_CORNER: _0}
+LENGTHS = numpy.array([_PIPE_LENGTHS[role] for role in ROLES], dtype=float)
+
+Layout = collections.namedtuple("Layout", ["lengths", "transforms", "roles", "sources"])
+
+
+def _parameters(LX, LY, LZ, G):
+	LX, LY, LZ, G = numpy.broadcast_arrays(*[numpy.asarray(v, dtype=float) for v in (LX, LY, LZ, G)])
+	return numpy.stack([LX, LY, LZ, G], axis=-1)
+
+
+def layout(LX, LY, LZ, G):
+	"""Compute the layout of frame members.
+
+	Return a Layout with
+	  lengths    -- array of shape (..., MEMBER_COUNT) with pipe lengths,
+	  transforms -- array of shape (..., MEMBER_COUNT, 4, 4) with placements,
+	  roles      -- ROLES,
+	  sources    -- SOURCES.
+	The leading dimensions "..." are the broadcast shape of the arguments.
+	"""
+	p = _parameters(LX, LY, LZ, G)
+	shape = p.shape[:-1]
+	lengths = numpy.dot(p, LENGTHS.T)
+	transforms = numpy.zeros(shape + (MEMBER_COUNT, 4, 4))
+	transforms[..., :3, :3] = ROTATIONS
+	transforms[..., :3, 3] = numpy.dot(p, TRANSLATIONS.reshape(-1, 4).T).reshape(shape + (MEMBER_COUNT, 3))
+	transforms[..., 3, 3] = 1.0
+	return Layout(lengths, transforms, ROLES, SOURCES)
+
+
+def isValid(LX, LY, LZ, G):
+	"""Return boolean array which is True where all pipes have a positive length."""
+	p = _parameters(LX, LY, LZ, G)
+	return numpy.all(p[..., :3] > 2*p[..., 3:], axis=-1)
+
+
+def totalPipeLength(LX, LY, LZ, G):
+	"""Return the sum of the lengths of all 12 pipes."""
+	p = _parameters(LX, LY, LZ, G)
+	return 4*(p[..., 0] + p[..., 1] + p[..., 2]) - 24*p[..., 3]
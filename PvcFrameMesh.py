@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Instanced tessellation and streaming mesh export of frames.
+#
+# A frame box has 20 members, but only 4 distinct shapes: the 3 source
+# pipes and the corner. Every distinct shape is tessellated once and its
+# mesh is kept in a cache. Instances are written by transforming the
+# vertex array of the cached mesh with the placement matrix of the member.
+# The writers stream every instance to the file, so no mesh of the whole
+# assembly is built in memory. Binary STL repeats the triangles of every
+# instance; 3MF stores every mesh once and references it by transforms.
+
+import collections
+import os
+import shutil
+import struct
+import tempfile
+import zipfile
+
+import numpy
+
+import FreeCAD
+
+import D3DTrace
+import PvcFrame
+import PvcFrameLayout
+import ShapeCache
+
+# Maximal deviation of the tessellation from the surface in mm.
+DEFAULT_TOLERANCE = 0.1
+DEFAULT_MAX_SIZE = 256
+
+Mesh = collections.namedtuple("Mesh", ["vertices", "triangles"])
+Mesh.__doc__ = """Triangle mesh with vertices (n, 3) in mm and vertex indices (m, 3)."""
+
+# First item of the keys of document object meshes. See objectInstances().
+OBJECT_KEY = "object"
+
+Instance = collections.namedtuple("Instance", ["key", "shape", "transform"])
+Instance.__doc__ = """Placed copy of a shape.
+
+key is the cache key of the shape, shape() returns the shape without
+placement and is only called when the mesh is not cached, transform is the
+4x4 placement matrix of the instance.
+"""
+
+
+def tessellate(shape, tolerance=DEFAULT_TOLERANCE):
+	"""Return Mesh of the shape."""
+	points, facets = shape.tessellate(tolerance)
+	vertices = numpy.array([(p.x, p.y, p.z) for p in points], dtype=float).reshape(-1, 3)
+	triangles = numpy.array(facets, dtype=numpy.int32).reshape(-1, 3)
+	return Mesh(vertices, triangles)
+
+
+class MeshCache:
+	"""LRU cache of meshes of at most maxSize shapes."""
+	def __init__(self, maxSize=DEFAULT_MAX_SIZE):
+		self.maxSize = maxSize
+		self.meshes = collections.OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	def __len__(self):
+		return len(self.meshes)
+
+	def getOrTessellate(self, key, shape, tolerance=DEFAULT_TOLERANCE):
+		"""Return mesh stored under key and tolerance, tessellate shape() if necessary."""
+		key = ShapeCache.normalizeKey(tuple(key) + (float(tolerance),))
+		mesh = self.meshes.pop(key, None)
+		if mesh is None:
+			self.misses += 1
+			with D3DTrace.span("tessellate", key=repr(key)):
+				mesh = tessellate(shape(), tolerance)
+		else:
+			self.hits += 1
+		self.meshes[key] = mesh
+		while len(self.meshes) > self.maxSize:
+			self.meshes.popitem(last=False)
+		return mesh
+
+	def clear(self):
+		self.meshes.clear()
+
+meshCache = MeshCache()
+
+
+def transformed(vertices, transform):
+	transform = numpy.asarray(transform, dtype=float)
+	return numpy.dot(vertices, transform[:3, :3].T) + transform[:3, 3]
+
+
+def matrixFromPlacement(placement):
+	"""Convert FreeCAD.Placement to a 4x4 array."""
+	m = placement.toMatrix()
+	return numpy.array([[m.A11, m.A12, m.A13, m.A14], [m.A21, m.A22, m.A23, m.A24],
+		[m.A31, m.A32, m.A33, m.A34], [m.A41, m.A42, m.A43, m.A44]])
+
+
+# Writers
+
+class StlWriter:
+	"""Binary STL file written one instance at a time."""
+	RECORD = numpy.dtype([("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attribute", "<u2")])
+
+	def __init__(self, path):
+		self.file = open(path, "wb")
+		self.count = 0
+		header = b"binary STL written by the D3D workbench"
+		self.file.write(header + b" "*(80 - len(header)))
+		self.file.write(struct.pack("<I", 0))
+
+	def add(self, key, mesh, transform):
+		corners = transformed(mesh.vertices, transform)[mesh.triangles]
+		normals = numpy.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+		lengths = numpy.linalg.norm(normals, axis=1)
+		normals[lengths > 0] /= lengths[lengths > 0, None]
+		records = numpy.zeros(len(corners), dtype=StlWriter.RECORD)
+		records["normal"] = normals
+		records["vertices"] = corners
+		self.file.write(records.tobytes())
+		self.count += len(records)
+
+	def close(self):
+		self.file.seek(80)
+		self.file.write(struct.pack("<I", self.count))
+		self.file.close()
+
+
+class ThreeMfWriter:
+	"""3MF file with every mesh stored once and instances as build items.
+
+	Mesh objects are streamed to a temporary file as they are added; only
+	the object ids and transforms of the instances are kept in memory.
+	"""
+	CONTENT_TYPES = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+		'<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+		'<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+		'<Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>'
+		'</Types>\n')
+	RELATIONSHIPS = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+		'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+		'<Relationship Target="/3D/3dmodel.model" Id="rel0" '
+		'Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>'
+		'</Relationships>\n')
+
+	def __init__(self, path):
+		self.path = path
+		self.directory = tempfile.mkdtemp(prefix="d3dmesh")
+		self.resources = open(os.path.join(self.directory, "resources"), "w")
+		self.objects = {}
+		self.items = []
+
+	def add(self, key, mesh, transform):
+		key = ShapeCache.normalizeKey(key)
+		if key not in self.objects:
+			self.objects[key] = len(self.objects) + 1
+			f = self.resources
+			f.write('<object id="%d" type="model"><mesh><vertices>\n' % self.objects[key])
+			numpy.savetxt(f, mesh.vertices, fmt='<vertex x="%.6f" y="%.6f" z="%.6f"/>')
+			f.write('</vertices><triangles>\n')
+			numpy.savetxt(f, mesh.triangles, fmt='<triangle v1="%d" v2="%d" v3="%d"/>')
+			f.write('</triangles></mesh></object>\n')
+		t = numpy.asarray(transform, dtype=float)
+		# 3MF multiplies row vectors from the left: the 3x3 part is transposed.
+		values = list(t[:3, :3].T.flatten()) + list(t[:3, 3])
+		self.items.append((self.objects[key], " ".join(["%.6f" % v for v in values])))
+
+	def close(self):
+		try:
+			self.resources.close()
+			model = os.path.join(self.directory, "3dmodel.model")
+			with open(model, "w") as f:
+				f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+					'<model unit="millimeter" xml:lang="en-US" '
+					'xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">\n<resources>\n')
+				with open(self.resources.name, "r") as resources:
+					shutil.copyfileobj(resources, f)
+				f.write('</resources>\n<build>\n')
+				for objectId, transform in self.items:
+					f.write('<item objectid="%d" transform="%s"/>\n' % (objectId, transform))
+				f.write('</build>\n</model>\n')
+			with zipfile.ZipFile(self.path, "w", zipfile.ZIP_DEFLATED) as z:
+				z.writestr("[Content_Types].xml", ThreeMfWriter.CONTENT_TYPES)
+				z.writestr("_rels/.rels", ThreeMfWriter.RELATIONSHIPS)
+				z.write(model, "3D/3dmodel.model")
+		finally:
+			shutil.rmtree(self.directory, ignore_errors=True)
+
+WRITERS = {".stl": StlWriter, ".3mf": ThreeMfWriter}
+
+
+def writer(path):
+	"""Return writer for the file extension of path."""
+	extension = os.path.splitext(path)[1].lower()
+	if extension not in WRITERS:
+		raise ValueError("Cannot export meshes to %s files" % extension)
+	return WRITERS[extension](path)
+
+
+# Instances
+
+def boxInstances(box, convertToSolid=True, transform=None):
+	"""Return list of Instance of all members of a PvcFrame.Box.
+
+	transform is the 4x4 placement matrix of the whole frame.
+	"""
+	layout = box.layout()
+	sources = box.sources(layout, convertToSolid)
+	if transform is None:
+		transform = numpy.identity(4)
+	def shape(key, makeBuilder):
+		return lambda: PvcFrame.sourceShape(key, makeBuilder, convertToSolid)
+	result = []
+	for i in range(PvcFrameLayout.MEMBER_COUNT):
+		key, makeBuilder = sources[layout.sources[i]]
+		result.append(Instance(key, shape(key, makeBuilder), numpy.dot(transform, layout.transforms[i])))
+	return result
+
+
+def _localShape(obj):
+	def shape():
+		result = obj.Shape.copy()
+		result.Placement = FreeCAD.Placement()
+		return result
+	return shape
+
+
+def objectInstances(objects):
+	"""Return list of Instance of document objects.
+
+	Groups are expanded. Draft clones and App::Link objects share the mesh
+	of the object they copy, parametric frames the meshes of their members.
+	Keys of object meshes start with OBJECT_KEY. They name the object, not
+	its geometry, so export() keeps their meshes for one export only.
+	"""
+	result = []
+	for obj in objects:
+		if obj.isDerivedFrom("App::DocumentObjectGroup"):
+			result.extend(objectInstances(obj.Group))
+			continue
+		if not getattr(obj, "Visibility", True):
+			continue
+		placement = matrixFromPlacement(obj.Placement) if hasattr(obj, "Placement") else numpy.identity(4)
+		if isinstance(getattr(obj, "Proxy", None), PvcFrame.Frame):
+			result.extend(boxInstances(obj.Proxy.box(obj), obj.Solid, placement))
+			continue
+		source = obj
+		if obj.isDerivedFrom("App::Link") and obj.LinkedObject is not None:
+			source = obj.LinkedObject
+		elif len(getattr(obj, "Objects", [])) == 1 and hasattr(obj, "Scale"):
+			# Draft clone: the source shape without its placement, scaled
+			# and moved to the placement of the clone.
+			source = obj.Objects[0]
+			scale = numpy.diag([obj.Scale.x, obj.Scale.y, obj.Scale.z, 1.0])
+			placement = numpy.dot(placement, scale)
+		if not hasattr(source, "Shape") or source.Shape.isNull():
+			continue
+		key = (OBJECT_KEY, source.Document.Name, source.Name)
+		placements = [placement]
+		if len(getattr(obj, "PlacementList", [])) > 0:
+			placements = [numpy.dot(placement, matrixFromPlacement(p)) for p in obj.PlacementList]
+		for transform in placements:
+			result.append(Instance(key, _localShape(source), transform))
+	return result
+
+
+def export(path, instances, tolerance=DEFAULT_TOLERANCE, cache=None):
+	"""Write the instances to a binary STL or 3MF file. Return the number of distinct meshes.
+
+	Meshes of pipe and corner sources are kept in cache, by default
+	meshCache, meshes of document objects only during this export.
+	"""
+	if cache is None:
+		cache = meshCache
+	objectCache = MeshCache(max(1, len(instances)))
+	keys = set()
+	with D3DTrace.span("export mesh", file=path, instances=len(instances)):
+		out = writer(path)
+		try:
+			for instance in instances:
+				if instance.key[0] == OBJECT_KEY:
+					mesh = objectCache.getOrTessellate(instance.key, instance.shape, tolerance)
+				else:
+					mesh = cache.getOrTessellate(instance.key, instance.shape, tolerance)
+				out.add(instance.key, mesh, instance.transform)
+				keys.add(ShapeCache.normalizeKey(instance.key))
+		finally:
+			out.close()
+	return len(keys)
+
+
+def exportFrames(path, boxes, convertToSolid=True, tolerance=DEFAULT_TOLERANCE):
+	"""Export frames to a mesh file.
+
+	boxes is a list of PvcFrame.Box or of (Box, 4x4 placement matrix) pairs.
+	"""
+	instances = []
+	for box in boxes:
+		transform = None
+		if isinstance(box, tuple):
+			box, transform = box
+		instances.extend(boxInstances(box, convertToSolid, transform))
+	return export(path, instances, tolerance)
+
+
+def exportObjects(path, objects, tolerance=DEFAULT_TOLERANCE):
+	"""Export document objects to a mesh file."""
+	return export(path, objectInstances(objects), tolerance)
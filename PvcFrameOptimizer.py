@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Design-space optimizer for frame boxes.
+#
+# Find the pipe and corner parts and the outer dimensions LX, LY, LZ of
+# frame boxes, which enclose a required build volume, and return the
+# Pareto front of total pipe length, mass and corner count. All lengths are
+# in mm, masses in g. The module does not depend on FreeCAD; the tables
+# are PartTable objects or anything with the same column() and names.
+
+import collections
+import math
+
+import numpy
+
+import PvcFrameLayout
+
+# Density of PVC in g/mm^3.
+PVC_DENSITY = 1.4e-3
+# Every frame box has one corner at each vertex.
+CORNER_COUNT = len(PvcFrameLayout.CORNERS)
+
+Candidate = collections.namedtuple("Candidate", ["pipeName", "cornerName", "LX", "LY", "LZ",
+	"pipeLength", "mass", "cornerCount"])
+Candidate.__doc__ = """Frame box on the Pareto front.
+
+LX, LY, LZ and pipeLength are in mm, mass is in g. Pass the candidate to
+PvcFrame.BoxFromTable.createCandidate() to create the frame.
+"""
+
+Evaluation = collections.namedtuple("Evaluation", ["pipes", "corners", "feasible", "dimensions",
+	"pipeLength", "mass", "cornerCount"])
+Evaluation.__doc__ = """Objectives of all pipe x corner combinations.
+
+pipes and corners are the row indices into the tables. All other fields
+are arrays of shape (len(pipes), len(corners)); dimensions has a trailing
+axis with LX, LY, LZ.
+"""
+
+
+def _triple(value):
+	return numpy.broadcast_to(numpy.asarray(value, dtype=float), (3,))
+
+
+def _rows(table, names):
+	"""Return indices of the allowed rows of the table."""
+	if names is None:
+		return numpy.arange(len(table.names))
+	return numpy.array([table.names.index(name) for name in names], dtype=int)
+
+
+def pipeArea(OD, Thk):
+	"""Return the cross section area of pipes."""
+	ID = OD - 2*Thk
+	return math.pi/4*(OD*OD - ID*ID)
+
+
+def cornerVolume(G, H, M, POD, PThk):
+	"""Return approximate material volume of corners.
+
+	The corner is modelled as three arms of diameter M and length H. Every
+	arm has a socket of diameter POD and depth H-G for the pipe and a bore
+	of the pipe inner diameter from the socket to the center.
+	"""
+	ID = POD - 2*PThk
+	return 3*math.pi/4*(M*M*H - POD*POD*(H - G) - ID*ID*G)
+
+
+def validCorners(G, H, M, POD, PThk):
+	"""Return boolean array which is True where the corner dimensions give a valid solid.
+
+	The socket must be inside the arm and shorter than it, and the pipe
+	wall must be thinner than the socket radius. Otherwise cornerVolume()
+	can be negative. NaN dimensions are invalid.
+	"""
+	with numpy.errstate(invalid="ignore"):
+		return (G > 0) & (POD < M) & (G < H) & (PThk > 0) & (2*PThk < POD)
+
+
+def minimalLength(required, G, step=1.0, sizes=None):
+	"""Return the smallest admissible outer length along an axis.
+
+	The length must be at least required and larger than 2*G, like in
+	PvcFrame.Box.checkDimensions(). If sizes is an array of allowed lengths,
+	choose from it, otherwise round up to a multiple of step. The result is
+	NaN where no admissible length exists.
+	"""
+	required, G = numpy.broadcast_arrays(numpy.asarray(required, dtype=float),
+		numpy.asarray(G, dtype=float))
+	if sizes is None:
+		length = numpy.maximum(numpy.ceil(required/step), numpy.floor(2*G/step) + 1)*step
+		length[numpy.isnan(required) | numpy.isnan(G)] = numpy.nan
+		return length
+	sizes = numpy.sort(numpy.asarray(sizes, dtype=float))
+	i = numpy.maximum(numpy.searchsorted(sizes, required, "left"),
+		numpy.searchsorted(sizes, 2*G, "right"))
+	length = numpy.append(sizes, numpy.nan)[i]
+	length[numpy.isnan(required) | numpy.isnan(G)] = numpy.nan
+	return length
+
+
+def evaluate(pipeTable, cornerTable, volume, clearance=0.0, step=1.0, sizes=None,
+		stockLength=None, density=PVC_DENSITY, pipes=None, corners=None, compatible=None):
+	"""Evaluate all combinations of allowed pipes and corners.
+
+	volume     -- (X, Y, Z) size of the required build volume.
+	clearance  -- free space between the build volume and the frame on
+	              every side, a scalar or (X, Y, Z).
+	step       -- outer lengths are multiples of step.
+	sizes      -- array of allowed outer lengths, used instead of step.
+	stockLength -- if set, pipes must not be longer than a stock pipe.
+	pipes, corners -- names of the allowed parts, default all.
+	compatible -- optional PartTable.Compatibility of the tables or a
+	              boolean array (pipe rows, corner rows) of the full
+	              tables with the parts that fit together.
+
+	The clear span inside the frame along an axis is the outer length minus
+	the pipe or corner diameter, whichever is larger. Objectives and
+	constraints are separable by axis, so the smallest admissible length of
+	every axis gives the minimum of all objectives among all candidate
+	dimensions of a part combination; larger dimensions are dominated.
+	"""
+	pipeRows = _rows(pipeTable, pipes)
+	cornerRows = _rows(cornerTable, corners)
+	OD = pipeTable.column("OD")[pipeRows][:, None]
+	Thk = pipeTable.column("Thk")[pipeRows][:, None]
+	G, H, M, POD, PThk = [cornerTable.column(dim)[cornerRows][None, :]
+		for dim in ("G", "H", "M", "POD", "PThk")]
+	span = numpy.maximum(OD, M)
+	required = _triple(volume) + 2*_triple(clearance)
+	dimensions = numpy.stack([minimalLength(required[i] + span, G, step, sizes) for i in range(3)], axis=-1)
+	LX, LY, LZ = dimensions[..., 0], dimensions[..., 1], dimensions[..., 2]
+	with numpy.errstate(invalid="ignore"):
+		feasible = (OD > 0) & (Thk > 0) & (2*Thk < OD)
+		# Invalid corners could have a negative volume and win the mass objective.
+		feasible = feasible & validCorners(G, H, M, POD, PThk)
+		feasible = feasible & PvcFrameLayout.isValid(LX, LY, LZ, G)
+		if stockLength is not None:
+			feasible = feasible & (numpy.max(dimensions, axis=-1) - 2*G <= stockLength)
+		if compatible is not None:
+			matrix = numpy.asarray(getattr(compatible, "matrix", compatible), dtype=bool)
+			feasible = feasible & matrix[numpy.ix_(pipeRows, cornerRows)]
+	pipeLength = PvcFrameLayout.totalPipeLength(LX, LY, LZ, G)
+	mass = density*(pipeArea(OD, Thk)*pipeLength + CORNER_COUNT*cornerVolume(G, H, M, POD, PThk))
+	cornerCount = numpy.full(feasible.shape, CORNER_COUNT)
+	return Evaluation(pipeRows, cornerRows, feasible, dimensions, pipeLength, mass, cornerCount)
+
+
+def paretoFront(objectives):
+	"""Return indices of the rows of objectives, which are not dominated.
+
+	objectives is an array of shape (n, k); smaller values are better. Of
+	equal rows only the first one is returned. The result is sorted by the
+	first objective.
+	"""
+	objectives = numpy.asarray(objectives, dtype=float)
+	remaining = numpy.lexsort(objectives.T[::-1])
+	front = []
+	while len(remaining):
+		# The lexicographically smallest row is not dominated by any other
+		# row. Drop all rows it dominates, which includes itself.
+		i = remaining[0]
+		front.append(i)
+		remaining = remaining[numpy.any(objectives[remaining] < objectives[i], axis=1)]
+	return numpy.array(front, dtype=int)
+
+
+def optimize(pipeTable, cornerTable, volume, clearance=0.0, **kwargs):
+	"""Return list of Candidate on the Pareto front, sorted by pipe length.
+
+	See evaluate() for the arguments.
+	"""
+	result = evaluate(pipeTable, cornerTable, volume, clearance, **kwargs)
+	p, c = numpy.nonzero(result.feasible)
+	objectives = numpy.stack([result.pipeLength[p, c], result.mass[p, c], result.cornerCount[p, c]], axis=-1)
+	candidates = []
+	for i in paretoFront(objectives):
+		LX, LY, LZ = result.dimensions[p[i], c[i]]
+		candidates.append(Candidate(pipeTable.names[result.pipes[p[i]]],
+			cornerTable.names[result.corners[c[i]]], float(LX), float(LY), float(LZ),
+			float(objectives[i, 0]), float(objectives[i, 1]), int(objectives[i, 2])))
+	return candidates
+
+
+def formatCandidates(candidates):
+	lines = []
+	for c in candidates:
+		lines.append("%-30s %-30s %7.1f x %7.1f x %7.1f mm  pipes %8.1f mm  %8.1f g  %d corners"
+			% (c.pipeName, c.cornerName, c.LX, c.LY, c.LZ, c.pipeLength, c.mass, c.cornerCount))
+	return "\n".join(lines)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Frame specifications and the build cache.
+#
+# A frame spec is a JSON object, which describes a frame built from the
+# part tables:
+#
+# {
+#   "version": 1,
+#   "LX": 400.0, "LY": 400.0, "LZ": "50 cm",
+#   "pipe": "NPS 1\" PVC SCH 40",
+#   "corner": "...",
+#   "solid": true,
+#   "instancing": "clone"
+# }
+#
+# Lengths are numbers in mm or quantity strings. normalize() converts a
+# spec to its canonical form, dumps() to canonical JSON. Equal frames have
+# equal canonical JSON.
+#
+# The build cache stores the FCStd file of every built frame. It is keyed
+# on the hash of the canonical spec, the table rows of the pipe and of the
+# corner and the workbench version, so a change of any of them builds the
+# frame again. The size limit in MB is the "BuildCacheSize" workbench
+# preference.
+
+import hashlib
+import json
+
+import FreeCAD
+
+import D3DBase
+import ShapeCache
+
+SPEC_VERSION = 1
+LENGTHS = ("LX", "LY", "LZ")
+DEFAULTS = {"version": SPEC_VERSION, "solid": True, "instancing": "clone"}
+REQUIRED = LENGTHS + ("pipe", "corner")
+FIELDS = REQUIRED + tuple(DEFAULTS)
+DEFAULT_BUILD_CACHE_SIZE = 512 # MB
+
+_buildCache = None
+
+
+class SpecError(ValueError):
+	pass
+
+
+def _length(value):
+	if isinstance(value, (int, float)) and not isinstance(value, bool):
+		return round(float(value), ShapeCache.KEY_DECIMALS) + 0.0
+	return round(FreeCAD.Units.parseQuantity(value).Value, ShapeCache.KEY_DECIMALS) + 0.0
+
+
+def makeSpec(LX, LY, LZ, pipe, corner, solid=True, instancing="clone"):
+	"""Return canonical spec. Lengths are numbers in mm, quantities or quantity strings."""
+	if hasattr(LX, "Value"):
+		LX, LY, LZ = LX.Value, LY.Value, LZ.Value
+	return normalize({"LX": LX, "LY": LY, "LZ": LZ, "pipe": pipe, "corner": corner,
+		"solid": solid, "instancing": instancing})
+
+
+def normalize(spec):
+	"""Return the canonical form of a spec dictionary. Raise SpecError for invalid specs."""
+	unknown = set(spec) - set(FIELDS)
+	if unknown:
+		raise SpecError("Unknown frame spec fields: %s" % ", ".join(sorted(unknown)))
+	missing = [field for field in REQUIRED if field not in spec]
+	if missing:
+		raise SpecError("Missing frame spec fields: %s" % ", ".join(missing))
+	result = dict(DEFAULTS)
+	result.update(spec)
+	if result["version"] != SPEC_VERSION:
+		raise SpecError("Unsupported frame spec version %s" % result["version"])
+	try:
+		for field in LENGTHS:
+			result[field] = _length(result[field])
+	except Exception as e:
+		raise SpecError("Invalid length in frame spec: %s" % e)
+	# PvcFrame imports this module; import it only when it is needed.
+	import PvcFrame
+	if result["instancing"] not in PvcFrame.INSTANCING_MODES:
+		raise SpecError("Unknown instancing %s in frame spec, expected one of %s"
+			% (result["instancing"], ", ".join(PvcFrame.INSTANCING_MODES)))
+	result["solid"] = bool(result["solid"])
+	result["pipe"] = str(result["pipe"])
+	result["corner"] = str(result["corner"])
+	return result
+
+
+def dumps(spec):
+	"""Return canonical JSON of the spec."""
+	return json.dumps(normalize(spec), sort_keys=True, separators=(",", ":"))
+
+
+def loads(text):
+	return normalize(json.loads(text))
+
+
+def load(path):
+	with open(path, "r") as f:
+		return loads(f.read())
+
+
+def save(spec, path):
+	with open(path, "w") as f:
+		json.dump(normalize(spec), f, sort_keys=True, indent=2)
+
+
+def specHash(spec, pipeRow, cornerRow):
+	"""Return the build cache key of the spec.
+
+	pipeRow and cornerRow are the table rows of the pipe and of the corner
+	as dictionaries.
+	"""
+	data = {"spec": normalize(spec), "pipe": pipeRow, "corner": cornerRow, "workbench": D3DBase.VERSION}
+	text = json.dumps(data, sort_keys=True, separators=(",", ":"))
+	return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def buildCache():
+	"""Return the on-disk cache of built frames."""
+	global _buildCache
+	if _buildCache is None:
+		params = FreeCAD.ParamGet(D3DBase.PARAMETER_PATH)
+		maxBytes = params.GetInt("BuildCacheSize", DEFAULT_BUILD_CACHE_SIZE)*1024*1024
+		_buildCache = ShapeCache.FileCache(ShapeCache.cacheDirectory("builds"), maxBytes, ".FCStd")
+	return _buildCache
+
+
+def invalidate(key=None):
+	"""Remove the cached build with key, or all cached builds if key is None."""
+	if key is None:
+		buildCache().clear()
+	else:
+		buildCache().remove(key)
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Stiffness analysis of frame boxes.
+#
+# The frame is modelled as 8 joints at the corners connected by 12 beam
+# elements for the pipes. The corners are rigid: every pipe is flexible
+# over its length L-2*G only and is joined to the corner centers by rigid
+# offsets of length G. The module computes static deflections and natural
+# frequencies. Units are mm, N and t (tonnes), so stresses are in MPa and
+# frequencies in Hz. It does not depend on FreeCAD.
+#
+# Every function accepts the frame parameters as arrays and works on the
+# broadcast shape of them, so many pipe and corner choices are analysed in
+# one call. The model has only 48 degrees of freedom, so batched dense
+# linear algebra is used instead of sparse solvers.
+
+import collections
+import math
+
+import numpy
+
+import PvcFrameLayout
+import PvcFrameOptimizer
+
+# Unplasticized PVC.
+PVC_MODULUS = 3000.0 # MPa
+PVC_POISSON = 0.38
+PVC_DENSITY = PvcFrameOptimizer.PVC_DENSITY*1e-6 # t/mm^3
+
+SUPPORT_PINNED = "pinned"
+SUPPORT_FIXED = "fixed"
+SUPPORTS = (SUPPORT_PINNED, SUPPORT_FIXED)
+
+NODE_COUNT = len(PvcFrameLayout.CORNERS)
+DOF_COUNT = 6*NODE_COUNT
+# Number of frames analysed at once by sweep().
+CHUNK_SIZE = 2048
+
+
+def _topology():
+	"""Return (end nodes, axes) of the pipes and the corner of every node."""
+	# Use distinct lengths and G=0, so every corner has a distinct position.
+	layout = PvcFrameLayout.layout(1.0, 10.0, 100.0, 0.0)
+	corners = layout.transforms[PvcFrameLayout.CORNERS, :3, 3]
+	members = []
+	axes = []
+	for i in PvcFrameLayout.PIPES:
+		axis = layout.transforms[i, :3, 2]
+		start = layout.transforms[i, :3, 3]
+		end = start + layout.lengths[i]*axis
+		a = numpy.argmin(numpy.sum((corners - start)**2, axis=1))
+		b = numpy.argmin(numpy.sum((corners - end)**2, axis=1))
+		members.append((a, b))
+		axes.append(axis)
+	return numpy.array(members), numpy.array(axes)
+
+# MEMBERS[m] holds the node indices of the ends of pipe PvcFrameLayout.PIPES[m],
+# AXES[m] the unit vector from the first to the second end.
+MEMBERS, AXES = _topology()
+
+
+def _frame(axis):
+	"""Return 3x3 matrix with rows of local x, y, z axes of a member."""
+	helper = numpy.array([0.0, 0.0, 1.0]) if abs(axis[2]) < 0.9 else numpy.array([1.0, 0.0, 0.0])
+	y = numpy.cross(helper, axis)
+	y /= numpy.linalg.norm(y)
+	return numpy.array([axis, y, numpy.cross(axis, y)])
+
+
+def _skew(v):
+	return numpy.array([[0, -v[2], v[1]], [v[2], 0, -v[0]], [-v[1], v[0], 0]])
+
+
+def _transformation(axis):
+	"""Return 12x12 rotation from global to local DOF and the rigid offset matrices per unit G."""
+	rotation = numpy.kron(numpy.identity(4), _frame(axis))
+	offset = numpy.zeros((12, 12))
+	offset[0:3, 3:6] = -_skew(axis)
+	offset[6:9, 9:12] = _skew(axis)
+	return rotation, offset
+
+_TRANSFORMATIONS = [_transformation(axis) for axis in AXES]
+
+
+def beamStiffness(E, Gs, A, I, J, l):
+	"""Return local 12x12 stiffness matrices of circular beams.
+
+	DOF are (u, v, w, rx, ry, rz) of both ends, u along the beam.
+	"""
+	E, Gs, A, I, J, l = numpy.broadcast_arrays(*[numpy.asarray(v, dtype=float) for v in (E, Gs, A, I, J, l)])
+	k = numpy.zeros(E.shape + (12, 12))
+	def put(i, j, value):
+		k[..., i, j] = value
+		k[..., j, i] = value
+	axial = E*A/l
+	torsion = Gs*J/l
+	b3, b2, b1 = 12*E*I/l**3, 6*E*I/l**2, E*I/l
+	for i, j, value in [(0, 0, axial), (6, 6, axial), (0, 6, -axial),
+			(3, 3, torsion), (9, 9, torsion), (3, 9, -torsion),
+			# Bending in the local xy plane.
+			(1, 1, b3), (1, 5, b2), (1, 7, -b3), (1, 11, b2),
+			(5, 5, 4*b1), (5, 7, -b2), (5, 11, 2*b1),
+			(7, 7, b3), (7, 11, -b2), (11, 11, 4*b1),
+			# Bending in the local xz plane.
+			(2, 2, b3), (2, 4, -b2), (2, 8, -b3), (2, 10, -b2),
+			(4, 4, 4*b1), (4, 8, b2), (4, 10, 2*b1),
+			(8, 8, b3), (8, 10, b2), (10, 10, 4*b1)]:
+		put(i, j, value)
+	return k
+
+
+Model = collections.namedtuple("Model", ["stiffness", "mass", "nodes"])
+Model.__doc__ = """Beam model of frame boxes.
+
+stiffness -- array (..., DOF_COUNT, DOF_COUNT), DOF 6*node + (ux, uy, uz, rx, ry, rz).
+mass      -- array (..., NODE_COUNT) with lumped masses of the joints in t.
+nodes     -- array (..., NODE_COUNT, 3) with joint positions in mm.
+"""
+
+
+def model(LX, LY, LZ, G, OD, Thk, cornerMass=0.0, E=PVC_MODULUS, nu=PVC_POISSON, density=PVC_DENSITY):
+	"""Return Model of frame boxes.
+
+	LX, LY, LZ and G are the Box dimensions, OD and Thk the pipe dimensions
+	in mm. cornerMass is the mass of one corner in t.
+	"""
+	LX, LY, LZ, G, OD, Thk, cornerMass = numpy.broadcast_arrays(
+		*[numpy.asarray(v, dtype=float) for v in (LX, LY, LZ, G, OD, Thk, cornerMass)])
+	layout = PvcFrameLayout.layout(LX, LY, LZ, G)
+	shape = G.shape
+	ID = OD - 2*Thk
+	A = PvcFrameOptimizer.pipeArea(OD, Thk)
+	I = math.pi/64*(OD**4 - ID**4)
+	Gs = E/(2*(1 + nu))
+	stiffness = numpy.zeros(shape + (DOF_COUNT, DOF_COUNT))
+	mass = numpy.repeat(cornerMass[..., None], NODE_COUNT, axis=-1)
+	for m, i in enumerate(PvcFrameLayout.PIPES):
+		l = layout.lengths[..., i]
+		k = beamStiffness(E, Gs, A, I, 2*I, l)
+		rotation, offset = _TRANSFORMATIONS[m]
+		t = numpy.matmul(rotation, numpy.identity(12) + G[..., None, None]*offset)
+		k = numpy.matmul(numpy.swapaxes(t, -1, -2), numpy.matmul(k, t))
+		a, b = MEMBERS[m]
+		dofs = numpy.r_[6*a:6*a + 6, 6*b:6*b + 6]
+		stiffness[(Ellipsis,) + numpy.ix_(dofs, dofs)] += k
+		pipeMass = density*A*l
+		mass[..., a] += pipeMass/2
+		mass[..., b] += pipeMass/2
+	nodes = layout.transforms[..., PvcFrameLayout.CORNERS, :3, 3]
+	return Model(stiffness, mass, nodes)
+
+
+def cornerMass(G, H, M, POD, PThk, density=PVC_DENSITY):
+	"""Return approximate mass of corners in t."""
+	return density*PvcFrameOptimizer.cornerVolume(G, H, M, POD, PThk)
+
+
+def bottomNodes():
+	"""Return indices of the joints in the plane z=0, where the frame stands."""
+	layout = PvcFrameLayout.layout(1.0, 1.0, 1.0, 0.0)
+	return numpy.nonzero(layout.transforms[PvcFrameLayout.CORNERS, 2, 3] == 0)[0]
+
+def topNodes():
+	return numpy.setdiff1d(numpy.arange(NODE_COUNT), bottomNodes())
+
+
+def freeDofs(support=SUPPORT_PINNED):
+	"""Return indices of the DOF which are not held by the supports."""
+	held = range(6 if support == SUPPORT_FIXED else 3)
+	fixed = [6*node + i for node in bottomNodes() for i in held]
+	return numpy.setdiff1d(numpy.arange(DOF_COUNT), fixed)
+
+
+def solveStatic(model, loads, support=SUPPORT_PINNED):
+	"""Return displacements (..., DOF_COUNT) for loads (..., DOF_COUNT) in N and Nmm."""
+	free = freeDofs(support)
+	loads = numpy.broadcast_to(numpy.asarray(loads, dtype=float), model.stiffness.shape[:-1])
+	k = model.stiffness[(Ellipsis,) + numpy.ix_(free, free)]
+	u = numpy.zeros(loads.shape)
+	u[..., free] = numpy.linalg.solve(k, loads[..., free, None])[..., 0]
+	return u
+
+
+def nodeLoads(force, nodes=None):
+	"""Return load vector with the force (fx, fy, fz) shared by the nodes, default the top nodes."""
+	if nodes is None:
+		nodes = topNodes()
+	loads = numpy.zeros(DOF_COUNT)
+	for node in nodes:
+		loads[6*node:6*node + 3] = numpy.asarray(force, dtype=float)/len(nodes)
+	return loads
+
+
+def rackingStiffness(model, axis=0, support=SUPPORT_PINNED):
+	"""Return stiffness in N/mm against a horizontal force on the top of the frame.
+
+	axis is 0 for a force along x and 1 for y.
+	"""
+	force = numpy.zeros(3)
+	force[axis] = 1.0
+	top = topNodes()
+	u = solveStatic(model, nodeLoads(force, top), support)
+	return 1.0/numpy.mean(u[..., 6*top + axis], axis=-1)
+
+
+def naturalFrequencies(model, count=6, support=SUPPORT_PINNED):
+	"""Return the lowest count natural frequencies in Hz, shape (..., count).
+
+	The mass is lumped at the joints without rotary inertia, so the
+	rotations are condensed out statically before the eigenvalue problem
+	is solved.
+	"""
+	free = freeDofs(support)
+	translations = free[free % 6 < 3]
+	rotations = free[free % 6 >= 3]
+	k = model.stiffness
+	ktt = k[(Ellipsis,) + numpy.ix_(translations, translations)]
+	ktr = k[(Ellipsis,) + numpy.ix_(translations, rotations)]
+	krr = k[(Ellipsis,) + numpy.ix_(rotations, rotations)]
+	condensed = ktt - numpy.matmul(ktr, numpy.linalg.solve(krr, numpy.swapaxes(ktr, -1, -2)))
+	scale = 1.0/numpy.sqrt(model.mass[..., translations // 6])
+	condensed = condensed*scale[..., :, None]*scale[..., None, :]
+	eigenvalues = numpy.linalg.eigvalsh(condensed)[..., :count]
+	return numpy.sqrt(numpy.maximum(eigenvalues, 0))/(2*math.pi)
+
+
+def fromBox(box):
+	"""Return Model of a PvcFrame.Box."""
+	dims = box.corner.dims
+	return model(box.LX.Value, box.LY.Value, box.LZ.Value, box.G.Value, box.POD.Value, box.Thk.Value,
+		cornerMass(dims.G.Value, dims.H.Value, dims.M.Value, dims.POD.Value, dims.PThk.Value))
+
+
+Analysis = collections.namedtuple("Analysis", ["pipeNames", "cornerNames", "frequencies", "racking"])
+Analysis.__doc__ = """Result of sweep().
+
+frequencies -- array (pipes, corners, count) in Hz.
+racking     -- array (pipes, corners, 2) with racking stiffness along x and y in N/mm.
+"""
+
+
+def sweep(pipeTable, cornerTable, LX, LY, LZ, pipes=None, corners=None, count=6, support=SUPPORT_PINNED,
+		compatible=None):
+	"""Analyse frames with all combinations of pipes and corners from the tables.
+
+	pipes and corners are the names of the parts to use, default all.
+	compatible is an optional PartTable.Compatibility of the tables or a
+	boolean array (pipe rows, corner rows) of the full tables, like in
+	PvcFrameOptimizer.evaluate(). Combinations with invalid dimensions or
+	parts, which do not fit together, are not analysed and give NaN.
+	"""
+	if pipes is None:
+		pipes = list(pipeTable.names)
+	if corners is None:
+		corners = list(cornerTable.names)
+	p = numpy.array([pipeTable.names.index(name) for name in pipes], dtype=int)
+	c = numpy.array([cornerTable.names.index(name) for name in corners], dtype=int)
+	p, c = [a.ravel() for a in numpy.meshgrid(p, c, indexing="ij")]
+	OD = pipeTable.column("OD")[p]
+	Thk = pipeTable.column("Thk")[p]
+	G, H, M, POD, PThk = [cornerTable.column(dim)[c] for dim in ("G", "H", "M", "POD", "PThk")]
+	with numpy.errstate(invalid="ignore"):
+		valid = (OD > 0) & (Thk > 0) & (2*Thk < OD) & PvcFrameOptimizer.validCorners(G, H, M, POD, PThk)
+		valid = valid & PvcFrameLayout.isValid(LX, LY, LZ, G)
+	if compatible is not None:
+		valid = valid & numpy.asarray(getattr(compatible, "matrix", compatible), dtype=bool)[p, c]
+	frequencies = numpy.full((len(p), count), numpy.nan)
+	racking = numpy.full((len(p), 2), numpy.nan)
+	rows = numpy.nonzero(valid)[0]
+	for start in range(0, len(rows), CHUNK_SIZE):
+		r = rows[start:start + CHUNK_SIZE]
+		frames = model(LX, LY, LZ, G[r], OD[r], Thk[r], cornerMass(G[r], H[r], M[r], POD[r], PThk[r]))
+		frequencies[r] = naturalFrequencies(frames, count, support)
+		racking[r, 0] = rackingStiffness(frames, 0, support)
+		racking[r, 1] = rackingStiffness(frames, 1, support)
+	shape = (len(pipes), len(corners))
+	return Analysis(pipes, corners, frequencies.reshape(shape + (count,)), racking.reshape(shape + (2,)))
+
+
+def formatAnalysis(analysis):
+	lines = []
+	for i, pipe in enumerate(analysis.pipeNames):
+		for j, corner in enumerate(analysis.cornerNames):
+			lines.append("%-30s %-30s f1 %7.2f Hz  racking x %9.2f N/mm  y %9.2f N/mm"
+				% (pipe, corner, analysis.frequencies[i, j, 0], analysis.racking[i, j, 0], analysis.racking[i, j, 1]))
+	return "\n".join(lines)
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Bounded cache of pipe and corner shapes.
+#
+# Shapes are keyed on a tuple of their dimensions. Floating point values in
+# the key are rounded, so that the same dimensions given in different units
+# map to the same entry. The least recently used shape is evicted when the
+# cache is full. Optionally the shapes are also stored as BREP files in a
+# directory, which allows to reuse them in other sessions and processes.
+#
+# FileCache is a size limited directory of cache files with a manifest.
+
+import collections
+import hashlib
+import json
+import os
+import time
+
+import FreeCAD
+import Part
+
+# Keys are rounded to this number of decimal places in mm.
+KEY_DECIMALS = 6
+DEFAULT_MAX_SIZE = 64
+
+
+def normalizeKey(key):
+	"""Return key with quantities converted to mm and floats rounded."""
+	result = []
+	for value in key:
+		if hasattr(value, "Value"):
+			value = value.Value
+		if isinstance(value, float):
+			value = round(value, KEY_DECIMALS) + 0.0 # Avoid -0.0
+		result.append(value)
+	return tuple(result)
+
+
+def cacheDirectory(name):
+	"""Return directory for cache files of the workbench, create it if necessary."""
+	path = os.path.join(FreeCAD.getUserAppDataDir(), "D3D", name)
+	if not os.path.isdir(path):
+		os.makedirs(path)
+	return path
+
+
+class ShapeCache:
+	"""LRU cache of Part.Shape objects.
+
+	maxSize is the maximal number of shapes held in memory. If path is not
+	None, shapes are also written to and read from BREP files in that
+	directory.
+	"""
+	def __init__(self, maxSize=DEFAULT_MAX_SIZE, path=None):
+		self.maxSize = maxSize
+		self.path = path
+		self.shapes = collections.OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def __len__(self):
+		return len(self.shapes)
+
+	def __contains__(self, key):
+		return normalizeKey(key) in self.shapes
+
+	def isCached(self, key):
+		"""Return True, if the shape of key is in memory or in a BREP file."""
+		key = normalizeKey(key)
+		if key in self.shapes:
+			return True
+		return self.path is not None and os.path.isfile(self.brepPath(key))
+
+	def brepPath(self, key):
+		name = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+		return os.path.join(self.path, name + ".brep")
+
+	def get(self, key):
+		"""Return a copy of the shape stored under key or None."""
+		key = normalizeKey(key)
+		shape = self.shapes.pop(key, None)
+		if shape is None and self.path is not None:
+			filename = self.brepPath(key)
+			if os.path.isfile(filename):
+				shape = Part.Shape()
+				shape.read(filename)
+		if shape is None:
+			self.misses += 1
+			return None
+		self._insert(key, shape)
+		self.hits += 1
+		return shape.copy()
+
+	def put(self, key, shape):
+		"""Store a copy of shape under key."""
+		key = normalizeKey(key)
+		shape = shape.copy()
+		self._insert(key, shape)
+		if self.path is not None:
+			# Write to a temporary file first. Other processes may read the
+			# same cache directory.
+			filename = self.brepPath(key)
+			tmp = "%s.%d.tmp" % (filename, os.getpid())
+			shape.exportBrep(tmp)
+			try:
+				os.rename(tmp, filename)
+			except OSError:
+				os.remove(tmp)
+
+	def _insert(self, key, shape):
+		self.shapes.pop(key, None)
+		self.shapes[key] = shape
+		while len(self.shapes) > self.maxSize:
+			self.shapes.popitem(last=False)
+			self.evictions += 1
+
+	def getOrBuild(self, key, build):
+		"""Return shape stored under key. Build and store it with build() if it is missing."""
+		shape = self.get(key)
+		if shape is None:
+			shape = build()
+			self.put(key, shape)
+		return shape
+
+	def clear(self):
+		"""Remove all shapes from memory. BREP files are kept."""
+		self.shapes.clear()
+
+	def stats(self):
+		return {"size": len(self.shapes), "maxSize": self.maxSize, "hits": self.hits,
+			"misses": self.misses, "evictions": self.evictions}
+
+
+def pipeKey(OD, Thk, H, convertToSolid):
+	return normalizeKey(("pipe", OD, Thk, H, bool(convertToSolid)))
+
+
+def cornerKey(G, H, M, POD, PThk, convertToSolid):
+	return normalizeKey(("corner", G, H, M, POD, PThk, bool(convertToSolid)))
+
+
+# Cache shared by all frames of the session.
+shapeCache = ShapeCache()
+
+
+def enablePersistence(path=None):
+	"""Store shapes of the session cache as BREP files, by default in the user data directory."""
+	if path is None:
+		path = cacheDirectory("shapes")
+	shapeCache.path = path
+
+
+class FileCache:
+	"""Directory of cache files with a total size limit.
+
+	Every entry is a single file, identified by a string key. The manifest
+	stores size, last access time and additional information of every
+	entry. When the total size exceeds maxBytes, the least recently used
+	entries are removed.
+	"""
+	MANIFEST = "manifest.json"
+
+	def __init__(self, path, maxBytes, extension=""):
+		self.path = path
+		self.maxBytes = maxBytes
+		self.extension = extension
+		if not os.path.isdir(path):
+			os.makedirs(path)
+		self.manifestPath = os.path.join(path, FileCache.MANIFEST)
+		self.entries = self._readManifest()
+
+	def _readManifest(self):
+		try:
+			with open(self.manifestPath, "r") as f:
+				return json.load(f)
+		except (IOError, OSError, ValueError):
+			return {}
+
+	def _writeManifest(self):
+		tmp = "%s.%d.tmp" % (self.manifestPath, os.getpid())
+		with open(tmp, "w") as f:
+			json.dump(self.entries, f)
+		if os.path.exists(self.manifestPath):
+			os.remove(self.manifestPath)
+		os.rename(tmp, self.manifestPath)
+
+	def fileName(self, key):
+		return os.path.join(self.path, hashlib.sha1(key.encode("utf-8")).hexdigest() + self.extension)
+
+	def get(self, key):
+		"""Return path of the cache file for key or None."""
+		entry = self.entries.get(key)
+		if entry is None:
+			return None
+		filename = self.fileName(key)
+		if not os.path.isfile(filename):
+			del self.entries[key]
+			self._writeManifest()
+			return None
+		entry["atime"] = time.time()
+		self._writeManifest()
+		return filename
+
+	def info(self, key):
+		"""Return additional information stored with the entry or None."""
+		entry = self.entries.get(key)
+		if entry is None:
+			return None
+		return entry.get("info")
+
+	def put(self, key, write, info=None):
+		"""Create cache file for key with write(filename). Return its path.
+
+		The new file is never evicted by this call, even if it alone exceeds
+		maxBytes, so the returned path exists.
+		"""
+		filename = self.fileName(key)
+		tmp = "%s.%d.tmp%s" % (filename, os.getpid(), self.extension)
+		write(tmp)
+		if os.path.exists(filename):
+			os.remove(filename)
+		os.rename(tmp, filename)
+		self.entries[key] = {"size": os.path.getsize(filename), "atime": time.time(), "info": info}
+		self.evict(key)
+		self._writeManifest()
+		return filename
+
+	def remove(self, key):
+		if self.entries.pop(key, None) is not None:
+			filename = self.fileName(key)
+			if os.path.isfile(filename):
+				os.remove(filename)
+			self._writeManifest()
+
+	def totalSize(self):
+		return sum([entry["size"] for entry in self.entries.values()])
+
+	def evict(self, keep=None):
+		"""Remove least recently used entries until the size limit is kept.
+
+		The entry keep is not removed.
+		"""
+		total = self.totalSize()
+		for key in sorted(self.entries, key=lambda k: self.entries[k]["atime"]):
+			if total <= self.maxBytes:
+				break
+			if key == keep:
+				continue
+			total -= self.entries[key]["size"]
+			filename = self.fileName(key)
+			if os.path.isfile(filename):
+				os.remove(filename)
+			del self.entries[key]
+
+	def clear(self):
+		"""Remove all entries."""
+		for key in list(self.entries):
+			filename = self.fileName(key)
+			if os.path.isfile(filename):
+				os.remove(filename)
+		self.entries = {}
+		self._writeManifest()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Tests of the broad phase of the interference check: the bounding volume
+# hierarchy and the oriented boxes. They use only NumPy, but the module
+# imports FreeCAD, so the tests are skipped when FreeCAD cannot be imported:
+#   python -m pytest tests
+
+import itertools
+import os
+import sys
+
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("FreeCAD")
+
+import D3DInterference
+
+
+def bruteForcePairs(boxes):
+	return [(i, j) for i, j in itertools.combinations(range(len(boxes)), 2)
+		if numpy.all(boxes[i, :3] <= boxes[j, 3:]) and numpy.all(boxes[j, :3] <= boxes[i, 3:])]
+
+
+def randomBoxes(count, seed):
+	random = numpy.random.RandomState(seed)
+	low = random.uniform(0, 100, (count, 3))
+	return numpy.hstack([low, low + random.uniform(1, 15, (count, 3))])
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 4, 5, 17, 200])
+def test_overlapping_pairs(count):
+	boxes = randomBoxes(count, count)
+	bvh = D3DInterference.BoundingVolumeHierarchy(boxes)
+	assert bvh.overlappingPairs() == bruteForcePairs(boxes)
+
+
+def test_touching_and_equal_boxes():
+	boxes = numpy.array([
+		[0, 0, 0, 1, 1, 1],
+		[1, 0, 0, 2, 1, 1],
+		[0, 0, 0, 1, 1, 1],
+		[5, 5, 5, 6, 6, 6]]*3, dtype=float)
+	pairs = D3DInterference.BoundingVolumeHierarchy(boxes).overlappingPairs()
+	assert pairs == bruteForcePairs(boxes)
+	assert (0, 1) in pairs and (0, 2) in pairs
+	assert not [pair for pair in pairs if 3 in pair and 7 not in pair and 11 not in pair]
+
+
+def rotatedBox(center, angle, size):
+	"""Return corner points of a box rotated by angle degrees around z."""
+	a = numpy.radians(angle)
+	rotation = numpy.array([[numpy.cos(a), -numpy.sin(a), 0], [numpy.sin(a), numpy.cos(a), 0], [0, 0, 1]])
+	corners = numpy.array(list(itertools.product([-0.5, 0.5], repeat=3)))*size
+	return numpy.dot(corners, rotation.T) + center
+
+
+def test_oriented_box():
+	box = D3DInterference.orientedBox(rotatedBox((1, 2, 3), 30, (10, 4, 2)))
+	assert numpy.allclose(box.center, (1, 2, 3))
+	assert numpy.allclose(sorted(box.halfSizes), [1, 2, 5])
+	assert numpy.allclose(numpy.dot(box.axes, box.axes.T), numpy.identity(3))
+
+
+def test_oriented_boxes_overlap():
+	# Two thin diagonal bars side by side: their axis aligned boxes overlap,
+	# the oriented boxes do not.
+	a = D3DInterference.orientedBox(rotatedBox((0, 0, 0), 45, (20, 1, 1)))
+	b = D3DInterference.orientedBox(rotatedBox((3, -3, 0), 45, (20, 1, 1)))
+	assert not D3DInterference.orientedBoxesOverlap(a, b)
+	c = D3DInterference.orientedBox(rotatedBox((0, 0, 0), -45, (20, 1, 1)))
+	assert D3DInterference.orientedBoxesOverlap(a, c)
+	# The margin closes the gap.
+	d = D3DInterference.orientedBox(rotatedBox((3, -3, 0), 45, (20, 1, 1)), margin=4)
+	assert D3DInterference.orientedBoxesOverlap(a, d)
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Tests of the indexed part tables and of the pipe/corner compatibility.
+# PartTable parses dimensions with FreeCAD.Units, so the tests are skipped
+# when FreeCAD cannot be imported:
+#   python -m pytest tests
+
+import json
+import os
+import sys
+
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("FreeCAD")
+
+import PartTable
+
+
+class CsvTable:
+	"""Minimal stand-in for OsePiping.Piping.CsvTable."""
+	def __init__(self, dimensions=None, headers=None, data=None):
+		self.dimensions = dimensions
+		self.headers = headers
+		self.data = data
+		self.hasValidData = data is not None
+
+	def load(self, path):
+		with open(path) as f:
+			lines = [line.strip().split(",") for line in f if line.strip()]
+		self.headers = lines[0]
+		self.data = lines[1:]
+		self.hasValidData = True
+
+
+def pipes():
+	return PartTable.PartTable(CsvTable(headers=["PartNumber", "OD", "Thk"], data=[
+		["NPS 1/2 SCH 40", "21.3 mm", "2.8 mm"],
+		["NPS 1 SCH 40", "33.4 mm", "3.4 mm"],
+		["NPS 1 SCH 80", "33.4 mm", "4.5 mm"],
+		["NPS 1 SCH 40", "1 mm", "1 mm"],
+		["broken", "", "3 mm"]]), PartTable.PIPE_DIMENSIONS)
+
+
+def corners():
+	return PartTable.PartTable(CsvTable(headers=["PartNumber", "G", "H", "M", "POD", "PThk"], data=[
+		["Corner 1/2", "15 mm", "35 mm", "28 mm", "21.3 mm", "2.8 mm"],
+		["Corner 1", "20 mm", "45 mm", "42 mm", "33.4 mm", "3.4 mm"],
+		["Corner 1 heavy", "20 mm", "45 mm", "44 mm", "33.6 mm", "4.2 mm"]]), PartTable.CORNER_DIMENSIONS)
+
+
+def test_index():
+	table = pipes()
+	assert len(table) == 5
+	assert "NPS 1 SCH 40" in table
+	assert "NPS 2 SCH 40" not in table
+	# Like CsvTable.findPart(), the first row with the name wins.
+	assert table.rowIndex("NPS 1 SCH 40") == 1
+	assert table.findPart("NPS 1 SCH 40")["OD"] == "33.4 mm"
+	assert table.findPart("NPS 2 SCH 40") is None
+	assert table.getPartKey(2) == "NPS 1 SCH 80"
+
+
+def test_dimensions():
+	table = pipes()
+	assert table.dims("NPS 1 SCH 40") == {"OD": pytest.approx(33.4), "Thk": pytest.approx(3.4)}
+	assert table.dims("unknown") is None
+	assert numpy.isnan(table.column("OD")[4])
+
+
+def test_search():
+	table = pipes()
+	assert table.startingWith("nps 1 ") == ["NPS 1 SCH 40", "NPS 1 SCH 80", "NPS 1 SCH 40"]
+	assert table.containing("sch 80") == ["NPS 1 SCH 80"]
+	# Shorter than an n-gram.
+	assert table.containing("1/") == ["NPS 1/2 SCH 40"]
+	assert table.containing("xyz") == []
+
+
+def test_csv_subset():
+	table = pipes()
+	subset = table.csvSubset(["NPS 1 SCH 80", "NPS 1/2 SCH 40", "unknown"])
+	assert [row[0] for row in subset.data] == ["NPS 1/2 SCH 40", "NPS 1 SCH 80"]
+	assert len(table.csvTable.data) == 5
+
+
+def test_compatibility():
+	c = PartTable.Compatibility(pipes(), corners())
+	assert c.matrix.shape == (5, 3)
+	assert c.fits("NPS 1 SCH 40", "Corner 1")
+	assert not c.fits("NPS 1/2 SCH 40", "Corner 1")
+	assert not c.fits("unknown", "Corner 1")
+	assert c.corners("NPS 1 SCH 40") == ["Corner 1", "Corner 1 heavy"]
+	assert c.corners("NPS 1 SCH 80") == ["Corner 1 heavy"]
+	# Parts with missing dimensions fit nothing.
+	assert c.corners("broken") == []
+	assert c.pipes("Corner 1/2") == ["NPS 1/2 SCH 40"]
+
+
+def test_compatibility_cache():
+	PartTable.clearRegistry()
+	p, c = pipes(), corners()
+	assert PartTable.compatibility(p, c) is PartTable.compatibility(p, c)
+	assert PartTable.compatibility(p, c) is not PartTable.compatibility(p, c, odTolerance=0.1)
+	PartTable.clearRegistry()
+
+
+def test_load_table(tmpdir):
+	PartTable.clearRegistry()
+	path = str(tmpdir.join("pipes.csv"))
+	with open(path, "w") as f:
+		f.write("PartNumber,OD,Thk\nA,10 mm,1 mm\n")
+	loads = []
+	def load(p):
+		loads.append(p)
+		table = CsvTable()
+		table.load(p)
+		return table
+	first = PartTable.loadTable(path, PartTable.PIPE_DIMENSIONS, load, persist=False)
+	assert PartTable.loadTable(path, PartTable.PIPE_DIMENSIONS, load, persist=False) is first
+	assert len(loads) == 1
+	with open(path, "w") as f:
+		f.write("PartNumber,OD,Thk\nA,10 mm,1 mm\nB,20 mm,2 mm\n")
+	os.utime(path, (0, 0))
+	second = PartTable.loadTable(path, PartTable.PIPE_DIMENSIONS, load, persist=False)
+	assert len(second) == 2
+	assert len(loads) == 2
+	PartTable.clearRegistry()
+
+
+def test_missing_table(tmpdir):
+	path = str(tmpdir.join("missing.csv"))
+	table = PartTable.loadTable(path, PartTable.PIPE_DIMENSIONS,
+		lambda p: CsvTable(headers=["PartNumber", "OD", "Thk"], data=[]), persist=False)
+	assert len(table) == 0
+	assert path not in PartTable._registry
+
+
+def test_persist_as_json(tmpdir, monkeypatch):
+	PartTable.clearRegistry()
+	path = str(tmpdir.join("pipes.csv"))
+	with open(path, "w") as f:
+		f.write("PartNumber,OD,Thk\nA,10 mm,1 mm\nB,2 cm,x\n")
+	cache = tmpdir.mkdir("tables")
+	monkeypatch.setattr(PartTable, "_newCsv", lambda dimensions: CsvTable(dimensions))
+	monkeypatch.setattr(PartTable, "compiledPath", lambda p: os.path.join(str(cache), "pipes.json"))
+	PartTable.loadTable(path, PartTable.PIPE_DIMENSIONS, persist=True)
+	with open(os.path.join(str(cache), "pipes.json")) as f:
+		data = json.load(f)
+	assert data["headers"] == ["PartNumber", "OD", "Thk"]
+	PartTable.clearRegistry()
+	parsed = []
+	monkeypatch.setattr(PartTable, "parseLength", lambda text: parsed.append(text))
+	table = PartTable.loadTable(path, PartTable.PIPE_DIMENSIONS, persist=True)
+	assert parsed == []
+	assert table.dims("B")["OD"] == pytest.approx(20.0)
+	assert numpy.isnan(table.dims("B")["Thk"])
+	assert table.findPart("A") == {"PartNumber": "A", "OD": "10 mm", "Thk": "1 mm"}
+	PartTable.clearRegistry()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Tests of the cut list solvers. They run without FreeCAD:
+#   python -m pytest tests
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PvcCutList
+
+
+def checkPlan(plan, lengths):
+	"""Assert that the plan cuts exactly lengths and every bar fits."""
+	cuts = sorted([l for bar in plan.bars for l in bar])
+	assert cuts == sorted(lengths)
+	for bar in plan.bars:
+		assert PvcCutList.barWaste(plan, bar) >= -PvcCutList.TOLERANCE
+
+
+def test_best_fit_decreasing():
+	lengths = [5, 4, 3, 3, 3, 2]
+	bars = PvcCutList.bestFitDecreasing(lengths, 10)
+	assert bars == [[5, 4], [3, 3, 3], [2]]
+
+
+def test_heuristic_plan():
+	lengths = [500, 400, 400, 300, 300, 100]
+	plan = PvcCutList.solveLengths(lengths, 1000, kerf=0)
+	checkPlan(plan, lengths)
+	assert len(plan.bars) == 2
+	assert plan.optimal
+
+
+def test_kerf():
+	plan = PvcCutList.solveLengths([500, 500], 1000, kerf=1)
+	assert len(plan.bars) == 2
+	assert PvcCutList.planWaste(plan) == pytest.approx(2000 - 1000 - 2)
+
+
+def test_too_long():
+	with pytest.raises(ValueError):
+		PvcCutList.solveLengths([1000], 1000, kerf=1)
+
+
+def test_exact_small():
+	# Best-fit decreasing needs 3 bars, 5+3+2 and 4+3+3 need only 2.
+	lengths = [5, 4, 3, 3, 3, 2]
+	heuristic = PvcCutList.solveLengths(lengths, 10)
+	assert len(heuristic.bars) == 3
+	assert not heuristic.optimal
+	plan = PvcCutList.solveLengths(lengths, 10, exact=True)
+	checkPlan(plan, lengths)
+	assert len(plan.bars) == 2
+	assert plan.optimal
+
+
+def test_exact_fallback():
+	lengths = [5, 4, 3, 3, 3, 2]
+	plan = PvcCutList.solveLengths(lengths, 10, exact=True, maxSteps=3)
+	checkPlan(plan, lengths)
+	assert len(plan.bars) == 3
+	assert not plan.optimal
+
+
+def test_exact_budget_bounds_runtime():
+	cutList = PvcCutList.CutList()
+	for i in range(20):
+		cutList.addFrame("p", 300 + i%7*10, 400, 500, 20)
+	start = time.time()
+	plans = cutList.solve(6000., 3., exact=True)
+	assert time.time() - start < 20
+	plan = plans["p"]
+	checkPlan(plan, cutList.lengths["p"])
+	heuristic = PvcCutList.solveLengths(cutList.lengths["p"], 6000., 3.)
+	assert len(plan.bars) <= len(heuristic.bars)
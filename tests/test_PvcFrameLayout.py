@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Tests of PvcFrameLayout against the placements, which PvcFrame.Box used
+# to set member by member. They run without FreeCAD:
+#   python -m pytest tests
+
+import math
+import os
+import sys
+
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PvcFrameLayout
+
+
+def rotation(axis, angle):
+	"""Return 4x4 matrix of a rotation around axis by angle in degrees, like FreeCAD.Rotation."""
+	x, y, z = numpy.asarray(axis, dtype=float)/numpy.linalg.norm(axis)
+	a = math.radians(angle)
+	c, s, t = math.cos(a), math.sin(a), 1 - math.cos(a)
+	m = numpy.identity(4)
+	m[:3, :3] = [[t*x*x + c, t*x*y - s*z, t*x*z + s*y],
+		[t*x*y + s*z, t*y*y + c, t*y*z - s*x],
+		[t*x*z - s*y, t*y*z + s*x, t*z*z + c]]
+	return m
+
+
+def placement(base, axis=(0, 0, 1), angle=0):
+	"""Return 4x4 matrix of FreeCAD.Placement(Vector(*base), Rotation(Vector(*axis), angle))."""
+	m = rotation(axis, angle)
+	m[:3, 3] = base
+	return m
+
+
+def handWrittenPlacements(LX, LY, LZ, G):
+	"""Placements of the members in the order of PvcFrameLayout, as the original PvcFrame.Box set them."""
+	X, Y = (0, 1, 0), (1, 0, 0)
+	return [
+		# Source pipes z, x, y
+		placement((0, 0, G)),
+		placement((G, 0, 0), X, 90),
+		placement((0, G, 0), Y, -90),
+		# z clones
+		placement((LX, 0, G)),
+		placement((0, LY, G)),
+		placement((LX, LY, G)),
+		# x clones
+		placement((G, LY, 0), X, 90),
+		placement((G, 0, LZ), X, 90),
+		placement((G, LY, LZ), X, 90),
+		# y clones
+		placement((LX, G, 0), Y, -90),
+		placement((0, G, LZ), Y, -90),
+		placement((LX, G, LZ), Y, -90),
+		# Corners
+		placement((0, 0, 0)),
+		placement((0, 0, LZ), (0, 1, 0), 90),
+		placement((LX, 0, LZ), (0, 1, 0), 180),
+		placement((LX, 0, 0), (0, 1, 0), 270),
+		placement((LX, LY, 0), (0, 0, 1), 180),
+		placement((0, LY, 0), (0, 0, 1), 270),
+		placement((0, LY, LZ), (1, 0, 0), 180),
+		numpy.dot(placement((LX, LY, LZ), (1, 0, 0), 90), placement((0, 0, 0), (0, 0, 1), 180)),
+	]
+
+
+@pytest.mark.parametrize("LX, LY, LZ, G", [(300.0, 200.0, 635.0, 20.0), (406.4, 406.4, 406.4, 33.0)])
+def test_transforms_match_hand_written_placements(LX, LY, LZ, G):
+	layout = PvcFrameLayout.layout(LX, LY, LZ, G)
+	expected = handWrittenPlacements(LX, LY, LZ, G)
+	assert layout.transforms.shape == (PvcFrameLayout.MEMBER_COUNT, 4, 4)
+	for i in range(PvcFrameLayout.MEMBER_COUNT):
+		numpy.testing.assert_allclose(layout.transforms[i], expected[i], atol=1e-9, err_msg="member %d" % i)
+
+
+def test_last_corner_is_rotated_twice():
+	LX, LY, LZ, G = 300.0, 200.0, 250.0, 20.0
+	transform = PvcFrameLayout.layout(LX, LY, LZ, G).transforms[PvcFrameLayout.CORNERS[-1]]
+	expected = numpy.dot(rotation((1, 0, 0), 90), rotation((0, 0, 1), 180))
+	numpy.testing.assert_allclose(transform[:3, :3], expected[:3, :3], atol=1e-12)
+	numpy.testing.assert_allclose(transform[:3, 3], (LX, LY, LZ))
+
+
+def test_pipe_lengths():
+	LX, LY, LZ, G = 300.0, 200.0, 250.0, 20.0
+	layout = PvcFrameLayout.layout(LX, LY, LZ, G)
+	expected = {PvcFrameLayout.ROLE_X_PIPE: LX - 2*G, PvcFrameLayout.ROLE_Y_PIPE: LY - 2*G,
+		PvcFrameLayout.ROLE_Z_PIPE: LZ - 2*G, PvcFrameLayout.ROLE_CORNER: 0.0}
+	for i in range(PvcFrameLayout.MEMBER_COUNT):
+		assert layout.lengths[i] == pytest.approx(expected[layout.roles[i]])
+
+
+def test_total_pipe_length():
+	LX, LY, LZ, G = 300.0, 200.0, 250.0, 20.0
+	layout = PvcFrameLayout.layout(LX, LY, LZ, G)
+	expected = 4*(LX - 2*G) + 4*(LY - 2*G) + 4*(LZ - 2*G)
+	assert PvcFrameLayout.totalPipeLength(LX, LY, LZ, G) == pytest.approx(expected)
+	assert numpy.sum(layout.lengths[PvcFrameLayout.PIPES]) == pytest.approx(expected)
+
+
+def test_broadcasting():
+	LX = numpy.array([300.0, 400.0])
+	layouts = PvcFrameLayout.layout(LX, 200.0, 250.0, 20.0)
+	assert layouts.transforms.shape == (2, PvcFrameLayout.MEMBER_COUNT, 4, 4)
+	for i, lx in enumerate(LX):
+		numpy.testing.assert_allclose(layouts.transforms[i], PvcFrameLayout.layout(lx, 200.0, 250.0, 20.0).transforms)
+	numpy.testing.assert_allclose(PvcFrameLayout.totalPipeLength(LX, 200.0, 250.0, 20.0),
+		[PvcFrameLayout.totalPipeLength(lx, 200.0, 250.0, 20.0) for lx in LX])
+
+
+def test_is_valid():
+	assert PvcFrameLayout.isValid(300.0, 200.0, 250.0, 20.0)
+	assert not PvcFrameLayout.isValid(40.0, 200.0, 250.0, 20.0)
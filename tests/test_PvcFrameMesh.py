@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Tests of PvcFrameMesh, which need FreeCAD. Run them with the Python of
+# FreeCAD; without FreeCAD they are skipped.
+
+import os
+import sys
+
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FreeCAD = pytest.importorskip("FreeCAD")
+PvcFrame = pytest.importorskip("PvcFrame")
+import PvcFrameLayout
+import PvcFrameMesh
+
+
+@pytest.fixture
+def document():
+	document = FreeCAD.newDocument("TestPvcFrameMesh")
+	yield document
+	FreeCAD.closeDocument(document.Name)
+
+
+@pytest.mark.parametrize("instancing", [PvcFrame.INSTANCING_CLONE, PvcFrame.INSTANCING_LINK])
+def test_object_instances_match_layout(document, instancing):
+	box = PvcFrame.Box(document)
+	group = box.create(True, instancing)
+	document.recompute()
+	instances = PvcFrameMesh.objectInstances([group])
+	layout = box.layout()
+	assert len(instances) == PvcFrameLayout.MEMBER_COUNT
+	expected = sorted([tuple(numpy.round(t, 6).flatten()) for t in layout.transforms])
+	actual = sorted([tuple(numpy.round(i.transform, 6).flatten()) for i in instances])
+	numpy.testing.assert_allclose(actual, expected, atol=1e-6)
+
+
+def test_clone_scale(document):
+	import Draft
+	import Part
+	source = document.addObject("Part::Feature", "Source")
+	source.Shape = Part.makeBox(1, 2, 3)
+	source.Placement = FreeCAD.Placement(FreeCAD.Vector(5, 0, 0), FreeCAD.Rotation())
+	clone = Draft.clone(source)
+	clone.Scale = FreeCAD.Vector(2, 2, 2)
+	clone.Placement = FreeCAD.Placement(FreeCAD.Vector(0, 7, 0), FreeCAD.Rotation())
+	source.Visibility = False
+	document.recompute()
+	instances = PvcFrameMesh.objectInstances([clone])
+	assert len(instances) == 1
+	expected = numpy.diag([2.0, 2.0, 2.0, 1.0])
+	expected[1, 3] = 7
+	numpy.testing.assert_allclose(instances[0].transform, expected, atol=1e-9)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Tests of the frame optimizer with small part tables. They run without
+# FreeCAD:
+#   python -m pytest tests
+
+import os
+import sys
+
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PvcFrameLayout
+import PvcFrameOptimizer
+
+
+class Table:
+	"""Part table with names and dimension columns in mm, like PartTable."""
+	def __init__(self, names, **columns):
+		self.names = list(names)
+		self.columns = dict([(dim, numpy.array(values, dtype=float)) for dim, values in columns.items()])
+
+	def column(self, dim):
+		return self.columns[dim]
+
+
+def pipeTable():
+	return Table(["small", "large", "bad"], OD=[21.3, 33.4, 20.0], Thk=[2.8, 3.4, 12.0])
+
+
+def cornerTable():
+	# "invalid" has the socket wider than the arm.
+	return Table(["small", "large", "invalid"], G=[15.0, 20.0, 5.0], H=[35.0, 45.0, 20.0],
+		M=[28.0, 42.0, 20.0], POD=[21.3, 33.4, 33.4], PThk=[2.8, 3.4, 3.4])
+
+
+def test_minimal_length_step():
+	length = PvcFrameOptimizer.minimalLength([101.0, 10.0], 20.0, step=10.0)
+	assert numpy.allclose(length, [110.0, 50.0])
+
+
+def test_minimal_length_sizes():
+	length = PvcFrameOptimizer.minimalLength([100.0, 300.0, 501.0], 20.0, sizes=[500, 100, 300])
+	assert numpy.allclose(length[:2], [100.0, 300.0])
+	assert numpy.isnan(length[2])
+
+
+def test_evaluate_feasibility():
+	result = PvcFrameOptimizer.evaluate(pipeTable(), cornerTable(), (200, 200, 200))
+	assert result.feasible.shape == (3, 3)
+	# The pipe wall is too thick and the corner socket does not fit into the arm.
+	assert not result.feasible[2].any()
+	assert not result.feasible[:, 2].any()
+	assert result.feasible[:2, :2].all()
+
+
+def test_evaluate_dimensions():
+	result = PvcFrameOptimizer.evaluate(pipeTable(), cornerTable(), (200, 300, 400), clearance=5, step=1)
+	# Large pipe and large corner: the span is the larger arm diameter M.
+	LX, LY, LZ = result.dimensions[1, 1]
+	assert (LX, LY, LZ) == (252.0, 352.0, 452.0)
+	assert result.pipeLength[1, 1] == pytest.approx(PvcFrameLayout.totalPipeLength(LX, LY, LZ, 20.0))
+	assert (result.cornerCount == 8).all()
+
+
+def test_evaluate_compatible():
+	compatible = numpy.identity(3, dtype=bool)
+	result = PvcFrameOptimizer.evaluate(pipeTable(), cornerTable(), (200, 200, 200), compatible=compatible)
+	assert result.feasible[0, 0] and result.feasible[1, 1]
+	assert not result.feasible[0, 1] and not result.feasible[1, 0]
+
+
+def test_evaluate_stock_length():
+	result = PvcFrameOptimizer.evaluate(pipeTable(), cornerTable(), (500, 200, 200), stockLength=400)
+	assert not result.feasible.any()
+
+
+def test_pareto_front():
+	objectives = [[1, 5], [2, 2], [3, 3], [1, 5], [5, 1], [2, 4]]
+	front = PvcFrameOptimizer.paretoFront(objectives)
+	assert list(front) == [0, 1, 4]
+
+
+def test_optimize():
+	compatible = numpy.identity(3, dtype=bool)
+	candidates = PvcFrameOptimizer.optimize(pipeTable(), cornerTable(), (200, 200, 200), compatible=compatible)
+	# The small parts give shorter pipes and less mass, they dominate the large ones.
+	assert len(candidates) == 1
+	candidate = candidates[0]
+	assert (candidate.pipeName, candidate.cornerName) == ("small", "small")
+	assert candidate.mass > 0
+	assert candidate.LX == candidate.LY == candidate.LZ
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#***************************************************************************
+#*                                                                         *
+#*  This file is part of the Open Source Ecology D3D 3D Printer Workbench  *
+#*  for FreeCAD.                                                           *
+#*                                                                         *
+#*  Copyright (C) 2017                                                     *
+#*  Open Source Ecology <info|at|opensourceecology.org>                    *
+#*                                                                         *
+#*  This library is free software; you can redistribute it and/or          *
+#*  modify it under the terms of the GNU Lesser General Public             *
+#*  License as published by the Free Software Foundation; either           *
+#*  version 2 of the License, or (at your option) any later version.       *
+#*                                                                         *
+#*  This library is distributed in the hope that it will be useful,        *
+#*  but WITHOUT ANY WARRANTY; without even the implied warranty of         *
+#*  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU      *
+#*  Lesser General Public License for more details.                        *
+#*                                                                         *
+#*  You should have received a copy of the GNU Lesser General Public       *
+#*  License along with this library; if not, If not, see                   *
+#*  <http://www.gnu.org/licenses/>.                                        *
+#*                                                                         *
+#*                                                                         *
+#***************************************************************************
+# Tests of the stiffness model of frame boxes. They run without FreeCAD:
+#   python -m pytest tests
+
+import math
+import os
+import sys
+
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PvcFrameStiffness
+
+
+class Table:
+	"""Part table with names and dimension columns in mm, like PartTable."""
+	def __init__(self, names, **columns):
+		self.names = list(names)
+		self.columns = dict([(dim, numpy.array(values, dtype=float)) for dim, values in columns.items()])
+
+	def column(self, dim):
+		return self.columns[dim]
+
+
+def frame(OD=33.4, Thk=3.4, LX=400.0, LY=400.0, LZ=500.0, G=20.0):
+	return PvcFrameStiffness.model(LX, LY, LZ, G, OD, Thk, cornerMass=1e-5)
+
+
+def test_beam_stiffness_axial():
+	E, A, l = 3000.0, 100.0, 250.0
+	k = PvcFrameStiffness.beamStiffness(E, 1000.0, A, 500.0, 1000.0, l)
+	assert k.shape == (12, 12)
+	assert numpy.allclose(k, k.T)
+	assert k[0, 0] == pytest.approx(E*A/l)
+
+
+def test_model():
+	m = frame()
+	assert m.stiffness.shape == (PvcFrameStiffness.DOF_COUNT, PvcFrameStiffness.DOF_COUNT)
+	assert numpy.allclose(m.stiffness, m.stiffness.T)
+	assert m.mass.shape == (PvcFrameStiffness.NODE_COUNT,)
+	assert (m.mass > 1e-5).all()
+	assert len(PvcFrameStiffness.bottomNodes()) == 4
+	assert numpy.allclose(m.nodes[PvcFrameStiffness.bottomNodes(), 2], 0)
+
+
+def test_vertical_load():
+	# Pipes in compression: every top node sinks by F*l/(E*A) of its pipe.
+	m = frame()
+	force = -400.0
+	u = PvcFrameStiffness.solveStatic(m, PvcFrameStiffness.nodeLoads((0, 0, force)),
+		PvcFrameStiffness.SUPPORT_FIXED)
+	top = PvcFrameStiffness.topNodes()
+	ID = 33.4 - 2*3.4
+	A = math.pi/4*(33.4**2 - ID**2)
+	expected = force/4*(500.0 - 2*20.0)/(PvcFrameStiffness.PVC_MODULUS*A)
+	assert numpy.allclose(u[6*top + 2], expected, rtol=1e-6)
+
+
+def test_racking_stiffness():
+	m = frame()
+	x = PvcFrameStiffness.rackingStiffness(m, 0)
+	y = PvcFrameStiffness.rackingStiffness(m, 1)
+	assert x > 0
+	# The frame is square in the xy plane.
+	assert x == pytest.approx(y)
+	assert PvcFrameStiffness.rackingStiffness(m, 0, PvcFrameStiffness.SUPPORT_FIXED) > x
+	assert PvcFrameStiffness.rackingStiffness(frame(OD=42.2, Thk=3.6), 0) > x
+
+
+def test_batched_model():
+	OD = numpy.array([26.7, 33.4, 42.2])
+	Thk = numpy.array([2.9, 3.4, 3.6])
+	m = PvcFrameStiffness.model(400.0, 400.0, 500.0, 20.0, OD, Thk, 1e-5)
+	racking = PvcFrameStiffness.rackingStiffness(m, 0)
+	assert racking.shape == (3,)
+	assert (numpy.diff(racking) > 0).all()
+	for i in range(3):
+		assert racking[i] == pytest.approx(PvcFrameStiffness.rackingStiffness(frame(OD[i], Thk[i]), 0))
+
+
+def test_natural_frequencies():
+	f = PvcFrameStiffness.naturalFrequencies(frame(), 6)
+	assert f.shape == (6,)
+	assert (f > 0).all()
+	assert (numpy.diff(f) >= 0).all()
+	# More mass lowers the frequencies.
+	heavy = PvcFrameStiffness.model(400.0, 400.0, 500.0, 20.0, 33.4, 3.4, cornerMass=1e-3)
+	assert PvcFrameStiffness.naturalFrequencies(heavy, 1)[0] < f[0]
+
+
+def test_sweep():
+	pipes = Table(["a", "b"], OD=[26.7, 33.4], Thk=[2.9, 3.4])
+	corners = Table(["c"], G=[20.0], H=[45.0], M=[42.0], POD=[33.4], PThk=[3.4])
+	analysis = PvcFrameStiffness.sweep(pipes, corners, 400.0, 400.0, 500.0, count=3)
+	assert analysis.frequencies.shape == (2, 1, 3)
+	assert analysis.racking.shape == (2, 1, 2)
+	assert numpy.isfinite(analysis.racking).all()
+	assert analysis.racking[1, 0, 0] > analysis.racking[0, 0, 0]
+	# G is too large for the frame.
+	small = PvcFrameStiffness.sweep(pipes, corners, 30.0, 400.0, 500.0, count=3)
+	assert numpy.isnan(small.racking).all()
+
+
+def test_sweep_skips_invalid_and_incompatible():
+	pipes = Table(["a", "b"], OD=[26.7, 33.4], Thk=[2.9, 3.4])
+	# "wide" has the socket wider than the arm.
+	corners = Table(["c", "wide"], G=[20.0, 20.0], H=[45.0, 45.0], M=[42.0, 30.0],
+		POD=[33.4, 33.4], PThk=[3.4, 3.4])
+	analysis = PvcFrameStiffness.sweep(pipes, corners, 400.0, 400.0, 500.0, count=2)
+	assert numpy.isfinite(analysis.racking[:, 0]).all()
+	assert numpy.isnan(analysis.racking[:, 1]).all()
+	compatible = numpy.array([[False, True], [True, True]])
+	analysis = PvcFrameStiffness.sweep(pipes, corners, 400.0, 400.0, 500.0, corners=["c"], count=2,
+		compatible=compatible)
+	assert numpy.isnan(analysis.racking[0, 0]).all()
+	assert numpy.isfinite(analysis.racking[1, 0]).all()
+	assert numpy.isfinite(analysis.frequencies[1, 0]).all()